@@ -26,9 +26,13 @@ import sys
 import time
 import math
 import traceback
-from collections import OrderedDict
-from xml.etree import cElementTree as ElementTree
-from osgeo import gdal
+import functools
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext, ExitStack
+from osgeo import gdal, ogr, osr
+import numpy as np
 
 from qgis.PyQt.QtCore import (QCoreApplication,
                               QVariant)
@@ -41,10 +45,17 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterEnum,
                        QgsProcessingParameterCrs,
+                       QgsProcessingParameterBoolean,
+                       QgsProcessingParameterFile,
+                       QgsProcessingParameterRasterLayer,
+                       QgsProcessingParameterString,
+                       QgsProcessingParameterFileDestination,
+                       QgsProcessingOutputLayerDefinition,
                        QgsCoordinateTransform,
                        QgsProject,
                        QgsPointXY,
                        QgsPoint,
+                       QgsLineString,
                        QgsGeometry,
                        QgsFeature,
                        QgsWkbTypes,
@@ -54,82 +65,116 @@ from qgis.core import (QgsProcessing,
                        QgsWkbTypes)
 import processing
 
-###############################################
-# XML to dict parsing code get from:
-# https://stackoverflow.com/questions/2148119/how-to-convert-an-xml-string-to-a-dictionary
-class XmlListConfig(list):
-    def __init__(self, aList):
-        for element in aList:
-            if element:
-                # treat like dict
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    self.append(XmlDictConfig(element))
-                # treat like list
-                elif element[0].tag == element[1].tag:
-                    self.append(XmlListConfig(element))
-            elif element.text:
-                text = element.text.strip()
-                if text:
-                    self.append(text)
-
-
-class XmlDictConfig(dict):
-    '''
-    Example usage:
-    >>> tree = ElementTree.parse('your_file.xml')
-    >>> root = tree.getroot()
-    >>> xmldict = XmlDictConfig(root)
-    Or, if you want to use an XML string:
-    >>> root = ElementTree.XML(xml_string)
-    >>> xmldict = XmlDictConfig(root)
-    And then use xmldict for what it is... a dict.
-    '''
-    def __init__(self, parent_element):
-        if parent_element.items():
-            self.update(dict(parent_element.items()))
-        for element in parent_element:
-            if element:
-                # treat like dict - we assume that if the first two tags
-                # in a series are different, then they are all different.
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    aDict = XmlDictConfig(element)
-                # treat like list - we assume that if the first two tags
-                # in a series are the same, then the rest are the same.
-                else:
-                    # here, we put the list in dictionary; the key is the
-                    # tag name the list elements all share in common, and
-                    # the value is the list itself 
-                    aDict = {element[0].tag: XmlListConfig(element)}
-                # if the tag has attributes, add those to the dict
-                if element.items():
-                    aDict.update(dict(element.items()))
-                self.update({element.tag: aDict})
-            # this assumes that if you've got an attribute in a tag,
-            # you won't be having any text. This may or may not be a 
-            # good idea -- time will tell. It works for the way we are
-            # currently doing XML configuration files...
-            elif element.items():
-                self.update({element.tag: dict(element.items())})
-            # finally, if there are no child tags and no attributes, extract
-            # the text
-            else:
-                self.update({element.tag: element.text})
-
-###############################################
+from image_metadata import read_image_record
+from metadata_cache import MetadataCache, default_cache_path
+from camera_profiles import CAMERA_PROFILES
+from footprint_geometry import (wedge_distances,
+                                frustum_footprints,
+                                point_wkb,
+                                polygon_wkb)
+from gpkg_writer import GeoPackageWriter, is_geopackage_path
+from terrain import DemReader, terrain_footprints, heights_above_ground
+from profiling import StageTimer, timed
+from checkpoint import (checkpoint_path,
+                        quarantine_path,
+                        read_checkpoint,
+                        check_checkpoint,
+                        write_checkpoint,
+                        remove_checkpoint,
+                        QuarantineReport,
+                        CheckpointError)
+from image_sources import (DEFAULT_PATTERNS,
+                           iter_image_paths,
+                           iter_manifest_paths,
+                           count_image_paths)
+
+def _prefetch_metadata(sources, workers, reader=read_image_record):
+    """
+    Generator extracting metadata of the images in a pool of threads.
+    Metadata of the upcoming images are read in background (GDAL release the GIL
+    during I/O) but results are yielded in the same order of sources so that
+    geometries and sinks are still managed in the main thread.
+    Pending jobs are cancelled when the generator is closed.
+    :param sources: iterable of image paths (consumed lazily)
+    :param workers: number of worker threads
+    :param reader: function called in the threads returning the metadata of a source
+    :return: yield (source, future) tuples. future.result() return the
+        reader result or raise its exception
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    # limit the number of images prefetched in advance
+    window = 2*max(1, workers)
+    pending = deque()
+    try:
+        sources = iter(sources)
+        for source in islice(sources, window):
+            pending.append((source, executor.submit(reader, source)))
+        while pending:
+            yield pending.popleft()
+            # keep the window full
+            for source in islice(sources, 1):
+                pending.append((source, executor.submit(reader, source)))
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def _chunks(iterable, size):
+    """
+    Split an iterable in lists of size elements (the last can be shorter)
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
 
-def _convert_to_degress(value):
+def _transform_coordinates(transform, xs, ys):
+    """
+    Transform a set of points with a single call to the coordinate transformation
+    instead of transforming them one by one
+    :param transform: QgsCoordinateTransform
+    :param xs: list of x coordinates
+    :param ys: list of y coordinates
+    :return: tuple of transformed (xs, ys) lists
+    """
+    if not xs:
+        return [], []
+    # the points are stored as vertices of a line because QgsLineString.transform
+    # transforms all the coordinate arrays at once
+    line = QgsLineString(xs, ys)
+    line.transform(transform)
+    return ([line.xAt(i) for i in range(line.numPoints())],
+            [line.yAt(i) for i in range(line.numPoints())])
+
+def _ogr_fields(fields):
     """
-    Helper function to convert the GPS coordinates stored in the EXIF to degress in float format
-    :param value:
-    :type value: str (e.g. '(43) (16) (20.3444)')
-    :rtype: float
+    :param fields: QgsFields
+    :return: list of (name, OGR field type) for GeoPackageWriter
     """
-    values = value.translate(str.maketrans({'(':None, ')':None})).split()
-    d = float(values[0])
-    m = float(values[1])
-    s = float(values[2])
+    types = {
+        QVariant.String: ogr.OFTString,
+        QVariant.Double: ogr.OFTReal,
+        QVariant.Int: ogr.OFTInteger,
+        QVariant.LongLong: ogr.OFTInteger64,
+    }
+    return [(field.name(), types[field.type()]) for field in fields]
+
+def _destination(parameters, name, context):
+    """
+    :return: destination string of an output parameter without evaluating it
+        (that would generate temporary outputs), None if not set
+    """
+    value = parameters.get(name)
+    if isinstance(value, QgsProcessingOutputLayerDefinition):
+        value = value.sink.valueAsString(context.expressionContext())[0]
+    return value if isinstance(value, str) else None
 
-    return d + (m / 60.0) + (s / 3600.0)
+def _layer_name(path):
+    """
+    :return: layer name of a file output, as QGIS names it, e.g. footprints for footprints.gpkg
+    """
+    return os.path.splitext(os.path.basename(path))[0]
 
 def tr(text):
     return QCoreApplication.translate(text)
@@ -137,7 +182,17 @@ def tr(text):
 class BatchUAVImageFootprints(QgsProcessingAlgorithm):
 
     INPUT_LAYERS = 'INPUT_LAYERS'
+    INPUT_FOLDER = 'INPUT_FOLDER'
+    FILE_PATTERN = 'FILE_PATTERN'
+    RECURSIVE = 'RECURSIVE'
+    INPUT_MANIFEST = 'INPUT_MANIFEST'
     CAMERA_MODEL = 'CAMERA_MODEL'
+    ENGINE = 'ENGINE'
+    MAX_VIEW_DISTANCE = 'MAX_VIEW_DISTANCE'
+    DEM = 'DEM'
+    DEM_SEGMENTS = 'DEM_SEGMENTS'
+    DEM_STEP = 'DEM_STEP'
+    DEM_HEIGHT = 'DEM_HEIGHT'
     OUTPUT_FOOTPRINTS = 'OUTPUT_FOOTPRINTS'
     OUTPUT_NADIRS = 'OUTPUT_NADIRS'
 
@@ -150,6 +205,23 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
     VERTICAL_FOV = 'VERTICAL_FOV'
     NADIR_TO_BOTTOM_OFFSET = 'NADIR_TO_BOTTOM_OFFSET'
     NADIR_TO_UPPPER_OFFSET = 'NADIR_TO_UPPPER_OFFSET'
+    WORKERS = 'WORKERS'
+    USE_METADATA_CACHE = 'USE_METADATA_CACHE'
+    METADATA_CACHE_FILE = 'METADATA_CACHE_FILE'
+    INVALIDATE_METADATA_CACHE = 'INVALIDATE_METADATA_CACHE'
+    VERBOSE = 'VERBOSE'
+    APPEND = 'APPEND'
+    RESUME = 'RESUME'
+    QUARANTINE_FILE = 'QUARANTINE_FILE'
+    PROFILE_FILE = 'PROFILE_FILE'
+
+    # number of images processed together (nadirs transformation)
+    BLOCK_SIZE = 1000
+
+    # footprint engines
+    ENGINE_WEDGE = 0
+    ENGINE_FRUSTUM = 1
+    ENGINE_TERRAIN = 2
 
     def tr(self, string):
         return QCoreApplication.translate('Processing', string)
@@ -166,32 +238,10 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
     def __init__(self):
         super().__init__()
 
-        self.CAMERA_DATA = OrderedDict([
-            (self.tr('Phantom 4 Pro - FC6310'), {
-                'horizontal_FOV': 67.07,
-                'vertical_FOV': 52.86,
-                'nadir_to_bottom_offset': 0,
-                'nadir_to_upper_offset': 0
-            }),
-            (self.tr('DJI - X3'), {
-                'horizontal_FOV': 82.3,
-                'vertical_FOV': 66.46,
-                'nadir_to_bottom_offset': 0,
-                'nadir_to_upper_offset': 0
-            }),
-            (self.tr('MicaSense - Altum'), {
-                'horizontal_FOV': 64,
-                'vertical_FOV': 84,
-                'nadir_to_bottom_offset': 0,
-                'nadir_to_upper_offset': 0
-            }),
-            (self.tr('Advanced'), {
-                'horizontal_FOV': 64,
-                'vertical_FOV': 84,
-                'nadir_to_bottom_offset': 0,
-                'nadir_to_upper_offset': 0
-            })
-        ])
+        # copy the profiles because Advanced values are set by the user
+        self.CAMERA_DATA = OrderedDict(
+            (self.tr(name), dict(profile)) for name, profile in CAMERA_PROFILES.items()
+        )
 
     def name(self):
         return 'batchuavimagesfootprints'
@@ -208,12 +258,34 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
                        camera distorsion and calibration model\n
                        The gemetric algoritm to calculate footprint is based simple trigonometry and ispired by StackOverflow <a href="https://photo.stackexchange.com/questions/56596/how-do-i-calculate-the-ground-footprint-of-an-aerial-camera">post</a>
 
+                       Input images can be selected as layers, or as a folder (optionally scanned recursively) and/or a text manifest with an image path for each line.\n
+                       Folder and manifest images are not loaded as layers, that is a lot faster for big flights.
+
+                       <b>Footprint engine</b>: "Wedge buffer" is the trigonometric model described above. "Camera frustum" intersects the four camera frustum rays, rotated by gimbal roll, pitch and yaw, with the ground plane (CameraCalculator model): it considers roll and works with oblique images: rays aiming over the horizon or farther than the maximum distance of view are limited to that distance. Offsets to bottom and upper distances are not used by the frustum engine.\n
+                       "Camera frustum on DEM" marches the frustum rays until they reach the DEM surface, starting from the drone AbsoluteAltitude: footprints follow the terrain instead of a flat ground at takeoff altitude. The DEM must be in the destination CRS with heights in the same datum of AbsoluteAltitude. Only the DEM blocks crossed by the rays are read.\n
+                       <b>Use height above DEM under nadir</b>: RelativeAltitude is the height over the takeoff point. If checked, wedge and frustum engines use instead AbsoluteAltitude minus the DEM height under the nadir (stored in height_above_ground field). Images without AbsoluteAltitude or out of the DEM keep RelativeAltitude.\n
+
+                       <b>Append to existing outputs</b>: only for GeoPackage outputs. Images already in the outputs, with the same file size and modification time, are skipped. Changed images are replaced, new images appended.\n
+
+                       <b>Resume from the last checkpoint</b>: only for GeoPackage outputs. A checkpoint is saved next to the footprints output after each block of images. If checked an interrupted run continues from the last checkpoint instead of starting again.\n
+                       Images that can not be processed (e.g. corrupted files or missing metadata) do not stop the run: they are logged and listed in a quarantine report (by default a CSV next to GeoPackage footprints output).\n
+
                        <b>Advanced parameters</b>
                        <b>Calc vertical FOV using image ratio</b>: If Checked the vertical FOV (Tall camera angle) is calculated. If Unckeked get the value from "Tall camera angle" field
                        <b>Tall camera angle</b>: Use this value if "Calc Vertical FOV using image ratio" is uncheked
                        <b>Empiric multiplier to fix tall FOV basing on image ratio</b>: A multiplier applied to calculated vertical FOV useful to adapt angle to the real view. Many times vertical FOV is a hard to discover value not registerd in the metadata.
                        <b>Offset to add to bottom distance result</b>: value added to nadir point dinstance
                        <b>Offset to add to upper distance result</b>:value added to nadir point dinstance
+                       <b>Metadata reader threads</b>: number of threads reading image metadata in advance. Useful when images are on network storage
+                       <b>Use metadata cache</b>: store metadata read from images in a cache. Images not changed since the previous run (same size and modification time) are not read again
+                       <b>Metadata cache file</b>: SQLite cache file. If not set a file in the user cache directory is used
+                       <b>Invalidate metadata cache</b>: empty the cache before the run forcing to read again all images
+                       <b>Quarantine report of the images not processed</b>: CSV with index, path and error of each image not processed
+                       <b>Maximum distance of view of camera frustum</b>: frustum rays are limited to this distance (metre). If 0 images viewing the horizon are quarantined
+                       <b>Segments of each footprint side following the DEM</b>: rays added along each frustum edge by the DEM engine, so that footprint sides follow the terrain
+                       <b>Ray marching step on DEM</b>: distance between the points of each ray tested against the DEM. If 0 the DEM pixel size is used
+                       <b>Log metadata and footprint of each image</b>: if unchecked only the summary is logged. Logging every image slows down big runs
+                       <b>Timings profile file</b>: JSON file where the timings of each processing stage are saved. The timings summary is always logged at the end
                        ''')
 
     def initAlgorithm(self, config=None):
@@ -221,7 +293,37 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
         self.addParameter(
             QgsProcessingParameterMultipleLayers(self.INPUT_LAYERS,
                                                 self.tr('Input layers'),
-                                                QgsProcessing.TypeRaster)
+                                                QgsProcessing.TypeRaster,
+                                                optional = True)
+        )
+
+        # images can be read from a folder or a manifest without loading them
+        # as layers
+        self.addParameter(
+            QgsProcessingParameterFile(self.INPUT_FOLDER,
+                                       self.tr('Input images folder'),
+                                       behavior = QgsProcessingParameterFile.Folder,
+                                       optional = True)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterString(self.FILE_PATTERN,
+                                         self.tr('Images file pattern (separated by ;)'),
+                                         defaultValue = DEFAULT_PATTERNS)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(self.RECURSIVE,
+                                          self.tr('Scan subfolders'),
+                                          defaultValue = False)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFile(self.INPUT_MANIFEST,
+                                       self.tr('Input images manifest (a path for each line)'),
+                                       behavior = QgsProcessingParameterFile.File,
+                                       extension = 'txt',
+                                       optional = True)
         )
 
         self.addParameter(
@@ -238,6 +340,64 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
                 QgsProcessing.TypeVectorPoint)
         )
 
+        self.addParameter(
+            QgsProcessingParameterBoolean(self.APPEND,
+                                          self.tr('Append to existing outputs skipping unchanged images'),
+                                          defaultValue = False)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(self.RESUME,
+                                          self.tr('Resume from the last checkpoint'),
+                                          defaultValue = False)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum (
+                self.ENGINE,
+                self.tr('Footprint engine'),
+                options=[self.tr('Wedge buffer (trigonometric)'),
+                         self.tr('Camera frustum (rotation and ray intersection)'),
+                         self.tr('Camera frustum on DEM (ray marching)')],
+                defaultValue = self.ENGINE_WEDGE)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterRasterLayer(self.DEM,
+                                              self.tr('DEM for camera frustum on DEM engine or height correction'),
+                                              optional = True)
+        )
+
+        self.addParameter(
+            QgsProcessingParameterBoolean(self.DEM_HEIGHT,
+                                          self.tr('Use height above DEM under nadir instead of RelativeAltitude'),
+                                          defaultValue = False)
+        )
+
+        parameter = QgsProcessingParameterNumber(self.MAX_VIEW_DISTANCE,
+                                                 self.tr('Maximum distance of view of camera frustum (0 = not limited)'),
+                                                 type = QgsProcessingParameterNumber.Double,
+                                                 defaultValue = 1000.0,
+                                                 minValue = 0)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterNumber(self.DEM_SEGMENTS,
+                                                 self.tr('Segments of each footprint side following the DEM'),
+                                                 type = QgsProcessingParameterNumber.Integer,
+                                                 defaultValue = 4,
+                                                 minValue = 1)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterNumber(self.DEM_STEP,
+                                                 self.tr('Ray marching step on DEM (0 = DEM pixel size)'),
+                                                 type = QgsProcessingParameterNumber.Double,
+                                                 defaultValue = 0.0,
+                                                 minValue = 0)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
         self.addParameter(
             QgsProcessingParameterEnum (
                 self.CAMERA_MODEL,
@@ -294,9 +454,87 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
         parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
         self.addParameter(parameter)
 
+        parameter = QgsProcessingParameterNumber(self.WORKERS,
+                                                 self.tr('Metadata reader threads'),
+                                                 type = QgsProcessingParameterNumber.Integer,
+                                                 defaultValue = 4,
+                                                 minValue = 1)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterBoolean(self.USE_METADATA_CACHE,
+                                                  self.tr('Use metadata cache'),
+                                                  defaultValue = True)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterFileDestination(self.METADATA_CACHE_FILE,
+                                                          self.tr('Metadata cache file'),
+                                                          fileFilter = 'SQLite (*.sqlite)',
+                                                          optional = True,
+                                                          createByDefault = False)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterBoolean(self.INVALIDATE_METADATA_CACHE,
+                                                  self.tr('Invalidate metadata cache'),
+                                                  defaultValue = False)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterFileDestination(self.QUARANTINE_FILE,
+                                                          self.tr('Quarantine report of the images not processed'),
+                                                          fileFilter = 'CSV (*.csv)',
+                                                          optional = True,
+                                                          createByDefault = False)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterBoolean(self.VERBOSE,
+                                                  self.tr('Log metadata and footprint of each image'),
+                                                  defaultValue = True)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+        parameter = QgsProcessingParameterFileDestination(self.PROFILE_FILE,
+                                                          self.tr('Timings profile file'),
+                                                          fileFilter = 'JSON (*.json)',
+                                                          optional = True,
+                                                          createByDefault = False)
+        parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(parameter)
+
+    def _iterSources(self, input_layers, input_folder, file_pattern, recursive, input_manifest):
+        """
+        Generator of the paths of all the input images: layers, then folder
+        images, then manifest images
+        """
+        for input_layer in input_layers:
+            if isinstance(input_layer, str):
+                yield input_layer
+            else:
+                yield input_layer.source()
+        if input_folder:
+            for path in iter_image_paths(input_folder, file_pattern, recursive):
+                yield path
+        if input_manifest:
+            for path in iter_manifest_paths(input_manifest):
+                yield path
+
     def processAlgorithm(self, parameters, context, feedback):
         input_layers = self.parameterAsLayerList(parameters, self.INPUT_LAYERS, context)
-
+        input_folder = self.parameterAsFile(parameters, self.INPUT_FOLDER, context)
+        file_pattern = self.parameterAsString(parameters, self.FILE_PATTERN, context)
+        recursive = self.parameterAsBoolean(parameters, self.RECURSIVE, context)
+        input_manifest = self.parameterAsFile(parameters, self.INPUT_MANIFEST, context)
+
+        engine = self.parameterAsEnum(parameters, self.ENGINE, context)
+        maxViewDistance = self.parameterAsDouble(parameters, self.MAX_VIEW_DISTANCE, context) or None
+        demLayer = self.parameterAsRasterLayer(parameters, self.DEM, context)
+        demSegments = self.parameterAsInt(parameters, self.DEM_SEGMENTS, context)
+        demStep = self.parameterAsDouble(parameters, self.DEM_STEP, context) or None
+        # the DEM engine already uses absolute altitudes
+        demHeight = self.parameterAsBoolean(parameters, self.DEM_HEIGHT, context) and engine != self.ENGINE_TERRAIN
         camera_model = self.parameterAsEnum(parameters, self.CAMERA_MODEL, context)
         camera_model = list(self.CAMERA_DATA)[camera_model]
         camera_data = self.CAMERA_DATA[camera_model]
@@ -310,6 +548,18 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
             feedback.pushInfo(self.tr('Getting destination CRS from source image'))
             destinationCRS = sourceCRS
 
+        if engine == self.ENGINE_TERRAIN or demHeight:
+            if demLayer is None:
+                raise QgsProcessingException(self.tr('Camera frustum on DEM engine and height above DEM need a DEM'))
+            if demLayer.crs() != destinationCRS:
+                raise QgsProcessingException(self.tr('DEM CRS {} is not the destination CRS').format(demLayer.crs().authid()))
+        if engine in (self.ENGINE_FRUSTUM, self.ENGINE_TERRAIN) and destinationCRS.isGeographic():
+            # rays are intersected in the CRS units together with the metric altitudes
+            raise QgsProcessingException(self.tr('Camera frustum engines need a projected destination CRS, not {}').format(destinationCRS.authid()))
+        if engine == self.ENGINE_TERRAIN:
+            if maxViewDistance is None:
+                raise QgsProcessingException(self.tr('Camera frustum on DEM engine needs a maximum distance of view'))
+
         feedback.pushInfo(self.tr('Source CRS is: ')+self.tr(sourceCRS.authid()))
         feedback.pushInfo(self.tr('Destination CRS is: ')+self.tr(destinationCRS.authid()))
 
@@ -327,26 +577,90 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
         fields.append(QgsField('camera_horizontal_FOV', QVariant.Double))
         fields.append(QgsField('nadir_to_bottom_offset', QVariant.Double))
         fields.append(QgsField('nadir_to_upper_offset', QVariant.Double))
-
-        (footprintSink, footprint_dest_id) = self.parameterAsSink(
-            parameters,
-            self.OUTPUT_FOOTPRINTS,
-            context,
-            fields,
-            QgsWkbTypes.Polygon,
-            destinationCRS)
-        if footprintSink is None:
-            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_FOOTPRINTS))
-
-        (nadirSink, nadir_dest_id) = self.parameterAsSink(
-            parameters,
-            self.OUTPUT_NADIRS,
-            context,
-            fields,
-            QgsWkbTypes.Point,
-            destinationCRS)
-        if nadirSink is None:
-            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_NADIRS))
+        # used to skip unchanged images in append mode
+        fields.append(QgsField('file_size', QVariant.LongLong))
+        fields.append(QgsField('file_mtime', QVariant.LongLong))
+        # NULL if RelativeAltitude is used
+        fields.append(QgsField('height_above_ground', QVariant.Double))
+
+        # GeoPackage file outputs are written in bulk with OGR, other
+        # destinations (e.g. memory layers) through processing sinks
+        append = self.parameterAsBoolean(parameters, self.APPEND, context)
+        resume = self.parameterAsBoolean(parameters, self.RESUME, context)
+        quarantineFile = self.parameterAsFileOutput(parameters, self.QUARANTINE_FILE, context)
+        checkpoint = None
+        checkpointFile = None
+        footprintWriter = None
+        nadirWriter = None
+        # path => (file_size, file_mtime) of the images already in the outputs
+        existingImages = {}
+        outputsContext = ExitStack()
+        if (is_geopackage_path(_destination(parameters, self.OUTPUT_FOOTPRINTS, context)) and
+                is_geopackage_path(_destination(parameters, self.OUTPUT_NADIRS, context))):
+            # resolve the paths and register the layers to load on completion
+            footprint_dest_id = self.parameterAsOutputLayer(parameters, self.OUTPUT_FOOTPRINTS, context)
+            nadir_dest_id = self.parameterAsOutputLayer(parameters, self.OUTPUT_NADIRS, context)
+            destinationSrs = osr.SpatialReference()
+            destinationSrs.ImportFromWkt(destinationCRS.toWkt())
+            ogrFields = _ogr_fields(fields)
+
+            checkpointFile = checkpoint_path(footprint_dest_id)
+            if resume:
+                checkpoint = read_checkpoint(checkpointFile)
+                if checkpoint is None:
+                    feedback.pushInfo(self.tr('No checkpoint found: starting from the first image'))
+                else:
+                    try:
+                        check_checkpoint(checkpoint, footprints=footprint_dest_id, nadirs=nadir_dest_id)
+                    except CheckpointError as ex:
+                        raise QgsProcessingException(self.tr('Checkpoint {} can not be resumed: {}').format(checkpointFile, ex))
+                    feedback.pushInfo(self.tr('Resuming after image {} of checkpoint {}').format(
+                        checkpoint['next_index'], checkpointFile))
+            if not quarantineFile:
+                quarantineFile = quarantine_path(footprint_dest_id)
+
+            # transactions are committed with the checkpoint at the end of each block
+            reopen = append or checkpoint is not None
+            footprintWriter = outputsContext.enter_context(GeoPackageWriter(footprint_dest_id, batchSize = None, overwrite = not reopen))
+            nadirWriter = outputsContext.enter_context(GeoPackageWriter(nadir_dest_id, batchSize = None, overwrite = not reopen))
+            if reopen:
+                footprintLayer = footprintWriter.openLayer(_layer_name(footprint_dest_id),
+                                                           ogr.wkbPolygon, destinationSrs, ogrFields)
+                nadirLayer = nadirWriter.openLayer(_layer_name(nadir_dest_id),
+                                                   ogr.wkbPoint, destinationSrs, ogrFields)
+                existingImages = footprintWriter.readIndex(footprintLayer, 'path', ('file_size', 'file_mtime'))
+                feedback.pushInfo(self.tr('Images already in the outputs: {}').format(len(existingImages)))
+                if checkpoint is not None:
+                    # nadirs committed without their footprints before the interruption
+                    orphans = set(nadirWriter.readIndex(nadirLayer, 'path', ())) - set(existingImages)
+                    nadirWriter.deleteWhere(nadirLayer, 'path', orphans)
+            else:
+                footprintLayer = footprintWriter.createLayer(_layer_name(footprint_dest_id),
+                                                             ogr.wkbPolygon, destinationSrs, ogrFields)
+                nadirLayer = nadirWriter.createLayer(_layer_name(nadir_dest_id),
+                                                     ogr.wkbPoint, destinationSrs, ogrFields)
+        elif append or resume:
+            raise QgsProcessingException(self.tr('Append and resume modes need GeoPackage (.gpkg) file outputs'))
+        else:
+            (footprintSink, footprint_dest_id) = self.parameterAsSink(
+                parameters,
+                self.OUTPUT_FOOTPRINTS,
+                context,
+                fields,
+                QgsWkbTypes.Polygon,
+                destinationCRS)
+            if footprintSink is None:
+                raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_FOOTPRINTS))
+
+            (nadirSink, nadir_dest_id) = self.parameterAsSink(
+                parameters,
+                self.OUTPUT_NADIRS,
+                context,
+                fields,
+                QgsWkbTypes.Point,
+                destinationCRS)
+            if nadirSink is None:
+                raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_NADIRS))
 
         # use tese params only if Camera modes is set to Advanced
         horizontalFOV = self.parameterAsDouble(parameters, self.HORIZONTAL_FOV, context)
@@ -359,178 +673,317 @@ class BatchUAVImageFootprints(QgsProcessingAlgorithm):
         self.CAMERA_DATA[camera_model]['nadir_to_bottom_offset'] = nadirToBottomOffset
         self.CAMERA_DATA[camera_model]['nadir_to_upper_offset'] = nadirToupperOffset
 
-        # loop for each file
-        progress_step = 100.0/len(input_layers)
-
-        feedback.pushInfo("Going to process: {} images".format(len(input_layers)))
-        for index, input_layer in enumerate(input_layers):
+        workers = self.parameterAsInt(parameters, self.WORKERS, context)
+        verbose = self.parameterAsBoolean(parameters, self.VERBOSE, context)
+        profileFile = self.parameterAsFileOutput(parameters, self.PROFILE_FILE, context)
+        timer = StageTimer()
+
+        useMetadataCache = self.parameterAsBoolean(parameters, self.USE_METADATA_CACHE, context)
+        metadataCache = None
+        cacheContext = nullcontext()
+        if useMetadataCache:
+            metadataCacheFile = self.parameterAsFileOutput(parameters, self.METADATA_CACHE_FILE, context)
+            metadataCache = MetadataCache(metadataCacheFile or default_cache_path(), evictOnClose=True)
+            cacheContext = metadataCache
+            feedback.pushInfo(self.tr('Metadata cache: ')+metadataCache.path)
+            if self.parameterAsBoolean(parameters, self.INVALIDATE_METADATA_CACHE, context):
+                feedback.pushInfo(self.tr('Invalidating metadata cache'))
+                metadataCache.invalidate()
+
+        # run in the threads pool: timings are returned with the record.
+        # Record is None if the image is already in the outputs and not changed
+        def reader(source):
+            timings = {}
+            stat = os.stat(source)
+            if existingImages.get(source) == (stat.st_size, stat.st_mtime_ns):
+                return None, timings
+            if metadataCache is None:
+                record = read_image_record(source, timings)
+            else:
+                with timed(timings, 'metadata cache'):
+                    record = metadataCache.read(source, functools.partial(read_image_record, timings=timings), stat)
+                # only lookup and store time
+                timings['metadata cache'] -= sum(seconds for stage, seconds in timings.items() if stage != 'metadata cache')
+            record['file_size'] = stat.st_size
+            record['file_mtime'] = stat.st_mtime_ns
+            return record, timings
+
+        # folder and manifest images are only counted here, paths are
+        # listed lazily during the processing
+        feedback.pushInfo(self.tr('Counting input images'))
+        imagesCount = len(input_layers) + count_image_paths(input_folder, file_pattern, recursive, input_manifest)
+        if imagesCount == 0:
+            raise QgsProcessingException(self.tr('No input images: set input layers, folder or manifest'))
+        if checkpoint is not None:
             try:
-                index += 1
-
-                if feedback.isCanceled():
-                    return {}
+                check_checkpoint(checkpoint, inputs=imagesCount)
+            except CheckpointError as ex:
+                raise QgsProcessingException(self.tr('Checkpoint {} can not be resumed: {}').format(checkpointFile, ex))
 
-                if isinstance(input_layer, str):
-                    source = input_layer
-                else:
-                    source = input_layer.source()
-                feedback.pushInfo("##### {}:Processing image: {}".format(index, source))
-
-                # extract exif and XMP data
-                try:
-                    gdal.UseExceptions()
-                    dataFrame = gdal.Open(source, gdal.GA_ReadOnly)
-                    domains = dataFrame.GetMetadataDomainList()
-
-                    # get exif metadata
-                    exifTags = dataFrame.GetMetadata()
-                    for key, value in exifTags.items():
-                        #print(key, ':', value)
-                        pass
-
-                    # select metadata from XMP domain only
-                    droneMetadata = {}
-                    for domain in domains:
-                        metadata = dataFrame.GetMetadata(domain)
-
-                        # skip not relevant tags
-                        if isinstance(metadata, dict):
-                            for key, value in metadata.items():
-                                #print(domain, "--", key, ":", value)
-                                pass
-
-                        # probably XMPs
-                        if isinstance(metadata, list):
-                            if domain == 'xml:XMP':
-                                # parse xml
-                                root = ElementTree.XML(metadata[0])
-                                xmldict = XmlDictConfig(root)
-
-                                # skip first element containing only description and domain info
-                                subdict = list(xmldict.values())[0]
-
-                                # get XMP tags
-                                subdict = list(subdict.values())[0]
-                                # parse XMP stuffs removing head namespace in the key 
-                                # e.g.
-                                #    {http://www.dji.com/drone-dji/1.0/}AbsoluteAltitude
-                                # become
-                                #    AbsoluteAltitude
-                                for key, value in subdict.items():
-                                    #print(domain, '--', key, value)
-                                    key = key.split('}')[1]
-                                    droneMetadata[key] = value
-
-                except Exception as ex:
-                    raise QgsProcessingException(str(ex))
-                
-                # extract all important tagged information about the image
+        # loop for each file
+        progress_step = 100.0/imagesCount
+
+        sources = self._iterSources(input_layers, input_folder, file_pattern, recursive, input_manifest)
+        # images before the checkpoint are not read at all
+        startIndex = 0
+        if checkpoint is not None:
+            startIndex = checkpoint['next_index']
+            sources = islice(sources, startIndex, None)
+
+        # set before starting threads because it's a global GDAL setting
+        gdal.UseExceptions()
+
+        # a single transformation for the whole run. Nadirs are transformed
+        # in bulk for each block of images
+        transform = QgsCoordinateTransform(sourceCRS, destinationCRS, QgsProject.instance())
+
+        feedback.pushInfo("Going to process: {} images".format(imagesCount))
+        processed = 0
+        skipped = 0
+        replaced = 0
+        quarantine = QuarantineReport(quarantineFile or None, append = checkpoint is not None)
+
+        # DEM blocks are read on demand and cached for the whole run
+        dem = None
+        # images whose RelativeAltitude can't be replaced by the height above DEM
+        notCorrected = 0
+        if engine == self.ENGINE_TERRAIN or demHeight:
+            dem = outputsContext.enter_context(DemReader(demLayer.source()))
+
+        def quarantineImage(index, source, ex):
+            """
+            Bad images are reported and skipped instead of stopping the run
+            """
+            feedback.reportError(self.tr('{}:Image quarantined: {}: {}').format(index, source, ex))
+            if verbose:
+                feedback.pushInfo(traceback.format_exc())
+            quarantine.add(index, source, ex)
+
+        # the cache is closed (and pending records stored) also if the run is canceled
+        with cacheContext, outputsContext, quarantine, closing(_prefetch_metadata(sources, workers, reader)) as prefetched:
+            for block in _chunks(enumerate(prefetched, startIndex + 1), self.BLOCK_SIZE):
+
+                # collect metadata of all the images of the block
+                images = []
+                for index, (source, metadataFuture) in block:
+                    try:
+                        if feedback.isCanceled():
+                            return {}
+
+                        # extract exif and XMP data (already read, or being read, by the threads pool)
+                        with timer.stage('metadata wait'):
+                            record, timings = metadataFuture.result()
+                        timer.update(timings)
+
+                        if record is None:
+                            skipped += 1
+                            feedback.setProgress(int(index*progress_step))
+                            continue
+
+                        if verbose:
+                            feedback.pushInfo("##### {}:Processing image: {}".format(index, source))
+                            feedback.pushInfo("EXIF_DateTime: "+record['date_time'])
+
+                            imageRatio = float(record['image_width'])/float(record['image_height'])
+                            feedback.pushInfo("EXIF_PixelXDimension: "+str(record['image_width']))
+                            feedback.pushInfo("EXIF_PixelYDimension: "+str(record['image_height']))
+                            feedback.pushInfo("Image ratio: "+str(imageRatio))
+
+                            # drone especific metadata
+                            feedback.pushInfo("EXIF_Make: "+record['make'])
+                            feedback.pushInfo("EXIF_Model: "+record['model'])
+
+                            # drone maker substitute XMP drone dictKey
+                            dictKey = record['make']
+
+                            feedback.pushInfo(self.tr("XMP {}:RelativeAltitude: ".format(dictKey))+str(record['relative_altitude']))
+                            feedback.pushInfo("XMP {}:GimbalRollDegree: ".format(dictKey)+str(record['gimbal_roll']))
+                            feedback.pushInfo("XMP {}:GimbalPitchDegree: ".format(dictKey)+str(record['gimbal_pitch']))
+                            feedback.pushInfo("XMP {}:GimbalYawDegree: ".format(dictKey)+str(record['gimbal_yaw']))
+                            feedback.pushInfo("XMP {}:FlightRollDegree: ".format(dictKey)+str(record['flight_roll']))
+                            feedback.pushInfo("XMP {}:FlightPitchDegree: ".format(dictKey)+str(record['flight_pitch']))
+                            feedback.pushInfo("XMP {}:FlightYawDegree: ".format(dictKey)+str(record['flight_yaw']))
+
+                        images.append((index, source, record))
+                    except Exception as ex:
+                        quarantineImage(index, source, ex)
 
                 # get image lat/lon that will be the coordinates of nadir point
-                # converted to destination CRS
-                lat = _convert_to_degress(exifTags['EXIF_GPSLatitude'])
-                emisphere = exifTags['EXIF_GPSLatitudeRef']
-                lon = _convert_to_degress(exifTags['EXIF_GPSLongitude'])
-                lonReference = exifTags['EXIF_GPSLongitudeRef']
-
-                if emisphere == 'S':
-                    lat = -lat
-                if lonReference == 'W':
-                    lon = -lon
-
-                exifDateTime = exifTags['EXIF_DateTime']
-                feedback.pushInfo("EXIF_DateTime: "+exifDateTime)
-
-                exifImageWidth = exifTags['EXIF_PixelXDimension']
-                exifImageLength = exifTags['EXIF_PixelYDimension']
-                imageRatio = float(exifImageWidth)/float(exifImageLength)
-                feedback.pushInfo("EXIF_PixelXDimension: "+exifImageWidth)
-                feedback.pushInfo("EXIF_PixelYDimension: "+exifImageLength)
-                feedback.pushInfo("Image ratio: "+str(imageRatio))
-
-                # drone especific metadata
-                droneMaker = exifTags['EXIF_Make']
-                droneModel = exifTags['EXIF_Model']
-                feedback.pushInfo("EXIF_Make: "+droneMaker)
-                feedback.pushInfo("EXIF_Model: "+droneModel)
-
-                # drone maker substitute XMP drone dictKey
-                dictKey = droneMaker
-
-                relativeAltitude = float(droneMetadata['RelativeAltitude'])
-                feedback.pushInfo(self.tr("XMP {}:RelativeAltitude: ".format(dictKey))+str(relativeAltitude))
-
-                gimballRoll = float(droneMetadata['GimbalRollDegree'])
-                gimballPitch = float(droneMetadata['GimbalPitchDegree'])
-                gimballYaw = float(droneMetadata['GimbalYawDegree'])
-                feedback.pushInfo("XMP {}:GimbalRollDegree: ".format(dictKey)+str(gimballRoll))
-                feedback.pushInfo("XMP {}:GimbalPitchDegree: ".format(dictKey)+str(gimballPitch))
-                feedback.pushInfo("XMP {}:GimbalYawDegree: ".format(dictKey)+str(gimballYaw))
-
-                flightRoll = float(droneMetadata['FlightRollDegree'])
-                flightPitch = float(droneMetadata['FlightPitchDegree'])
-                flightYaw = float(droneMetadata['FlightYawDegree'])
-                feedback.pushInfo("XMP {}:FlightRollDegree: ".format(dictKey)+str(flightRoll))
-                feedback.pushInfo("XMP {}:FlightPitchDegree: ".format(dictKey)+str(flightPitch))
-                feedback.pushInfo("XMP {}:FlightYawDegree: ".format(dictKey)+str(flightYaw))
-
-                feedback.pushInfo(self.tr("Horizontal FOV: ")+str(horizontalFOV))
-                feedback.pushInfo(self.tr("Vertical FOV: ")+str(verticalFOV))
-
-                # do calculation inspired by:
-                # https://photo.stackexchange.com/questions/56596/how-do-i-calculate-the-ground-footprint-of-an-aerial-camera
-                # distance of the nearest point to nadir (bottom distance)
-                bottomDistance = relativeAltitude*(math.tan(math.radians(90 - gimballPitch - 0.5*verticalFOV)))
-                # distance of the farest point to nadir (upper distance)
-                upperDistance = relativeAltitude*(math.tan(math.radians(90 - gimballPitch + 0.5*verticalFOV)))
-
-                feedback.pushInfo(self.tr("Northing (degree): ")+str(gimballYaw))
-                feedback.pushInfo(self.tr("Nadir to bottom distance (metre): ")+str(bottomDistance))
-                feedback.pushInfo(self.tr("Nadir to upper distance (metre): ")+str(upperDistance))
-
-                # create base feature to add
-                layerName = os.path.basename(source)
-                layerName = os.path.splitext(layerName)[0]
-
-                feature = QgsFeature(fields)
-                feature.setAttribute('date_time', exifDateTime)
-                feature.setAttribute('gimball_pitch', gimballPitch)
-                feature.setAttribute('gimball_roll', gimballRoll)
-                feature.setAttribute('gimball_jaw', gimballYaw)
-                feature.setAttribute('relative_altitude', relativeAltitude)
-                feature.setAttribute('layer', layerName)
-                feature.setAttribute('path', source)
-                feature.setAttribute('camera_model', droneModel)
-                feature.setAttribute('camera_vertical_FOV', verticalFOV)
-                feature.setAttribute('camera_horizontal_FOV', horizontalFOV)
-                feature.setAttribute('nadir_to_bottom_offset', nadirToBottomOffset)
-                feature.setAttribute('nadir_to_upper_offset', nadirToupperOffset)
-
-                # populate nadir layer
-                droneLocation = QgsPoint(lon, lat)
-                tr = QgsCoordinateTransform(sourceCRS, destinationCRS, QgsProject.instance())
-                droneLocation.transform(tr)
-                feedback.pushInfo(self.tr("Nadir coordinates (lon, lat): ")+'{}, {}'.format(droneLocation.x(), droneLocation.y()))
-
-                nadirGeometry = QgsGeometry.fromPointXY(QgsPointXY(droneLocation.x(), droneLocation.y()))
-                feature.setGeometry(nadirGeometry)
-                nadirSink.addFeature(feature, QgsFeatureSink.FastInsert)
-
-                # create footprint to add to footprint sink
-                feature = QgsFeature(feature)
-                footprint = QgsGeometry.createWedgeBuffer(QgsPoint(droneLocation.x(), droneLocation.y()),
-                                                        gimballYaw,
-                                                        horizontalFOV,
-                                                        abs(bottomDistance) + nadirToBottomOffset,
-                                                        abs(upperDistance) + nadirToupperOffset)
-                feature.setGeometry(footprint)
-                footprintSink.addFeature(feature, QgsFeatureSink.FastInsert)
-
-                feedback.setProgress(int(index*progress_step))
-            except Exception as ex:
-                exc_type, exc_obj, exc_trace = sys.exc_info()
-                trace = traceback.format_exception(exc_type, exc_obj, exc_trace)
-                raise QgsProcessingException(''.join(trace))
+                # converted to destination CRS with a single call for all the block
+                with timer.stage('CRS transform'):
+                    nadirXs, nadirYs = _transform_coordinates(transform,
+                                                              [record['longitude'] for _, _, record in images],
+                                                              [record['latitude'] for _, _, record in images])
+
+                # second pass: footprints of all the images of the block with array operations
+                with timer.stage('geometry build'):
+                    relativeAltitudes = np.array([record['relative_altitude'] for _, _, record in images])
+                    absoluteAltitudes = np.array([np.nan if record['absolute_altitude'] is None else record['absolute_altitude']
+                                                  for _, _, record in images])
+                    gimballRolls = np.array([record['gimbal_roll'] for _, _, record in images])
+                    gimballPitches = np.array([record['gimbal_pitch'] for _, _, record in images])
+                    gimballYaws = np.array([record['gimbal_yaw'] for _, _, record in images])
+                    heights = np.full(len(images), np.nan)
+                if demHeight:
+                    # DEM under all the nadirs of the block with a single read
+                    with timer.stage('DEM sampling'):
+                        heights = heights_above_ground(dem, nadirXs, nadirYs, absoluteAltitudes)
+                    corrected = np.isfinite(heights)
+                    notCorrected += int((~corrected).sum())
+                    relativeAltitudes = np.where(corrected, heights, relativeAltitudes)
+                with timer.stage('geometry build'):
+                    if engine == self.ENGINE_FRUSTUM:
+                        rings, validRings = frustum_footprints(nadirXs, nadirYs, relativeAltitudes,
+                                                               gimballRolls, gimballPitches, gimballYaws,
+                                                               horizontalFOV, verticalFOV, maxViewDistance)
+                    elif engine == self.ENGINE_TERRAIN:
+                        rings, validRings = terrain_footprints(dem, nadirXs, nadirYs, absoluteAltitudes,
+                                                               gimballRolls, gimballPitches, gimballYaws,
+                                                               horizontalFOV, verticalFOV, maxViewDistance,
+                                                               demSegments, demStep)
+                    else:
+                        # distance of the nearest (bottom) and farest (upper) point to nadir
+                        bottomDistances, upperDistances = wedge_distances(relativeAltitudes, gimballPitches, verticalFOV)
+
+                # features (or WKB rows) of the block, written together at the end
+                nadirFeatures = []
+                footprintFeatures = []
+                for position, ((index, source, record), nadirX, nadirY) in enumerate(zip(images, nadirXs, nadirYs)):
+                    try:
+                        relativeAltitude = record['relative_altitude']
+                        gimballRoll = record['gimbal_roll']
+                        gimballPitch = record['gimbal_pitch']
+                        gimballYaw = record['gimbal_yaw']
+
+                        with timer.stage('geometry build'):
+                            # attributes in the same order of fields
+                            layerName = os.path.basename(source)
+                            layerName = os.path.splitext(layerName)[0]
+                            attributes = [
+                                record['date_time'],
+                                gimballPitch,
+                                gimballRoll,
+                                gimballYaw,
+                                relativeAltitude,
+                                layerName,
+                                source,
+                                record['model'],
+                                verticalFOV,
+                                horizontalFOV,
+                                nadirToBottomOffset,
+                                nadirToupperOffset,
+                                record['file_size'],
+                                record['file_mtime'],
+                                None if np.isnan(heights[position]) else float(heights[position])
+                            ]
+
+                            if engine == self.ENGINE_TERRAIN and not validRings[position]:
+                                raise QgsProcessingException(self.tr('AbsoluteAltitude not available or camera under the DEM surface'))
+                            if engine != self.ENGINE_WEDGE:
+                                if not validRings[position]:
+                                    raise QgsProcessingException(self.tr('The camera frustum reaches the horizon: footprint is not bounded'))
+                                ring = rings[position]
+                                if footprintWriter is not None:
+                                    footprintWkb = polygon_wkb(ring)
+                                else:
+                                    footprint = QgsGeometry.fromPolygonXY([[QgsPointXY(x, y) for x, y in ring]])
+                            else:
+                                bottomDistance = float(bottomDistances[position])
+                                upperDistance = float(upperDistances[position])
+                                footprint = QgsGeometry.createWedgeBuffer(QgsPoint(nadirX, nadirY),
+                                                                        gimballYaw,
+                                                                        horizontalFOV,
+                                                                        abs(bottomDistance) + nadirToBottomOffset,
+                                                                        abs(upperDistance) + nadirToupperOffset)
+                                if footprintWriter is not None:
+                                    # wedge arcs are segmentized to be stored in a Polygon layer
+                                    footprintWkb = bytes(footprint.constGet().segmentize().asWkb())
+
+                            if footprintWriter is not None:
+                                nadirFeatures.append((attributes, point_wkb(nadirX, nadirY)))
+                                footprintFeatures.append((attributes, footprintWkb))
+                            else:
+                                feature = QgsFeature(fields)
+                                feature.setAttributes(attributes)
+                                feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(nadirX, nadirY)))
+                                nadirFeatures.append(feature)
+
+                                feature = QgsFeature(feature)
+                                feature.setGeometry(footprint)
+                                footprintFeatures.append(feature)
+
+                        if verbose:
+                            feedback.pushInfo("##### {}:Footprint of image: {}".format(index, source))
+                            feedback.pushInfo(self.tr("Horizontal FOV: ")+str(horizontalFOV))
+                            feedback.pushInfo(self.tr("Vertical FOV: ")+str(verticalFOV))
+                            feedback.pushInfo(self.tr("Northing (degree): ")+str(gimballYaw))
+                            if engine != self.ENGINE_WEDGE:
+                                feedback.pushInfo(self.tr("Footprint corners: ")+str(rings[position][:4].tolist()))
+                            else:
+                                feedback.pushInfo(self.tr("Nadir to bottom distance (metre): ")+str(bottomDistance))
+                                feedback.pushInfo(self.tr("Nadir to upper distance (metre): ")+str(upperDistance))
+                            feedback.pushInfo(self.tr("Nadir coordinates (lon, lat): ")+'{}, {}'.format(nadirX, nadirY))
+
+                        feedback.setProgress(int(index*progress_step))
+                    except Exception as ex:
+                        quarantineImage(index, source, ex)
+
+                with timer.stage('sink write'):
+                    if footprintWriter is not None:
+                        # old features of changed images are replaced
+                        changedSources = [attributes[6] for attributes, _ in footprintFeatures
+                                          if attributes[6] in existingImages]
+                        nadirWriter.deleteWhere(nadirLayer, 'path', changedSources)
+                        footprintWriter.deleteWhere(footprintLayer, 'path', changedSources)
+                        for attributes, wkb in nadirFeatures:
+                            nadirWriter.add(nadirLayer, attributes, wkb)
+                        for attributes, wkb in footprintFeatures:
+                            footprintWriter.add(footprintLayer, attributes, wkb)
+                    else:
+                        # a single call for all the features of the block
+                        nadirSink.addFeatures(nadirFeatures, QgsFeatureSink.FastInsert)
+                        footprintSink.addFeatures(footprintFeatures, QgsFeatureSink.FastInsert)
+
+                processed += len(footprintFeatures)
+                if footprintWriter is not None:
+                    replaced += len(changedSources)
+                    # nadirs are committed before footprints: on resume nadirs
+                    # without footprint are removed
+                    with timer.stage('checkpoint'):
+                        nadirWriter.flush()
+                        footprintWriter.flush()
+                        write_checkpoint(checkpointFile, {
+                            'next_index': block[-1][0],
+                            'inputs': imagesCount,
+                            'footprints': footprint_dest_id,
+                            'nadirs': nadir_dest_id,
+                        })
+
+        # the run is completed: nothing to resume
+        if checkpointFile is not None:
+            remove_checkpoint(checkpointFile)
+
+        if quarantine.count:
+            feedback.reportError(self.tr('Images quarantined: {}').format(quarantine.count))
+            if quarantine.path:
+                feedback.pushInfo(self.tr('Quarantine report: ')+quarantine.path)
+
+        if notCorrected:
+            feedback.reportError(self.tr('Images using RelativeAltitude (no AbsoluteAltitude or out of DEM): {}').format(notCorrected))
+
+        if append:
+            feedback.pushInfo(self.tr('Unchanged images skipped: {} changed images replaced: {}').format(skipped, replaced))
+
+        # writers are closed here: spatial index build is included in the total time
+        feedback.pushInfo(self.tr('Timings summary:'))
+        for line in timer.report(processed):
+            feedback.pushInfo(line)
+        if profileFile:
+            timer.write_json(profileFile, processed, workers=workers, block_size=self.BLOCK_SIZE)
+            feedback.pushInfo(self.tr('Timings profile: ')+profileFile)
+
+        if metadataCache is not None:
+            feedback.pushInfo(self.tr('Metadata cache hits: {} misses: {}').format(metadataCache.hits, metadataCache.misses))
 
         # Return the results
         results = {
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    run_benchmarks.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+# benchmarks run from the repository checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera_calculator import CameraCalculator
+from image_metadata import read_image_record
+from synthetic_images import generate_images, synthetic_pose
+
+# images of the end to end benchmarks
+DEFAULT_SIZES = (1000, 10000, 100000)
+# poses of the CameraCalculator benchmarks
+POSES = 10000
+# files of the metadata extraction benchmark
+METADATA_FILES = 1000
+# relative slowdown reported as regression by --compare
+DEFAULT_THRESHOLD = 0.10
+
+FOVH = math.radians(67.07)
+FOVV = math.radians(52.86)
+
+
+def _measure(function, items, repeat):
+    """
+    Run function repeat times and keep the best time
+    :return: dict with items, seconds and per item microseconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return OrderedDict([
+        ('items', items),
+        ('seconds', best),
+        ('per_item_us', best/items*1e6),
+        ('items_per_second', items/best if best > 0 else 0.0),
+    ])
+
+def _poses(count):
+    poses = [synthetic_pose(index) for index in range(count)]
+    altitude = np.array([pose['relative_altitude'] for pose in poses])
+    roll = np.radians([pose['gimbal_roll'] for pose in poses])
+    pitch = np.radians([pose['gimbal_pitch'] for pose in poses])
+    heading = np.radians([pose['gimbal_yaw'] for pose in poses])
+    return altitude, roll, pitch, heading
+
+def bench_bounding_polygon(repeat):
+    """
+    CameraCalculator.getBoundingPolygon called once for each pose
+    """
+    altitude, roll, pitch, heading = _poses(POSES)
+    def run():
+        for pose in zip(altitude, roll, pitch, heading):
+            CameraCalculator.getBoundingPolygon(FOVH, FOVV, *pose)
+    return _measure(run, POSES, repeat)
+
+def bench_bounding_polygons(repeat):
+    """
+    CameraCalculator.getBoundingPolygons called once for all the poses
+    """
+    altitude, roll, pitch, heading = _poses(POSES)
+    def run():
+        CameraCalculator.getBoundingPolygons(FOVH, FOVV, altitude, roll, pitch, heading)
+    return _measure(run, POSES, repeat)
+
+def bench_metadata(folder, repeat):
+    """
+    read_image_record for each file
+    """
+    paths = generate_images(folder, METADATA_FILES)
+    def run():
+        for path in paths:
+            read_image_record(path)
+    return _measure(run, len(paths), repeat)
+
+def bench_end_to_end(folder, size, workers, repeat):
+    """
+    uav_footprint_cli footprints command on size images: metadata, geometry
+    and GeoPackage write. Needs GDAL python bindings
+    """
+    import uav_footprint_cli
+    generate_images(folder, size)
+    output = os.path.join(folder, 'footprints_{}.gpkg'.format(size))
+    manifest = os.path.join(folder, 'manifest_{}.txt'.format(size))
+    with open(manifest, 'w') as f:
+        for index in range(size):
+            f.write('DJI_{:07d}.JPG\n'.format(index))
+    def run():
+        status = uav_footprint_cli.main(['footprints', output,
+                                         '--manifest', manifest,
+                                         '--destination-crs', 'EPSG:25829',
+                                         '--workers', str(workers),
+                                         '--overwrite'])
+        if status != 0:
+            raise RuntimeError('footprints command failed with status {}'.format(status))
+    return _measure(run, size, repeat)
+
+def run_benchmarks(args):
+    results = OrderedDict()
+    results['bounding_polygon_per_pose'] = bench_bounding_polygon(args.repeat)
+    results['bounding_polygons_batch'] = bench_bounding_polygons(args.repeat)
+    results['metadata_per_file'] = bench_metadata(args.workdir, args.repeat)
+    for size in args.sizes:
+        name = 'end_to_end_{}'.format(size)
+        try:
+            results[name] = bench_end_to_end(args.workdir, size, args.workers, 1)
+        except ImportError as ex:
+            results[name] = OrderedDict([('skipped', str(ex))])
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of (name, ratio, regression) for the benchmarks in both results.
+        ratio is current time/baseline time per item
+    """
+    comparison = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or 'per_item_us' not in current or 'per_item_us' not in previous:
+            continue
+        ratio = current['per_item_us']/previous['per_item_us']
+        comparison.append((name, ratio, ratio > 1.0 + threshold))
+    return comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run footprint benchmarks on synthetic images')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'uav_footprint_benchmarks'),
+        help='folder of the synthetic images, reused between runs (default: %(default)s)')
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES),
+        help='images of the end to end benchmarks (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+        help='processes of the end to end benchmarks (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='repetitions of the micro benchmarks, the best is kept (default: %(default)s)')
+    parser.add_argument('--output', help='JSON file where results are saved')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='relative slowdown reported as regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    report = OrderedDict([
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('platform', platform.platform()),
+        ('cpus', os.cpu_count()),
+        ('results', results),
+    ])
+
+    for name, result in results.items():
+        if 'skipped' in result:
+            print('{:<28} skipped: {}'.format(name, result['skipped']))
+        else:
+            print('{:<28} {:>10} items {:>10.3f} s {:>12.2f} us/item {:>12.1f} items/s'.format(
+                name, result['items'], result['seconds'], result['per_item_us'], result['items_per_second']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        for name, ratio, regression in compare(results, baseline, args.threshold):
+            print('{:<28} {:>8.2f}x {}'.format(name, ratio, 'REGRESSION' if regression else ''))
+            if regression:
+                status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
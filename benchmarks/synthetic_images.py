@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    synthetic_images.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import sys
+import math
+import base64
+import random
+import struct
+import argparse
+
+# 8x8 pixels baseline JPEG used as image data of all the synthetic images.
+# Only the marker segments before the image data are read to extract metadata,
+# but the result is a valid JPEG that GDAL or any viewer can open.
+_JPEG_IMAGE = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9'
+    'PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhC'
+    'Y2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAAR'
+    'CAAIAAgDASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAA'
+    'AgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkK'
+    'FhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWG'
+    'h4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl'
+    '5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREA'
+    'AgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYk'
+    'NOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOE'
+    'hYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk'
+    '5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwCnRRRXGZH/2Q=='
+)
+
+_TIFF_ASCII = 2
+_TIFF_SHORT = 3
+_TIFF_LONG = 4
+_TIFF_RATIONAL = 5
+_TIFF_BYTE = 1
+
+_EXIF_IFD_POINTER = 0x8769
+_GPS_IFD_POINTER = 0x8825
+
+# survey area center and size
+ORIGIN_LATITUDE = 43.0112
+ORIGIN_LONGITUDE = -7.5568
+# distance between images along the flight line and between lines (metre)
+IMAGE_SPACING = 20.0
+LINE_SPACING = 40.0
+IMAGES_PER_LINE = 100
+
+
+def _ascii(text):
+    data = text.encode('latin-1') + b'\x00'
+    return (_TIFF_ASCII, len(data), data)
+
+def _short(value):
+    return (_TIFF_SHORT, 1, struct.pack('<H', value))
+
+def _long(value):
+    return (_TIFF_LONG, 1, struct.pack('<I', value))
+
+def _rationals(values, denominator=10000):
+    data = b''.join(struct.pack('<II', int(round(value*denominator)), denominator)
+                    for value in values)
+    return (_TIFF_RATIONAL, len(values), data)
+
+def _bytes(values):
+    return (_TIFF_BYTE, len(values), bytes(values))
+
+def _ifd(entries, offset):
+    """
+    Serialize a little endian TIFF IFD
+    :param entries: dict tag => (type, count, value bytes)
+    :param offset: offset of the IFD in the TIFF payload
+    :return: IFD bytes followed by the values not fitting in 4 bytes
+    """
+    header = struct.pack('<H', len(entries))
+    data = b''
+    dataOffset = offset + 2 + 12*len(entries) + 4
+    for tag in sorted(entries):
+        fieldType, count, value = entries[tag]
+        if len(value) <= 4:
+            header += struct.pack('<HHI', tag, fieldType, count) + value.ljust(4, b'\x00')
+        else:
+            header += struct.pack('<HHII', tag, fieldType, count, dataOffset + len(data))
+            data += value
+            if len(data) % 2:
+                data += b'\x00'
+    return header + struct.pack('<I', 0) + data
+
+def _degrees_minutes_seconds(value):
+    value = abs(value)
+    degrees = math.floor(value)
+    minutes = math.floor((value - degrees)*60)
+    seconds = (value - degrees - minutes/60.0)*3600
+    return (degrees, minutes, seconds)
+
+def exif_segment(pose):
+    """
+    :param pose: dict as returned by synthetic_pose
+    :return: APP1 Exif segment (marker included) with IFD0, Exif and GPS IFDs
+    """
+    ifd0 = {
+        0x010F: _ascii('DJI'),
+        0x0110: _ascii('FC6310'),
+        0x0132: _ascii(pose['date_time']),
+        _EXIF_IFD_POINTER: _long(0),
+        _GPS_IFD_POINTER: _long(0),
+    }
+    exifIfd = {
+        0x9003: _ascii(pose['date_time']),
+        0x920A: _rationals([8.8], 100),
+        0xA002: _long(5472),
+        0xA003: _long(3648),
+        0xA405: _short(24),
+    }
+    gpsIfd = {
+        0x0000: _bytes([2, 3, 0, 0]),
+        0x0001: _ascii('N' if pose['latitude'] >= 0 else 'S'),
+        0x0002: _rationals(_degrees_minutes_seconds(pose['latitude'])),
+        0x0003: _ascii('E' if pose['longitude'] >= 0 else 'W'),
+        0x0004: _rationals(_degrees_minutes_seconds(pose['longitude'])),
+        0x0005: _bytes([0]),
+        0x0006: _rationals([pose['absolute_altitude']], 1000),
+    }
+    # IFD0 size does not depend on the pointer values
+    ifd0Offset = 8
+    exifOffset = ifd0Offset + len(_ifd(ifd0, ifd0Offset))
+    gpsOffset = exifOffset + len(_ifd(exifIfd, exifOffset))
+    ifd0[_EXIF_IFD_POINTER] = _long(exifOffset)
+    ifd0[_GPS_IFD_POINTER] = _long(gpsOffset)
+
+    tiff = (b'II*\x00' + struct.pack('<I', ifd0Offset) +
+            _ifd(ifd0, ifd0Offset) + _ifd(exifIfd, exifOffset) + _ifd(gpsIfd, gpsOffset))
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+def xmp_segment(pose):
+    """
+    :param pose: dict as returned by synthetic_pose
+    :return: APP1 XMP segment (marker included) with the drone-dji tags as DJI writes them
+    """
+    packet = (
+        '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>\n'
+        '<x:xmpmeta xmlns:x="adobe:ns:meta/">\n'
+        ' <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">\n'
+        '  <rdf:Description rdf:about="DJI Meta Data"\n'
+        '    xmlns:tiff="http://ns.adobe.com/tiff/1.0/"\n'
+        '    xmlns:exif="http://ns.adobe.com/exif/1.0/"\n'
+        '    xmlns:xmp="http://ns.adobe.com/xap/1.0/"\n'
+        '    xmlns:dc="http://purl.org/dc/elements/1.1/"\n'
+        '    xmlns:drone-dji="http://www.dji.com/drone-dji/1.0/"\n'
+        '   xmp:ModifyDate="{date}"\n'
+        '   xmp:CreateDate="{date}"\n'
+        '   tiff:Make="DJI"\n'
+        '   tiff:Model="FC6310"\n'
+        '   dc:format="image/jpg"\n'
+        '   drone-dji:AbsoluteAltitude="{absolute_altitude:+.2f}"\n'
+        '   drone-dji:RelativeAltitude="{relative_altitude:+.2f}"\n'
+        '   drone-dji:GimbalRollDegree="{gimbal_roll:+.2f}"\n'
+        '   drone-dji:GimbalYawDegree="{gimbal_yaw:+.2f}"\n'
+        '   drone-dji:GimbalPitchDegree="{gimbal_pitch:+.2f}"\n'
+        '   drone-dji:FlightRollDegree="{flight_roll:+.2f}"\n'
+        '   drone-dji:FlightYawDegree="{flight_yaw:+.2f}"\n'
+        '   drone-dji:FlightPitchDegree="{flight_pitch:+.2f}"\n'
+        '   drone-dji:CamReverse="0"\n'
+        '   drone-dji:GimbalReverse="0"\n'
+        '   drone-dji:RtkFlag="0"/>\n'
+        ' </rdf:RDF>\n'
+        '</x:xmpmeta>\n'
+        '<?xpacket end="w"?>'
+    ).format(date=pose['date_time'].replace(':', '-', 2).replace(' ', 'T'), **pose)
+    payload = b'http://ns.adobe.com/xap/1.0/\x00' + packet.encode('utf-8')
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+def synthetic_pose(index, seed=0):
+    """
+    Pose of the index-th image of a lawnmower survey flight with random
+    (but reproducible) altitude and attitude noise
+    :return: dict with latitude, longitude, date_time, altitudes and angles
+    """
+    rng = random.Random(seed*1000003 + index)
+    line, position = divmod(index, IMAGES_PER_LINE)
+    # flight lines alternate direction
+    if line % 2:
+        position = IMAGES_PER_LINE - 1 - position
+    east = position*IMAGE_SPACING
+    north = line*LINE_SPACING
+    latitude = ORIGIN_LATITUDE + north/111320.0
+    longitude = ORIGIN_LONGITUDE + east/(111320.0*math.cos(math.radians(ORIGIN_LATITUDE)))
+    heading = 90.0 if line % 2 == 0 else -90.0
+    seconds = index*2
+    relativeAltitude = 80.0 + rng.uniform(-2.0, 2.0)
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'date_time': '2019:08:01 {:02d}:{:02d}:{:02d}'.format(
+            10 + seconds//3600 % 12, seconds//60 % 60, seconds % 60),
+        'relative_altitude': relativeAltitude,
+        'absolute_altitude': 420.0 + relativeAltitude,
+        'gimbal_roll': rng.uniform(-0.5, 0.5),
+        'gimbal_pitch': rng.uniform(-90.0, -30.0),
+        'gimbal_yaw': heading + rng.uniform(-5.0, 5.0),
+        'flight_roll': rng.uniform(-3.0, 3.0),
+        'flight_pitch': rng.uniform(-3.0, 3.0),
+        'flight_yaw': heading + rng.uniform(-5.0, 5.0),
+    }
+
+def synthetic_jpeg(pose):
+    """
+    :return: bytes of a JPEG with EXIF GPS tags and DJI XMP packet of the pose
+    """
+    return _JPEG_IMAGE[:2] + exif_segment(pose) + xmp_segment(pose) + _JPEG_IMAGE[2:]
+
+def generate_images(folder, count, seed=0):
+    """
+    Write count synthetic images in folder (DJI_0000001.JPG ...). Existing
+    images are not written again so the same folder can be reused between runs.
+    :return: list of image paths
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(folder, 'DJI_{:07d}.JPG'.format(index))
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(synthetic_jpeg(synthetic_pose(index, seed)))
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic DJI images')
+    parser.add_argument('folder')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_images(args.folder, args.count, args.seed)
+    sys.exit(0)
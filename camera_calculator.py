@@ -22,10 +22,83 @@ __date__ = 'August 2019'
 __copyright__ = '(C) 2019, Luigi Pirelli'
 
 import math
+import functools
 import numpy as np 
 
-# pip install vector3d
-from vector3d.vector import Vector
+
+class Vector:
+    """Minimal 3D point/vector backed by a contiguous float64 numpy array
+
+    It replaces the vector3d.vector.Vector API used by the original porting
+    (x, y, z attributes, length and normalize) without the pip only dependency.
+    Vector exposes its data through the numpy array interface, so that
+    np.asarray(vector) returns the underlying buffer without copies, and
+    Vector.fromArray wraps a row of a bigger (N, 3) array as a view.
+    """
+    __slots__ = ('_xyz',)
+
+    def __init__(self, x=0, y=0, z=0):
+        self._xyz = np.array((x, y, z), dtype=np.float64)
+
+    @classmethod
+    def fromArray(cls, xyz):
+        """Wrap a 3 elements float64 array without copying it"""
+        vector = cls.__new__(cls)
+        vector._xyz = np.asarray(xyz, dtype=np.float64)
+        return vector
+
+    @property
+    def x(self):
+        return float(self._xyz[0])
+
+    @x.setter
+    def x(self, value):
+        self._xyz[0] = value
+
+    @property
+    def y(self):
+        return float(self._xyz[1])
+
+    @y.setter
+    def y(self, value):
+        self._xyz[1] = value
+
+    @property
+    def z(self):
+        return float(self._xyz[2])
+
+    @z.setter
+    def z(self, value):
+        self._xyz[2] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or dtype == self._xyz.dtype:
+            return self._xyz.copy() if copy else self._xyz
+        return self._xyz.astype(dtype)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
+    def __eq__(self, other):
+        return self.x == other.x and self.y == other.y and self.z == other.z
+
+    def __repr__(self):
+        return 'Vector({}, {}, {})'.format(self.x, self.y, self.z)
+
+    def length(self):
+        return math.sqrt(self._xyz.dot(self._xyz))
+
+    def normalize(self):
+        return Vector.fromArray(self._xyz / self.length())
+
+
+def _asArray(vector):
+    """Return xyz of a Vector (or any object with x, y, z attributes) as float64 array"""
+    if isinstance(vector, Vector):
+        return vector._xyz
+    if hasattr(vector, 'x'):
+        return np.array((vector.x, vector.y, vector.z), dtype=np.float64)
+    return np.asarray(vector, dtype=np.float64)
 
 
 class CameraCalculator:
@@ -47,6 +120,11 @@ class CameraCalculator:
         bbox=c.getBoundingPolygon(62,84, 117.1, 0, 33.6, 39.1)
         for i, p in enumerate(bbox):
             print("point:", i, '-', p.x, p.y, p.z)
+
+    batch example (N poses in a single vectorized call):
+
+        corners=CameraCalculator.getBoundingPolygons(FOVh, FOVv, altitudes, rolls, pitches, headings)
+        # corners.shape == (N, 4, 3)
     """
 
     def __init__(self):
@@ -56,7 +134,7 @@ class CameraCalculator:
         pass
 
     @staticmethod
-    def getBoundingPolygon(FOVh, FOVv, altitude, roll, pitch, heading):
+    def getBoundingPolygon(FOVh, FOVv, altitude, roll, pitch, heading, maxDistance=None):
         '''Get corners of the polygon captured by the camera on the ground. 
         The calculations are performed in the axes origin (0, 0, altitude)
         and the points are not yet translated to camera's X-Y coordinates.
@@ -67,22 +145,17 @@ class CameraCalculator:
             heading (float): Heading of the camera (z axis) in radians
             roll (float): Roll of the camera (x axis) in radians
             pitch (float): Pitch of the camera (y axis) in radians
+            maxDistance (float): Maximum distance of view in meters (limitRange
+                                 of the java code). If None the range is not limited
+                                 and rays aiming over the horizon give points
+                                 behind the camera
         Returns:
-            vector3d.vector.Vector: Array with 4 points defining a polygon
+            Vector[]: Array with 4 points defining a polygon
         '''
-        # import ipdb; ipdb.set_trace()
-        ray11 = CameraCalculator.ray1(FOVh, FOVv)
-        ray22 = CameraCalculator.ray2(FOVh, FOVv)
-        ray33 = CameraCalculator.ray3(FOVh, FOVv)
-        ray44 = CameraCalculator.ray4(FOVh, FOVv)
-
-        rotatedVectors = CameraCalculator.rotateRays(
-                ray11, ray22, ray33, ray44, roll, pitch, heading)
-        
-        origin = Vector(0, 0, altitude)
-        intersections = CameraCalculator.getRayGroundIntersections(rotatedVectors, origin)
-
-        return intersections
+        # computed with the batch code path on a single pose, the returned
+        # Vectors are views on the rows of the (4, 3) corners array
+        corners = CameraCalculator.getBoundingPolygons(FOVh, FOVv, altitude, roll, pitch, heading, maxDistance)[0]
+        return [Vector.fromArray(corner) for corner in corners]
 
 
     # Ray-vectors defining the the camera's field of view. FOVh and FOVv are interchangeable
@@ -90,14 +163,12 @@ class CameraCalculator:
     @staticmethod
     def ray1(FOVh, FOVv):
         '''
-        tasto
         Parameters:
             FOVh (float): Horizontal field of view in radians
             FOVv (float): Vertical field of view in radians
         Returns:
-            vector3d.vector.Vector: normalised vector
+            Vector: normalised vector
         '''
-        pass
         ray = Vector(math.tan(FOVv/2), math.tan(FOVh/2), -1)
         return ray.normalize()
 
@@ -108,7 +179,7 @@ class CameraCalculator:
             FOVh (float): Horizontal field of view in radians
             FOVv (float): Vertical field of view in radians
         Returns:
-            vector3d.vector.Vector: normalised vector
+            Vector: normalised vector
         '''
         ray = Vector(math.tan(FOVv/2), -math.tan(FOVh/2), -1)
         return ray.normalize()
@@ -120,7 +191,7 @@ class CameraCalculator:
             FOVh (float): Horizontal field of view in radians
             FOVv (float): Vertical field of view in radians
         Returns:
-            vector3d.vector.Vector: normalised vector
+            Vector: normalised vector
         '''
         ray = Vector(-math.tan(FOVv/2), -math.tan(FOVh/2), -1)
         return ray.normalize()
@@ -132,7 +203,7 @@ class CameraCalculator:
             FOVh (float): Horizontal field of view in radians
             FOVv (float): Vertical field of view in radians
         Returns:
-            vector3d.vector.Vector: normalised vector
+            Vector: normalised vector
         '''
         ray = Vector(-math.tan(FOVv/2), math.tan(FOVh/2), -1)
         return ray.normalize()
@@ -141,10 +212,10 @@ class CameraCalculator:
     def rotateRays(ray1, ray2, ray3, ray4, roll, pitch, yaw):
         """Rotates the four ray-vectors around all 3 axes
         Parameters:
-            ray1 (vector3d.vector.Vector): First ray-vector
-            ray2 (vector3d.vector.Vector): Second ray-vector
-            ray3 (vector3d.vector.Vector): Third ray-vector
-            ray4 (vector3d.vector.Vector): Fourth ray-vector
+            ray1 (Vector): First ray-vector
+            ray2 (Vector): Second ray-vector
+            ray3 (Vector): Third ray-vector
+            ray4 (Vector): Fourth ray-vector
             roll float: Roll rotation
             pitch float: Pitch rotation
             yaw float: Yaw rotation
@@ -170,25 +241,14 @@ class CameraCalculator:
         # Matrix rotationMatrix = new Matrix(new double[][]{{m00, m01, m02}, {m10, m11, m12}, {m20, m21, m22}})
         rotationMatrix = np.array([[m00, m01, m02], [m10, m11, m12], [m20, m21, m22]])
 
+        # the four ray-vectors are rotated at once as rows of a (4, 3) array
         # Matrix ray1Matrix = new Matrix(new double[][]{{ray1.x}, {ray1.y}, {ray1.z}})
-        # Matrix ray2Matrix = new Matrix(new double[][]{{ray2.x}, {ray2.y}, {ray2.z}})
-        # Matrix ray3Matrix = new Matrix(new double[][]{{ray3.x}, {ray3.y}, {ray3.z}})
-        # Matrix ray4Matrix = new Matrix(new double[][]{{ray4.x}, {ray4.y}, {ray4.z}})
-        ray1Matrix = np.array([[ray1.x], [ray1.y], [ray1.z]])
-        ray2Matrix = np.array([[ray2.x], [ray2.y], [ray2.z]])
-        ray3Matrix = np.array([[ray3.x], [ray3.y], [ray3.z]])
-        ray4Matrix = np.array([[ray4.x], [ray4.y], [ray4.z]])
-        
-        res1 = rotationMatrix.dot(ray1Matrix)
-        res2 = rotationMatrix.dot(ray2Matrix)
-        res3 = rotationMatrix.dot(ray3Matrix)
-        res4 = rotationMatrix.dot(ray4Matrix)
-        
-        rotatedRay1 = Vector(res1[0, 0], res1[1, 0], res1[2, 0])
-        rotatedRay2 = Vector(res2[0, 0], res2[1, 0], res2[2, 0])
-        rotatedRay3 = Vector(res3[0, 0], res3[1, 0], res3[2, 0])
-        rotatedRay4 = Vector(res4[0, 0], res4[1, 0], res4[2, 0])
-        rayArray = [rotatedRay1, rotatedRay2, rotatedRay3, rotatedRay4]
+        # ...
+        # Matrix res1 = rotationMatrix.times(ray1Matrix);
+        rayMatrix = np.array([_asArray(ray) for ray in (ray1, ray2, ray3, ray4)])
+        res = rayMatrix.dot(rotationMatrix.T)
+
+        rayArray = [Vector.fromArray(ray) for ray in res]
         
         return rayArray
 
@@ -198,12 +258,12 @@ class CameraCalculator:
         Finds the intersections of the camera's ray-vectors 
         and the ground approximated by a horizontal plane
         Parameters:
-            rays (vector3d.vector.Vector[]): Array of 4 ray-vectors
-            origin (vector3d.vector.Vector): Position of the camera. The computation were developed 
+            rays (Vector[]): Array of 4 ray-vectors
+            origin (Vector): Position of the camera. The computation were developed 
                                             assuming the camera was at the axes origin (0, 0, altitude) and the 
                                             results translated by the camera's real position afterwards.
         Returns:
-            vector3d.vector.Vector
+            Vector
         """
         # Vector3d [] intersections = new Vector3d[rays.length];
         # for (int i = 0; i < rays.length; i ++) {
@@ -211,34 +271,523 @@ class CameraCalculator:
         # }
         # return intersections
 
-        # 1to1 translation without python syntax optimisation
-        intersections = []
-        for i in range(len(rays)):
-            intersections.append( CameraCalculator.findRayGroundIntersection(rays[i], origin) )
-        return intersections
+        rays = np.array([_asArray(ray) for ray in rays])
+        origin = _asArray(origin)
+        intersections = CameraCalculator.getRayGroundIntersectionsBatch(rays[np.newaxis], origin[np.newaxis])[0]
+        return [Vector.fromArray(intersection) for intersection in intersections]
 
     @staticmethod
     def findRayGroundIntersection(ray, origin):
         """
         Finds a ray-vector's intersection with the ground approximated by a planeç
         Parameters:
-            ray (vector3d.vector.Vector): Ray-vector
-            origin (vector3d.vector.Vector): Camera's position
+            ray (Vector): Ray-vector
+            origin (Vector): Camera's position
         Returns:
-            vector3d.vector.Vector
+            Vector
         """
         # Parametric form of an equation
         # P = origin + vector * t
-        x = Vector(origin.x,ray.x)
-        y = Vector(origin.y,ray.y)
-        z = Vector(origin.z,ray.z)
+        # (the Java Vector2d (origin, ray) component pairs are not needed)
         
         # Equation of the horizontal plane (ground)
         # -z = 0
         
         # Calculate t by substituting z
-        t = - (z.x / z.y)
+        t = - (origin.z / ray.z)
         
         # Substitute t in the original parametric equations to get points of intersection
-        return Vector(x.x + x.y * t, y.x + y.y * t, z.x + z.y * t)
+        return Vector(origin.x + ray.x * t, origin.y + ray.y * t, origin.z + ray.z * t)
+
+    @staticmethod
+    def quadrantChanged(vector, intersection):
+        """
+        Checks if the intersection is in a different quadrant of the ray-vector:
+        that happens when the ray is aiming over the horizon and the
+        intersection is behind the camera
+        Parameters:
+            vector (Vector): Ray-vector
+            intersection (Vector): Ray-vector's intersection with the ground
+        Returns:
+            bool
+        """
+        if vector.x < 0 and intersection.x > 0 or vector.x > 0 and intersection.x < 0:
+            return True
+        if vector.y < 0 and intersection.y > 0 or vector.y > 0 and intersection.y < 0:
+            return True
+        return False
 
+    @staticmethod
+    def limitRange(intersections, rays, altitude, origin, maxDistance):
+        """
+        Limits the intersections of the rays aiming over the horizon or too
+        far from the camera. The intersections are modified in place
+        Parameters:
+            intersections (Vector[]): Ray-vectors' intersections with the ground
+            rays (Vector[]): Rotated ray-vectors
+            altitude (float): Altitude of the camera in meters (unused as in the java code)
+            origin (Vector): Camera's position
+            maxDistance (float): Maximum distance of view in meters
+        """
+        for i in range(len(intersections)):
+            if CameraCalculator.quadrantChanged(rays[i], intersections[i]):
+                # if the ray is aiming over the horizon, the quadrant of intersections changes
+                # that way we know we have to limit our range of view
+                CameraCalculator.limitDistanceOfView(intersections[i], rays[i], maxDistance)
+            elif (_asArray(intersections[i]) - _asArray(origin)).dot(_asArray(intersections[i]) - _asArray(origin)) > maxDistance**2:
+                # if the range of view is too big we need to limit it
+                CameraCalculator.limitDistanceOfView(intersections[i], rays[i], maxDistance)
+
+    @staticmethod
+    def limitDistanceOfView(intersection, rotatedVector, maxDistance):
+        """
+        Limits the camera's distance of view given by a constant.
+        This constant defines the total length of the ray-vector.
+        Parameters:
+            intersection (Vector): Original incorrect intersection that is changed
+            rotatedVector (Vector): Rotated ray-vector
+            maxDistance (float): Maximum distance of view in meters
+        """
+        intersection.x = rotatedVector.x * maxDistance
+        intersection.y = rotatedVector.y * maxDistance
+
+    @staticmethod
+    def pointIsInsidePyramid(rays, cameraPosition, point):
+        """
+        Checks whether a point lies inside the frustum approximated
+        by a pyramid defining the camera's field of view.
+        Parameters:
+            rays (Vector[]): Array of four ray-vectors defining the edges of the pyramid
+            cameraPosition (Vector): Camera's Cartesian coordinates
+            point (Vector): Point of interest
+        Returns:
+            bool
+        """
+        rays = np.array([_asArray(ray) for ray in rays])
+        return bool(CameraCalculator.pointsInsidePyramidsBatch(
+            rays[np.newaxis], _asArray(cameraPosition)[np.newaxis], _asArray(point)[np.newaxis])[0])
+
+    @staticmethod
+    def findRaysVerticalPlaneIntersection(rays, origin, pointOfInterest):
+        """
+        Finds the intersections of the camera's ray-vectors and the plane
+        perpendicular to the vector (origin, pointOfInterest) passing through
+        pointOfInterest.
+        Parameters:
+            rays (Vector[]): Camera rays
+            origin (Vector): Camera position
+            pointOfInterest (Vector): Point that we are querying whether it lies in the camera's field of view
+        Returns:
+            Vector[]: Points of intersection. Rays intersecting the plane
+                      "from behind" (octantChanged) give points behind the camera
+        """
+        # the plane normal is the point of interest translated with the camera in the axes origin
+        pointOfInterestTranslated = CameraCalculator.translatePointToAxesOrigin(pointOfInterest, origin)
+        rays = np.array([_asArray(ray) for ray in rays])
+        intersections = CameraCalculator.getRayPlaneIntersectionsBatch(
+            rays[np.newaxis], _asArray(origin)[np.newaxis],
+            _asArray(pointOfInterestTranslated), _asArray(pointOfInterest))[0]
+        return [Vector.fromArray(intersection) for intersection in intersections]
+
+    @staticmethod
+    def octantChanged(ray, intersection):
+        """
+        Checks if the intersection, translated with the camera in the axes
+        origin, is in a different octant of the ray-vector: the ray intersects
+        the plane "from behind"
+        Parameters:
+            ray (Vector): Ray-vector
+            intersection (Vector): Ray-vector's intersection translated to the axes origin
+        Returns:
+            bool
+        """
+        if ray.x > 0 and intersection.x < 0 or ray.x < 0 and intersection.x > 0:
+            return True
+        if ray.y > 0 and intersection.y < 0 or ray.y < 0 and intersection.y > 0:
+            return True
+        if ray.z > 0 and intersection.z < 0 or ray.z < 0 and intersection.z > 0:
+            return True
+        return False
+
+    @staticmethod
+    def translatePointToAxesOrigin(pointToTranslate, cameraPosition):
+        """
+        Translates a point according to camera being translated to (0, 0, 0)
+        Parameters:
+            pointToTranslate (Vector): Point which we want to translate
+            cameraPosition (Vector): Real camera position
+        Returns:
+            Vector
+        """
+        return Vector.fromArray(_asArray(pointToTranslate) - _asArray(cameraPosition))
+
+    @staticmethod
+    def translatePointFromAxesOriginToCamera(pointToTranslate, cameraPosition):
+        """
+        Translates a point according to camera being translated from (0, 0, 0) to its original position
+        Parameters:
+            pointToTranslate (Vector): Point which we want to translate
+            cameraPosition (Vector): Real camera position
+        Returns:
+            Vector
+        """
+        return Vector.fromArray(_asArray(pointToTranslate) + _asArray(cameraPosition))
+
+    ###############################################
+    # Vectorized versions of the methods above working on N camera poses at once.
+    # All the poses are processed with numpy array operations, without building
+    # any per image python object.
+
+    @staticmethod
+    def getBoundingPolygons(FOVh, FOVv, altitude, roll, pitch, heading, maxDistance=None):
+        '''Get corners of the polygons captured by N cameras on the ground.
+        Vectorized version of getBoundingPolygon: parameters can be arrays of
+        length N or scalars that are broadcasted to all the poses.
+        Parameters:
+            FOVh (array_like): Horizontal field of view in radians
+            FOVv (array_like): Vertical field of view in radians
+            altitude (array_like): Altitude of the camera in meters
+            roll (array_like): Roll of the camera (x axis) in radians
+            pitch (array_like): Pitch of the camera (y axis) in radians
+            heading (array_like): Heading of the camera (z axis) in radians
+            maxDistance (float): Maximum distance of view in meters, see getBoundingPolygon
+        Returns:
+            numpy.ndarray: (N, 4, 3) array with the 4 points defining each polygon
+        '''
+        if np.ndim(FOVh) == 0 and np.ndim(FOVv) == 0:
+            # single camera => use the memoized rays of its CameraModel
+            cameraModel = CameraModel.fromFOV(float(FOVh), float(FOVv))
+            return cameraModel.getBoundingPolygons(altitude, roll, pitch, heading, maxDistance)
+
+        FOVh, FOVv, altitude, roll, pitch, heading = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(value, dtype=np.float64))
+              for value in (FOVh, FOVv, altitude, roll, pitch, heading)])
+
+        # rays are computed once for each distinct (FOVh, FOVv) couple
+        fovs, inverse = np.unique(np.stack((FOVh, FOVv), axis=-1), axis=0, return_inverse=True)
+        rays = CameraCalculator.raysBatch(fovs[:, 0], fovs[:, 1])[inverse.ravel()]
+        rotationMatrices = CameraCalculator.rotationMatricesBatch(roll, pitch, heading)
+        rotatedRays = CameraCalculator.rotateRaysBatch(rays, rotationMatrices)
+
+        origins = CameraCalculator._groundOrigins(altitude)
+        intersections = CameraCalculator.getRayGroundIntersectionsBatch(rotatedRays, origins)
+        if maxDistance is not None:
+            CameraCalculator.limitRangeBatch(intersections, rotatedRays, origins, maxDistance)
+        return intersections
+
+    @staticmethod
+    def _groundOrigins(altitude):
+        """(N, 3) camera positions (0, 0, altitude) used to compute the ground intersections"""
+        altitude = np.atleast_1d(np.asarray(altitude, dtype=np.float64))
+        origins = np.zeros((len(altitude), 3))
+        origins[:, 2] = altitude
+        return origins
+
+    @staticmethod
+    def raysBatch(FOVh, FOVv):
+        '''Normalised ray-vectors ray1..ray4 of N cameras
+        Parameters:
+            FOVh (array_like): Horizontal field of view in radians
+            FOVv (array_like): Vertical field of view in radians
+        Returns:
+            numpy.ndarray: (N, 4, 3) array of normalised ray-vectors
+        '''
+        tanh = np.tan(np.atleast_1d(np.asarray(FOVh, dtype=np.float64))/2)
+        tanv = np.tan(np.atleast_1d(np.asarray(FOVv, dtype=np.float64))/2)
+        tanh, tanv = np.broadcast_arrays(tanh, tanv)
+
+        rays = np.empty(tanh.shape + (4, 3))
+        rays[:, 0, 0] = tanv
+        rays[:, 0, 1] = tanh
+        rays[:, 1, 0] = tanv
+        rays[:, 1, 1] = -tanh
+        rays[:, 2, 0] = -tanv
+        rays[:, 2, 1] = -tanh
+        rays[:, 3, 0] = -tanv
+        rays[:, 3, 1] = tanh
+        rays[:, :, 2] = -1
+        rays /= np.linalg.norm(rays, axis=-1, keepdims=True)
+        return rays
+
+    @staticmethod
+    def rotationMatricesBatch(roll, pitch, yaw):
+        '''Stacked rotation matrices of N camera poses.
+        Each matrix is the same built by rotateRays.
+        Parameters:
+            roll (array_like): Roll rotations
+            pitch (array_like): Pitch rotations
+            yaw (array_like): Yaw rotations
+        Returns:
+            numpy.ndarray: (N, 3, 3) array of rotation matrices
+        '''
+        roll, pitch, yaw = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(value, dtype=np.float64))
+              for value in (roll, pitch, yaw)])
+        sinAlpha = np.sin(yaw)
+        sinBeta = np.sin(pitch)
+        sinGamma = np.sin(roll)
+        cosAlpha = np.cos(yaw)
+        cosBeta = np.cos(pitch)
+        cosGamma = np.cos(roll)
+
+        matrices = np.empty(yaw.shape + (3, 3))
+        matrices[:, 0, 0] = cosAlpha * cosBeta
+        matrices[:, 0, 1] = cosAlpha * sinBeta * sinGamma - sinAlpha * cosGamma
+        matrices[:, 0, 2] = cosAlpha * sinBeta * cosGamma + sinAlpha * sinGamma
+        matrices[:, 1, 0] = sinAlpha * cosBeta
+        matrices[:, 1, 1] = sinAlpha * sinBeta * sinGamma + cosAlpha * cosGamma
+        matrices[:, 1, 2] = sinAlpha * sinBeta * cosGamma - cosAlpha * sinGamma
+        matrices[:, 2, 0] = -sinBeta
+        matrices[:, 2, 1] = cosBeta * sinGamma
+        matrices[:, 2, 2] = cosBeta * cosGamma
+        return matrices
+
+    @staticmethod
+    def rotateRaysBatch(rays, rotationMatrices):
+        '''Rotates the ray-vectors of N cameras with their rotation matrix
+        Parameters:
+            rays (numpy.ndarray): (N, 4, 3) or (4, 3) ray-vectors. A (4, 3) array
+                                  is shared by all the cameras
+            rotationMatrices (numpy.ndarray): (N, 3, 3) rotation matrices
+        Returns:
+            numpy.ndarray: (N, 4, 3) rotated ray-vectors
+        '''
+        # rays are stored as rows => R.dot(ray) is computed as ray.dot(R^T)
+        return np.matmul(rays, np.swapaxes(rotationMatrices, -1, -2))
+
+    @staticmethod
+    def getRayGroundIntersectionsBatch(rays, origins):
+        """
+        Finds the intersections of the ray-vectors of N cameras
+        and the ground approximated by a horizontal plane
+        Parameters:
+            rays (numpy.ndarray): (N, 4, 3) ray-vectors
+            origins (numpy.ndarray): (N, 3) positions of the cameras
+        Returns:
+            numpy.ndarray: (N, 4, 3) points of intersection. Rays parallel to
+                           the ground give inf or nan coordinates
+        """
+        origins = np.asarray(origins, dtype=np.float64)[:, np.newaxis, :]
+
+        # P = origin + vector * t  with  t = -(origin.z / ray.z)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = -(origins[..., 2] / rays[..., 2])
+            return origins + rays * t[..., np.newaxis]
+
+    @staticmethod
+    def quadrantChangedBatch(rays, intersections):
+        '''Vectorized quadrantChanged
+        Parameters:
+            rays (numpy.ndarray): (..., 3) ray-vectors
+            intersections (numpy.ndarray): (..., 3) ray-vectors' intersections with the ground
+        Returns:
+            numpy.ndarray: (...) True where the ray is aiming over the horizon
+        '''
+        rays = rays[..., :2]
+        intersections = intersections[..., :2]
+        changed = ((rays < 0) & (intersections > 0)) | ((rays > 0) & (intersections < 0))
+        return changed.any(axis=-1)
+
+    @staticmethod
+    def limitRangeBatch(intersections, rays, origins, maxDistance):
+        '''Vectorized limitRange: intersections of the rays aiming over the horizon
+        or farther than maxDistance from the camera are moved at the ray-vector
+        scaled by maxDistance (limitDistanceOfView)
+        Parameters:
+            intersections (numpy.ndarray): (N, 4, 3) intersections, modified in place
+            rays (numpy.ndarray): (N, 4, 3) rotated ray-vectors
+            origins (numpy.ndarray): (N, 3) positions of the cameras
+            maxDistance (float or array_like): Maximum distance of view in meters
+                                               for all the cameras or for each camera
+        Returns:
+            numpy.ndarray: (N, 4) True where the intersection has been limited
+        '''
+        origins = np.asarray(origins, dtype=np.float64)[:, np.newaxis, :]
+        maxDistance = np.asarray(maxDistance, dtype=np.float64)
+        if maxDistance.ndim:
+            maxDistance = maxDistance[:, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            distance = np.linalg.norm(intersections - origins, axis=-1)
+            # not finite intersections (rays parallel to the ground) are limited too
+            limited = CameraCalculator.quadrantChangedBatch(rays, intersections) | ~(distance <= maxDistance)
+        limitedRays = rays[..., :2] * maxDistance[..., np.newaxis]
+        intersections[..., :2] = np.where(limited[..., np.newaxis], limitedRays, intersections[..., :2])
+        # the java code keeps z of the original intersection, that is
+        # undefined for rays parallel to the ground
+        intersections[..., 2] = np.where(limited & ~np.isfinite(intersections[..., 2]), 0.0, intersections[..., 2])
+        return limited
+
+    @staticmethod
+    def getRayPlaneIntersectionsBatch(rays, origins, planeNormals, planePoints):
+        """
+        Finds the intersections of the ray-vectors of N cameras and a plane
+        given by its norm vector and a point, e.g. a facade or a sloped roof
+        Parameters:
+            rays (numpy.ndarray): (N, 4, 3) ray-vectors
+            origins (numpy.ndarray): (N, 3) positions of the cameras
+            planeNormals (array_like): (3,) norm vector of a plane shared by
+                                       all the cameras or (N, 3) one for each camera
+            planePoints (array_like): (3,) or (N, 3) points the planes pass through
+        Returns:
+            numpy.ndarray: (N, 4, 3) points of intersection. Rays parallel to
+                           the plane give inf or nan coordinates
+        """
+        origins = np.asarray(origins, dtype=np.float64)
+        planeNormals = np.broadcast_to(np.asarray(planeNormals, dtype=np.float64), origins.shape)
+        planePoints = np.broadcast_to(np.asarray(planePoints, dtype=np.float64), origins.shape)
+
+        # P = origin + vector * t  with  t = n.(planePoint - origin) / n.vector
+        numerators = np.einsum('nj,nj->n', planeNormals, planePoints - origins)
+        denominators = np.einsum('nj,nij->ni', planeNormals, rays)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = numerators[:, np.newaxis] / denominators
+            return origins[:, np.newaxis, :] + rays * t[..., np.newaxis]
+
+    @staticmethod
+    def octantChangedBatch(rays, intersections, origins):
+        '''Vectorized octantChanged
+        Parameters:
+            rays (numpy.ndarray): (N, 4, 3) ray-vectors
+            intersections (numpy.ndarray): (N, 4, 3) ray-vectors' intersections with a plane
+            origins (numpy.ndarray): (N, 3) positions of the cameras
+        Returns:
+            numpy.ndarray: (N, 4) True where the ray intersects the plane "from behind"
+        '''
+        # translatePointToAxesOrigin
+        intersections = intersections - np.asarray(origins, dtype=np.float64)[:, np.newaxis, :]
+        changed = ((rays > 0) & (intersections < 0)) | ((rays < 0) & (intersections > 0))
+        return changed.any(axis=-1)
+
+    @staticmethod
+    def limitRangePlaneBatch(intersections, rays, origins, planeNormals, planePoints, maxDistance):
+        '''limitRangeBatch on an arbitrary plane: intersections behind the camera
+        (octantChanged), not defined or farther than maxDistance are moved at the
+        ray-vector scaled by maxDistance projected on the plane along its norm
+        vector. On the ground plane it is the same of limitRangeBatch
+        Parameters:
+            intersections (numpy.ndarray): (N, 4, 3) intersections, modified in place
+            rays (numpy.ndarray): (N, 4, 3) rotated ray-vectors
+            origins (numpy.ndarray): (N, 3) positions of the cameras
+            planeNormals (array_like): (3,) or (N, 3) norm vectors of the planes
+            planePoints (array_like): (3,) or (N, 3) points the planes pass through
+            maxDistance (float or array_like): Maximum distance of view in meters
+        Returns:
+            numpy.ndarray: (N, 4) True where the intersection has been limited
+        '''
+        origins = np.asarray(origins, dtype=np.float64)
+        planeNormals = np.broadcast_to(np.asarray(planeNormals, dtype=np.float64), origins.shape)
+        planePoints = np.broadcast_to(np.asarray(planePoints, dtype=np.float64), origins.shape)
+        maxDistance = np.asarray(maxDistance, dtype=np.float64)
+        if maxDistance.ndim:
+            maxDistance = maxDistance[:, np.newaxis]
+
+        with np.errstate(invalid='ignore'):
+            distance = np.linalg.norm(intersections - origins[:, np.newaxis, :], axis=-1)
+            limited = CameraCalculator.octantChangedBatch(rays, intersections, origins) | ~(distance <= maxDistance)
+
+        # limitDistanceOfView: point along the ray at maxDistance projected on the plane
+        unitNormals = planeNormals / np.linalg.norm(planeNormals, axis=-1, keepdims=True)
+        limitedPoints = origins[:, np.newaxis, :] + rays * maxDistance[..., np.newaxis]
+        offsets = np.einsum('nij,nj->ni', limitedPoints - planePoints[:, np.newaxis, :], unitNormals)
+        limitedPoints -= offsets[..., np.newaxis] * unitNormals[:, np.newaxis, :]
+        intersections[...] = np.where(limited[..., np.newaxis], limitedPoints, intersections)
+        return limited
+
+    @staticmethod
+    def pointsInsidePyramidsBatch(rays, cameraPositions, points):
+        '''Vectorized pointIsInsidePyramid on K (pyramid, point) pairs.
+        The norm vectors of the pyramid's sides are the cross products of
+        consecutive ray-vectors: the point is inside if its distance from
+        every side is not positive.
+        Parameters:
+            rays (numpy.ndarray): (K, 4, 3) rotated ray-vectors of each pyramid
+            cameraPositions (numpy.ndarray): (K, 3) apex of each pyramid
+            points (numpy.ndarray): (K, 3) points of interest
+        Returns:
+            numpy.ndarray: (K,) True where the point lies inside its pyramid
+        '''
+        normVectors = np.cross(np.roll(rays, -1, axis=-2), rays)
+        relative = np.asarray(points, dtype=np.float64) - np.asarray(cameraPositions, dtype=np.float64)
+        distances = np.einsum('kij,kj->ki', normVectors, relative)
+        return (distances <= 0).all(axis=-1)
+
+
+class CameraModel:
+    """Camera intrinsics defined by its horizontal and vertical field of view
+
+    The four normalised frustum ray-vectors (ray1..ray4 of CameraCalculator)
+    are computed once when the model is created, so that the per image work
+    is only the rotation of the rays and their intersection with the ground.
+    Use CameraModel.fromFOV to get memoized instances: all the images of a
+    batch taken with the same camera share the same model.
+
+    example:
+
+        camera=CameraModel.fromFOV(math.radians(67.07), math.radians(52.86))
+        corners=camera.getBoundingPolygons(altitudes, rolls, pitches, headings)
+    """
+    __slots__ = ('FOVh', 'FOVv', 'rays')
+
+    def __init__(self, FOVh, FOVv):
+        """
+        Parameters:
+            FOVh (float): Horizontal field of view in radians
+            FOVv (float): Vertical field of view in radians
+        """
+        self.FOVh = float(FOVh)
+        self.FOVv = float(FOVv)
+        # (4, 3) stacked normalised ray-vectors. Read only because shared
+        # by all the users of the memoized instance
+        self.rays = CameraCalculator.raysBatch(self.FOVh, self.FOVv)[0]
+        self.rays.flags.writeable = False
+
+    def __repr__(self):
+        return 'CameraModel({}, {})'.format(self.FOVh, self.FOVv)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def fromFOV(FOVh, FOVv):
+        """Memoized CameraModel for the (FOVh, FOVv) couple
+        Parameters:
+            FOVh (float): Horizontal field of view in radians
+            FOVv (float): Vertical field of view in radians
+        Returns:
+            CameraModel: shared model instance
+        """
+        return CameraModel(FOVh, FOVv)
+
+    def getBoundingPolygons(self, altitude, roll, pitch, heading, maxDistance=None):
+        '''Get corners of the polygons captured on the ground by N poses of this camera.
+        Parameters:
+            altitude (array_like): Altitude of the camera in meters
+            roll (array_like): Roll of the camera (x axis) in radians
+            pitch (array_like): Pitch of the camera (y axis) in radians
+            heading (array_like): Heading of the camera (z axis) in radians
+            maxDistance (float): Maximum distance of view in meters, see
+                                 CameraCalculator.getBoundingPolygon
+        Returns:
+            numpy.ndarray: (N, 4, 3) array with the 4 points defining each polygon
+        '''
+        altitude, roll, pitch, heading = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(value, dtype=np.float64))
+              for value in (altitude, roll, pitch, heading)])
+
+        rotatedRays = self.rotatedRays(roll, pitch, heading)
+        origins = CameraCalculator._groundOrigins(altitude)
+        intersections = CameraCalculator.getRayGroundIntersectionsBatch(rotatedRays, origins)
+        if maxDistance is not None:
+            CameraCalculator.limitRangeBatch(intersections, rotatedRays, origins, maxDistance)
+        return intersections
+
+    def rotatedRays(self, roll, pitch, heading):
+        '''Ray-vectors of this camera rotated by N poses.
+        Parameters:
+            roll (array_like): Roll of the camera (x axis) in radians
+            pitch (array_like): Pitch of the camera (y axis) in radians
+            heading (array_like): Heading of the camera (z axis) in radians
+        Returns:
+            numpy.ndarray: (N, 4, 3) rotated ray-vectors. Rays with z >= 0
+                           do not intersect the ground
+        '''
+        rotationMatrices = CameraCalculator.rotationMatricesBatch(roll, pitch, heading)
+        return CameraCalculator.rotateRaysBatch(self.rays, rotationMatrices)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    camera_profiles.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+from collections import OrderedDict
+
+# FOV (degree) and empiric offsets (metre) of the supported cameras.
+# Horizontal is referred to the flight direction => wide angle,
+# vertical is the tall angle
+CAMERA_PROFILES = OrderedDict([
+    ('Phantom 4 Pro - FC6310', {
+        'horizontal_FOV': 67.07,
+        'vertical_FOV': 52.86,
+        'nadir_to_bottom_offset': 0,
+        'nadir_to_upper_offset': 0
+    }),
+    ('DJI - X3', {
+        'horizontal_FOV': 82.3,
+        'vertical_FOV': 66.46,
+        'nadir_to_bottom_offset': 0,
+        'nadir_to_upper_offset': 0
+    }),
+    ('MicaSense - Altum', {
+        'horizontal_FOV': 64,
+        'vertical_FOV': 84,
+        'nadir_to_bottom_offset': 0,
+        'nadir_to_upper_offset': 0
+    }),
+    ('Advanced', {
+        'horizontal_FOV': 64,
+        'vertical_FOV': 84,
+        'nadir_to_bottom_offset': 0,
+        'nadir_to_upper_offset': 0
+    })
+])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    checkpoint.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import csv
+import json
+import time
+
+CHECKPOINT_VERSION = 1
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint can't be used to resume the run"""
+    pass
+
+
+def checkpoint_path(output):
+    """
+    :param output: footprints output file
+    :return: path of the checkpoint file stored next to the output
+    """
+    return output + '.checkpoint.json'
+
+def quarantine_path(output):
+    """
+    :param output: footprints output file
+    :return: path of the default quarantine report stored next to the output
+    """
+    return os.path.splitext(output)[0] + '_quarantine.csv'
+
+def read_checkpoint(path):
+    """
+    :return: checkpoint dict as written by write_checkpoint or None if the
+        file does not exist or is not a valid checkpoint
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+        return None
+    return state
+
+def check_checkpoint(state, footprints=None, nadirs=None, inputs=None):
+    """
+    Check that the run can be resumed from the checkpoint. Arguments left to
+    None are not checked
+    :param state: checkpoint dict as returned by read_checkpoint
+    :param footprints: footprints output of the run
+    :param nadirs: nadirs output of the run
+    :param inputs: number of input images of the run
+    :raise CheckpointError: if the checkpoint refers to other outputs or inputs
+    """
+    if ((footprints is not None and state['footprints'] != footprints) or
+            (nadirs is not None and state['nadirs'] != nadirs)):
+        raise CheckpointError('it refers to other outputs')
+    # images are skipped by position: with other inputs they would be skipped or processed twice
+    if inputs is not None and state['inputs'] != inputs:
+        raise CheckpointError('it refers to {} input images, now they are {}'.format(state['inputs'], inputs))
+
+def write_checkpoint(path, state):
+    """
+    Atomically write the checkpoint: a crash while writing leaves the
+    previous checkpoint valid
+    :param state: JSON serializable dict. 'next_index' is the number of input
+        images already committed to the outputs
+    """
+    state = dict(state, version=CHECKPOINT_VERSION, updated=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class QuarantineReport:
+    """CSV report of the images that could not be processed
+
+    The file is created with the first row, so no report is left if all the
+    images are good. Each row is flushed when added, so the report is complete
+    also if the run is killed. Rows are appended to an existing report when
+    resuming.
+    """
+    HEADER = ('index', 'path', 'error')
+
+    def __init__(self, path, append=False):
+        """
+        :param path: CSV file path, None to only count errors
+        :param append: if True append rows to the existing report
+        """
+        self.path = path
+        self.count = 0
+        self._append = append
+        self._file = None
+        self._writer = None
+        # a report of a previous run would be mistaken for this one
+        if path is not None and not append and os.path.exists(path):
+            os.remove(path)
+
+    def _open(self):
+        exists = self._append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._file = open(self.path, 'a' if exists else 'w', newline='')
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(self.HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, index, path, error):
+        """
+        :param index: position of the image in the input (1 based)
+        :param path: image path
+        :param error: error message
+        """
+        self.count += 1
+        if self.path is None:
+            return
+        if self._file is None:
+            self._open()
+        self._writer.writerow((index, path, ' '.join(str(error).split())))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
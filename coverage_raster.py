@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    coverage_raster.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import math
+
+import numpy as np
+
+from footprint_index import ring_edges
+
+# grid rows rasterized at once
+CHUNK_ROWS = 512
+# value of the cells outside the AOI, counts are stored as uint32 so it can't
+# be reached by the number of footprints
+NODATA = np.iinfo(np.uint32).max
+
+
+def read_polygon_rings(path, layerName=None):
+    """
+    Read all the rings (exterior and holes) of all the parts of the polygons of a layer
+    :param path: vector file readable by OGR (e.g. an AOI GeoPackage)
+    :param layerName: layer name, if None the first layer
+    :return: tuple (coordinates, offsets, polygons). Rings are stored like
+        read_footprints, polygons is the polygon part id of each ring
+    """
+    from osgeo import ogr
+    dataSource = ogr.Open(path)
+    if dataSource is None:
+        raise IOError('Cannot open: {}'.format(path))
+    layer = dataSource.GetLayerByName(layerName) if layerName else dataSource.GetLayer(0)
+    if layer is None:
+        raise IOError('Layer {} not found in {}'.format(layerName, path))
+
+    rings = []
+    polygons = []
+    partId = 0
+    for feature in layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is None or geometry.IsEmpty():
+            continue
+        geometry = ogr.ForceToMultiPolygon(geometry.Clone())
+        for part in range(geometry.GetGeometryCount()):
+            polygon = geometry.GetGeometryRef(part)
+            for ring in range(polygon.GetGeometryCount()):
+                rings.append(np.array(polygon.GetGeometryRef(ring).GetPoints(), dtype=np.float64)[:, :2])
+                polygons.append(partId)
+            partId += 1
+    dataSource = None
+
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ring) for ring in rings])
+    coordinates = np.concatenate(rings) if rings else np.empty((0, 2))
+    return coordinates, offsets, np.array(polygons, dtype=np.int64)
+
+
+def grid_definition(coordinates, resolution):
+    """
+    Grid aligned to resolution covering the rings
+    :param coordinates: (P, 2) array of the ring coordinates
+    :param resolution: cell size in CRS units
+    :return: tuple (xmin, ymax, width, height)
+    """
+    xmin = math.floor(coordinates[:, 0].min()/resolution)*resolution
+    ymin = math.floor(coordinates[:, 1].min()/resolution)*resolution
+    xmax = math.ceil(coordinates[:, 0].max()/resolution)*resolution
+    ymax = math.ceil(coordinates[:, 1].max()/resolution)*resolution
+    width = max(1, int(round((xmax - xmin)/resolution)))
+    height = max(1, int(round((ymax - ymin)/resolution)))
+    return xmin, ymax, width, height
+
+
+class ScanlineRasterizer:
+    """Count of the polygons covering each cell of a north up grid
+
+    A cell is covered by a polygon when its centre is inside the polygon.
+    For each chunk of grid rows all the polygon edges crossing the rows are
+    intersected with the scanlines through the cell centres at once; the
+    sorted crossings of each polygon and row delimit the covered runs of
+    cells (even-odd rule, so holes are managed giving the same polygon id to
+    the exterior and interior rings), accumulated in a difference array and
+    summed along the rows.
+
+    example:
+
+        rasterizer = ScanlineRasterizer(coordinates, offsets, xmin, ymax, 1.0, width, height)
+        for row, counts in rasterizer.chunks():
+            ...
+    """
+
+    def __init__(self, coordinates, offsets, xmin, ymax, resolution, width, height, polygons=None):
+        """
+        :param coordinates, offsets: rings as returned by read_footprints
+        :param xmin, ymax: upper left corner of the grid
+        :param resolution: cell size in CRS units
+        :param width, height: grid size in cells
+        :param polygons: polygon id of each ring, if None each ring is a polygon
+        """
+        self.xmin = xmin
+        self.ymax = ymax
+        self.resolution = resolution
+        self.width = width
+        self.height = height
+        x1, y1, x2, y2, self._rings = ring_edges(coordinates, offsets, np.arange(len(offsets) - 1))
+        if polygons is not None:
+            self._rings = np.asarray(polygons, dtype=np.int64)[self._rings]
+        # horizontal edges never cross a scanline
+        sloped = y1 != y2
+        self._rings = self._rings[sloped]
+        self._x1, self._y1, self._x2, self._y2 = x1[sloped], y1[sloped], x2[sloped], y2[sloped]
+        # scanline rows crossed by each edge: centre y in [min(y1, y2), max(y1, y2))
+        self._firstRows = np.ceil((ymax - np.maximum(self._y1, self._y2))/resolution - 0.5).astype(np.int64)
+        self._lastRows = np.ceil((ymax - np.minimum(self._y1, self._y2))/resolution - 0.5).astype(np.int64) - 1
+
+    @property
+    def geotransform(self):
+        return (self.xmin, self.resolution, 0.0, self.ymax, 0.0, -self.resolution)
+
+    def rasterize(self, firstRow, lastRow):
+        """
+        :return: (lastRow - firstRow, width) uint32 array of the polygons count
+            of the rows firstRow..lastRow - 1
+        """
+        rows = lastRow - firstRow
+        differences = np.zeros((rows, self.width + 1), dtype=np.int32)
+
+        edges = np.flatnonzero((self._firstRows < lastRow) & (self._lastRows >= firstRow))
+        starts = np.maximum(self._firstRows[edges], firstRow)
+        counts = np.minimum(self._lastRows[edges], lastRow - 1) - starts + 1
+        edges = np.repeat(edges, counts)
+        crossingRows = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+        # x of the crossing of each edge with the scanline through the cell centres
+        y = self.ymax - (crossingRows + 0.5)*self.resolution
+        x1, y1, x2, y2 = self._x1[edges], self._y1[edges], self._x2[edges], self._y2[edges]
+        x = x1 + (y - y1)*(x2 - x1)/(y2 - y1)
+        # first cell with centre at right of the crossing
+        columns = np.clip(np.ceil((x - self.xmin)/self.resolution - 0.5), 0, self.width).astype(np.int64)
+
+        # crossings of the same ring and row sorted by x: even-odd pairs are the covered runs
+        order = np.lexsort((columns, crossingRows, self._rings[edges]))
+        columns = columns[order]
+        crossingRows = crossingRows[order] - firstRow
+        np.add.at(differences, (crossingRows[0::2], columns[0::2]), 1)
+        np.add.at(differences, (crossingRows[1::2], columns[1::2]), -1)
+        return np.cumsum(differences[:, :-1], axis=1).astype(np.uint32)
+
+    def chunks(self, chunkRows=CHUNK_ROWS):
+        """
+        :return: yield (firstRow, counts) for each chunk of chunkRows rows
+        """
+        for firstRow in range(0, self.height, chunkRows):
+            yield firstRow, self.rasterize(firstRow, min(firstRow + chunkRows, self.height))
+
+
+def coverage_raster(path, coordinates, offsets, resolution, srsWkt='', aoi=None,
+                    gapsPath=None, chunkRows=CHUNK_ROWS):
+    """
+    Write the GeoTIFF of the number of footprints covering each cell and
+    compute the statistics of the coverage. With an AOI the grid covers the
+    AOI, cells outside it are NODATA and uncovered cells inside it are gaps.
+    :param path: output GeoTIFF
+    :param coordinates, offsets: footprint rings as returned by read_footprints
+    :param resolution: cell size in CRS units
+    :param srsWkt: CRS of the footprints
+    :param aoi: tuple (coordinates, offsets, polygons) of the AOI rings as
+        returned by read_polygon_rings or None
+    :param gapsPath: GeoPackage where the gaps inside the AOI are written as
+        polygons of the uncovered cells. Only with an AOI
+    :param chunkRows: grid rows processed at once, memory is proportional to chunkRows*width
+    :return: dict with cells, covered and uncovered cells and areas,
+        maximum overlap, the histogram of the cell counts and the number of gaps
+    """
+    from osgeo import gdal
+    extent = aoi[0] if aoi is not None else coordinates
+    xmin, ymax, width, height = grid_definition(extent, resolution)
+    footprints = ScanlineRasterizer(coordinates, offsets, xmin, ymax, resolution, width, height)
+    area = None
+    if aoi is not None:
+        area = ScanlineRasterizer(aoi[0], aoi[1], xmin, ymax, resolution, width, height, aoi[2])
+
+    driver = gdal.GetDriverByName('GTiff')
+    dataset = driver.Create(path, width, height, 1, gdal.GDT_UInt32,
+                            ['COMPRESS=DEFLATE', 'TILED=YES', 'BIGTIFF=IF_SAFER'])
+    if dataset is None:
+        raise IOError('Cannot create coverage raster: {}'.format(path))
+    dataset.SetGeoTransform(footprints.geotransform)
+    if srsWkt:
+        dataset.SetProjection(srsWkt)
+    band = dataset.GetRasterBand(1)
+    if area is not None:
+        band.SetNoDataValue(NODATA)
+
+    # mask of the gaps written by chunks and polygonized at the end
+    gapsDataset = None
+    if area is not None and gapsPath:
+        gapsDataset = driver.Create('/vsimem/coverage_gaps.tif', width, height, 1, gdal.GDT_Byte,
+                                    ['COMPRESS=DEFLATE', 'TILED=YES', 'NBITS=1'])
+        gapsDataset.SetGeoTransform(footprints.geotransform)
+        if srsWkt:
+            gapsDataset.SetProjection(srsWkt)
+
+    histogram = np.zeros(1, dtype=np.int64)
+    cells = 0
+    for firstRow, counts in footprints.chunks(chunkRows):
+        if area is not None:
+            inside = area.rasterize(firstRow, firstRow + len(counts)) > 0
+            chunkHistogram = np.bincount(counts[inside])
+            if gapsDataset is not None:
+                gapsDataset.GetRasterBand(1).WriteArray((inside & (counts == 0)).astype(np.uint8), 0, firstRow)
+            counts[~inside] = NODATA
+            cells += int(inside.sum())
+        else:
+            chunkHistogram = np.bincount(counts.ravel())
+            cells += counts.size
+        if len(chunkHistogram) > len(histogram):
+            histogram = np.pad(histogram, (0, len(chunkHistogram) - len(histogram)))
+        histogram[:len(chunkHistogram)] += chunkHistogram
+        band.WriteArray(counts, 0, firstRow)
+    band.FlushCache()
+    band = None
+    dataset = None
+
+    gaps = None
+    if gapsDataset is not None:
+        gaps = _polygonize_gaps(gapsDataset, gapsPath, srsWkt)
+        gapsDataset = None
+        gdal.Unlink('/vsimem/coverage_gaps.tif')
+
+    cellArea = resolution*resolution
+    uncovered = int(histogram[0])
+    return {
+        'cells': cells,
+        'covered_cells': cells - uncovered,
+        'uncovered_cells': uncovered,
+        'covered_area': (cells - uncovered)*cellArea,
+        'uncovered_area': uncovered*cellArea,
+        'uncovered_ratio': uncovered/cells if cells else 0.0,
+        'max_overlap': len(histogram) - 1,
+        'histogram': histogram.tolist(),
+        'gaps': gaps,
+    }
+
+def _polygonize_gaps(gapsDataset, gapsPath, srsWkt):
+    """
+    Write the polygons of the gap cells (value 1) with their area
+    :return: number of gap polygons
+    """
+    from osgeo import gdal, ogr, osr
+    srs = None
+    if srsWkt:
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(srsWkt)
+    driver = ogr.GetDriverByName('GPKG')
+    if os.path.exists(gapsPath):
+        driver.DeleteDataSource(gapsPath)
+    dataSource = driver.CreateDataSource(gapsPath)
+    if dataSource is None:
+        raise IOError('Cannot create gaps GeoPackage: {}'.format(gapsPath))
+    layer = dataSource.CreateLayer('gaps', srs, ogr.wkbPolygon)
+    layer.CreateField(ogr.FieldDefn('gap', ogr.OFTInteger))
+    layer.CreateField(ogr.FieldDefn('area', ogr.OFTReal))
+
+    gapsBand = gapsDataset.GetRasterBand(1)
+    # the band is its own mask: only the gap cells are polygonized
+    dataSource.StartTransaction()
+    gdal.Polygonize(gapsBand, gapsBand, layer, 0)
+    for feature in layer:
+        feature.SetField('area', feature.GetGeometryRef().GetArea())
+        layer.SetFeature(feature)
+    dataSource.CommitTransaction()
+    count = layer.GetFeatureCount()
+    dataSource = None
+    return count
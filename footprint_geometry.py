@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    footprint_geometry.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import struct
+import numpy as np
+
+from camera_calculator import CameraCalculator, CameraModel
+
+# number of segments used to approximate the wedge arcs
+ARC_SEGMENTS = 36
+
+
+def wedge_distances(relativeAltitude, gimbalPitch, verticalFOV):
+    """
+    Distances from nadir of the nearest (bottom) and farest (upper) point
+    viewed by the camera, inspired by:
+    https://photo.stackexchange.com/questions/56596/how-do-i-calculate-the-ground-footprint-of-an-aerial-camera
+    Accepts scalars or arrays (one value for each image).
+    :param relativeAltitude: drone altitude over the ground (metre)
+    :param gimbalPitch: gimbal pitch (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :return: (bottomDistance, upperDistance)
+    """
+    relativeAltitude = np.asarray(relativeAltitude, dtype=np.float64)
+    gimbalPitch = np.asarray(gimbalPitch, dtype=np.float64)
+    bottomDistance = relativeAltitude*np.tan(np.radians(90 - gimbalPitch - 0.5*verticalFOV))
+    upperDistance = relativeAltitude*np.tan(np.radians(90 - gimbalPitch + 0.5*verticalFOV))
+    return bottomDistance, upperDistance
+
+def wedge_ring(x, y, azimuth, width, outerRadius, innerRadius, segments=ARC_SEGMENTS):
+    """
+    Closed ring of a wedge shaped buffer centered in (x, y), the same shape of
+    QgsGeometry.createWedgeBuffer with arcs segmentized, to be used where QGIS
+    is not available.
+    :param x, y: wedge center (nadir)
+    :param azimuth: wedge direction (degree clockwise from north)
+    :param width: wedge angular width (degree)
+    :param outerRadius: radius of the outer arc
+    :param innerRadius: radius of the inner arc, if 0 the wedge reach the center
+    :param segments: number of segments of each arc
+    :return: (M, 2) array of ring coordinates, first and last are equal
+    """
+    angles = np.radians(np.linspace(azimuth - 0.5*width, azimuth + 0.5*width, segments + 1))
+    sin = np.sin(angles)
+    cos = np.cos(angles)
+    outer = np.column_stack((x + outerRadius*sin, y + outerRadius*cos))
+    if innerRadius > 0:
+        inner = np.column_stack((x + innerRadius*sin, y + innerRadius*cos))[::-1]
+    else:
+        inner = np.array([[x, y]], dtype=np.float64)
+    return np.concatenate((outer, inner, outer[:1]))
+
+def dji_camera_angles(gimbalRoll, gimbalPitch, gimbalYaw):
+    """
+    Convert DJI gimbal angles to CameraCalculator angles.
+    DJI: pitch -90 looking down (nadir) and 0 looking at the horizon, yaw
+    clockwise from north. CameraCalculator: camera looking down along -z with
+    the image top toward +x, x = east, y = north, rotations counterclockwise.
+    Accepts scalars or arrays.
+    :param gimbalRoll, gimbalPitch, gimbalYaw: DJI gimbal angles (degree)
+    :return: (roll, pitch, heading) in radians for CameraCalculator
+    """
+    roll = np.radians(gimbalRoll)
+    pitch = -np.radians(90 + np.asarray(gimbalPitch, dtype=np.float64))
+    heading = np.radians(90 - np.asarray(gimbalYaw, dtype=np.float64))
+    return roll, pitch, heading
+
+def frustum_rays(gimbalRoll, gimbalPitch, gimbalYaw, horizontalFOV, verticalFOV):
+    """
+    Frustum ray-vectors of N images in the (east, north, up) axes.
+    :param gimbalRoll, gimbalPitch, gimbalYaw: arrays of DJI gimbal angles (degree)
+    :param horizontalFOV: wide camera angle (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :return: (N, 4, 3) array of rotated ray-vectors
+    """
+    camera = CameraModel.fromFOV(float(np.radians(horizontalFOV)), float(np.radians(verticalFOV)))
+    roll, pitch, heading = dji_camera_angles(gimbalRoll, gimbalPitch, gimbalYaw)
+    roll, pitch, heading = np.broadcast_arrays(
+        *[np.atleast_1d(value) for value in (roll, pitch, heading)])
+    return camera.rotatedRays(roll, pitch, heading)
+
+
+def frustum_footprints(x, y, relativeAltitude, gimbalRoll, gimbalPitch, gimbalYaw,
+                       horizontalFOV, verticalFOV, maxDistance=None):
+    """
+    Footprints of N images as intersection of the camera frustum with the
+    ground plane (CameraCalculator model), all computed with array operations.
+    Unlike the wedge model, it considers the gimbal roll and works with
+    oblique images: rays aiming over the horizon or too far are limited to
+    maxDistance (limitRange of CameraCalculator.java).
+    :param x, y: arrays of nadir coordinates in a metric CRS (east, north)
+    :param relativeAltitude: array of altitudes over the ground (metre)
+    :param gimbalRoll, gimbalPitch, gimbalYaw: arrays of DJI gimbal angles (degree)
+    :param horizontalFOV: wide camera angle (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :param maxDistance: maximum distance of view (metre). If None the range is
+        not limited and images viewing the horizon are not valid
+    :return: tuple (rings, valid). rings is a (N, 5, 2) array of closed
+        rings, valid a (N,) boolean array False where some frustum ray does
+        not reach the ground (camera viewing the horizon) and the range is not limited
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    rays = frustum_rays(gimbalRoll, gimbalPitch, gimbalYaw, horizontalFOV, verticalFOV)
+
+    origins = np.zeros((len(rays), 3))
+    origins[:, 2] = relativeAltitude
+    corners = CameraCalculator.getRayGroundIntersectionsBatch(rays, origins)
+
+    if maxDistance is None:
+        valid = (rays[..., 2] < 0).all(axis=1) & np.isfinite(corners).all(axis=(1, 2))
+    else:
+        CameraCalculator.limitRangeBatch(corners, rays, origins, maxDistance)
+        valid = np.isfinite(corners[..., :2]).all(axis=(1, 2))
+    rings = np.empty((len(rays), 5, 2))
+    rings[:, :4, 0] = x[:, np.newaxis] + corners[..., 0]
+    rings[:, :4, 1] = y[:, np.newaxis] + corners[..., 1]
+    rings[:, 4] = rings[:, 0]
+    return rings, valid
+
+def frustum_plane_footprints(x, y, z, gimbalRoll, gimbalPitch, gimbalYaw,
+                             horizontalFOV, verticalFOV, planeNormal, planePoint,
+                             maxDistance=None):
+    """
+    Patches viewed by N images on a plane given by its norm vector and a
+    point, e.g. a building facade, a dam wall or a sloped solar array.
+    The norm vector points to the viewed side of the plane: images looking
+    at the back of the plane are not valid.
+    :param x, y, z: arrays of camera coordinates in a metric CRS (east, north, up)
+    :param gimbalRoll, gimbalPitch, gimbalYaw: arrays of DJI gimbal angles (degree)
+    :param horizontalFOV: wide camera angle (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :param planeNormal: (3,) norm vector of the plane
+    :param planePoint: (3,) point of the plane in the same CRS of the cameras
+    :param maxDistance: maximum distance of view (metre). If None the range is
+        not limited and images with rays not reaching the plane are not valid
+    :return: tuple (rings, valid). rings is a (N, 5, 3) array of closed
+        rings lying on the plane, valid a (N,) boolean array
+    """
+    rays = frustum_rays(gimbalRoll, gimbalPitch, gimbalYaw, horizontalFOV, verticalFOV)
+    origins = np.stack(np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in (x, y, z)]), axis=-1)
+    rays = np.broadcast_to(rays, origins.shape[:1] + rays.shape[1:])
+    planeNormal = np.asarray(planeNormal, dtype=np.float64)
+
+    corners = CameraCalculator.getRayPlaneIntersectionsBatch(rays, origins, planeNormal, planePoint)
+    # the camera views the front of the plane if its centre ray goes against the norm vector
+    valid = rays.sum(axis=1).dot(planeNormal) < 0
+    if maxDistance is None:
+        valid &= ~CameraCalculator.octantChangedBatch(rays, corners, origins).any(axis=1)
+        valid &= np.isfinite(corners).all(axis=(1, 2))
+    else:
+        CameraCalculator.limitRangePlaneBatch(corners, rays, origins, planeNormal, planePoint, maxDistance)
+
+    rings = np.empty((len(rays), 5, 3))
+    rings[:, :4] = corners
+    rings[:, 4] = rings[:, 0]
+    return rings, valid
+
+def plane_coordinates(points, planeNormal, planePoint):
+    """
+    2D coordinates of points lying on a plane, with origin in planePoint.
+    The first axis is horizontal (along a facade), the second goes up along
+    the plane slope; on a horizontal plane they are east and north.
+    :param points: (..., 3) array of points
+    :param planeNormal: (3,) norm vector of the plane
+    :param planePoint: (3,) origin of the plane coordinates
+    :return: (..., 2) array of plane coordinates (metre)
+    """
+    normal = np.asarray(planeNormal, dtype=np.float64)
+    normal = normal / np.linalg.norm(normal)
+    horizontal = np.cross((0.0, 0.0, 1.0), normal)
+    if np.linalg.norm(horizontal) < 1e-12:
+        horizontal = np.array((1.0, 0.0, 0.0))
+    horizontal /= np.linalg.norm(horizontal)
+    up = np.cross(normal, horizontal)
+    offsets = np.asarray(points, dtype=np.float64) - np.asarray(planePoint, dtype=np.float64)
+    return np.stack((offsets.dot(horizontal), offsets.dot(up)), axis=-1)
+
+def point_wkb(x, y):
+    """
+    :return: little endian WKB of a 2D point
+    """
+    return struct.pack('<BIdd', 1, 1, x, y)
+
+def polygon_wkb(ring):
+    """
+    :param ring: (M, 2) array of the closed exterior ring coordinates
+    :return: little endian WKB of a 2D polygon without holes
+    """
+    ring = np.ascontiguousarray(ring, dtype='<f8')
+    return struct.pack('<BIII', 1, 3, 1, len(ring)) + ring.tobytes()
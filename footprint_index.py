@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    footprint_index.py
+    ------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+
+import numpy as np
+
+# maximum number of children of each tree node
+NODE_CAPACITY = 16
+INDEX_VERSION = 1
+
+
+def index_path(output):
+    """
+    :param output: footprints output file
+    :return: path of the footprint index stored next to the output
+    """
+    return os.path.splitext(output)[0] + '_index.npz'
+
+def read_footprints(path, layerName=None, fields=None):
+    """
+    Read the exterior rings and the attributes of a footprints layer
+    :param path: vector file readable by OGR (e.g. the footprints GeoPackage)
+    :param layerName: layer name, if None the first layer
+    :param fields: names of the attributes to read, if None all the fields
+    :return: tuple (coordinates, offsets, attributes). coordinates is a (P, 2)
+        array with the rings of all the footprints, ring i is
+        coordinates[offsets[i]:offsets[i + 1]]. attributes is a dict
+        field name => list of values in the same order of the rings
+    """
+    from osgeo import ogr
+    dataSource = ogr.Open(path)
+    if dataSource is None:
+        raise IOError('Cannot open footprints: {}'.format(path))
+    layer = dataSource.GetLayerByName(layerName) if layerName else dataSource.GetLayer(0)
+    if layer is None:
+        raise IOError('Layer {} not found in {}'.format(layerName, path))
+    definition = layer.GetLayerDefn()
+    if fields is None:
+        fields = [definition.GetFieldDefn(index).GetName() for index in range(definition.GetFieldCount())]
+
+    rings = []
+    attributes = dict((name, []) for name in fields)
+    for feature in layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is None or geometry.IsEmpty():
+            continue
+        if geometry.GetGeometryType() in (ogr.wkbMultiPolygon, ogr.wkbMultiPolygon25D):
+            geometry = geometry.GetGeometryRef(0)
+        rings.append(np.array(geometry.GetGeometryRef(0).GetPoints(), dtype=np.float64)[:, :2])
+        for name in fields:
+            attributes[name].append(feature.GetField(name))
+    dataSource = None
+
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ring) for ring in rings])
+    coordinates = np.concatenate(rings) if rings else np.empty((0, 2))
+    return coordinates, offsets, attributes
+
+def _column(values):
+    """
+    :return: attribute values as numpy array that can be saved without pickle:
+        numbers with NULL values as float with nan, other values as strings
+    """
+    values = np.asarray(values)
+    if values.dtype != object:
+        return values
+    if all(value is None or isinstance(value, (int, float)) for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.array(['' if value is None else str(value) for value in values])
+
+def ring_edges(coordinates, offsets, ids):
+    """
+    Edges of the selected rings as flat arrays
+    :param coordinates, offsets: rings as returned by read_footprints
+    :param ids: indexes of the rings
+    :return: tuple (x1, y1, x2, y2, ringPositions). ringPositions is the
+        position in ids of the ring of each edge
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    # closed rings: n points => n - 1 edges
+    counts = offsets[ids + 1] - offsets[ids] - 1
+    counts = np.maximum(counts, 0)
+    ringPositions = np.repeat(np.arange(len(ids)), counts)
+    starts = np.repeat(offsets[ids] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    first = coordinates[starts]
+    second = coordinates[starts + 1]
+    return first[:, 0], first[:, 1], second[:, 0], second[:, 1], ringPositions
+
+def ring_bboxes(coordinates, offsets):
+    """
+    :param coordinates, offsets: rings as returned by read_footprints
+    :return: (N, 4) array of the ring bounding boxes (xmin, ymin, xmax, ymax)
+    """
+    bboxes = np.empty((len(offsets) - 1, 4))
+    if len(bboxes):
+        starts = offsets[:-1]
+        bboxes[:, 0] = np.minimum.reduceat(coordinates[:, 0], starts)
+        bboxes[:, 1] = np.minimum.reduceat(coordinates[:, 1], starts)
+        bboxes[:, 2] = np.maximum.reduceat(coordinates[:, 0], starts)
+        bboxes[:, 3] = np.maximum.reduceat(coordinates[:, 1], starts)
+    return bboxes
+
+def ring_areas(coordinates, offsets):
+    """
+    :param coordinates, offsets: rings as returned by read_footprints
+    :return: (N,) array of the areas of the rings (shoelace formula)
+    """
+    x1, y1, x2, y2, positions = ring_edges(coordinates, offsets, np.arange(len(offsets) - 1))
+    return np.abs(np.bincount(positions, weights=x1*y2 - x2*y1, minlength=len(offsets) - 1))/2
+
+def points_in_rings(x, y, coordinates, offsets, ids):
+    """
+    Even-odd test of point i against ring ids[i], for all the pairs at once
+    :param x, y: arrays of point coordinates, one for each ring id
+    :param coordinates, offsets: rings as returned by read_footprints
+    :param ids: indexes of the rings
+    :return: boolean array, True where the point is inside its ring
+    """
+    x1, y1, x2, y2, positions = ring_edges(coordinates, offsets, ids)
+    px = np.asarray(x, dtype=np.float64)[positions]
+    py = np.asarray(y, dtype=np.float64)[positions]
+    straddle = (y1 > py) != (y2 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = straddle & (px < x1 + (py - y1)*(x2 - x1)/(y2 - y1))
+    return np.bincount(positions, weights=crossing, minlength=len(ids)) % 2 == 1
+
+def _segments_cross(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    """True where segment a intersects segment b (arrays broadcast together)"""
+    def orientation(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px)*(ry - py) - (qy - py)*(rx - px))
+    o1 = orientation(ax1, ay1, ax2, ay2, bx1, by1)
+    o2 = orientation(ax1, ay1, ax2, ay2, bx2, by2)
+    o3 = orientation(bx1, by1, bx2, by2, ax1, ay1)
+    o4 = orientation(bx1, by1, bx2, by2, ax2, ay2)
+    # collinear touching segments are not considered crossing
+    return (o1*o2 < 0) & (o3*o4 < 0)
+
+
+class FootprintIndex:
+    """Static R-tree of footprint polygons for coverage queries
+
+    The tree is bulk loaded with the Sort-Tile-Recursive packing: footprints
+    are sorted in vertical slices by bounding box centre x, then by y inside
+    each slice, and grouped NODE_CAPACITY at a time; upper levels group
+    consecutive nodes. Children of a node are contiguous, so the tree is a
+    list of bounding box arrays and queries descend it level by level with
+    array operations. The index is saved as a numpy .npz file next to the
+    footprints output and loaded without reading the GeoPackage.
+
+    example:
+
+        index = FootprintIndex.fromFile('footprints.gpkg')
+        index.save(index_path('footprints.gpkg'))
+        for record in index.records(index.queryPoint(x, y)):
+            print(record['path'])
+    """
+
+    def __init__(self, coordinates, offsets, attributes, pathField='path', tree=None):
+        """
+        :param coordinates, offsets: footprint rings as returned by read_footprints
+        :param attributes: dict field name => sequence of values, one for each footprint
+        :param pathField: attribute with the image path
+        :param tree: tuple (order, levels) of a saved index, if None the tree is built
+        """
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.attributes = dict((name, _column(values)) for name, values in attributes.items())
+        self.pathField = pathField
+
+        self.bboxes = ring_bboxes(self.coordinates, self.offsets)
+        if tree is None:
+            self._build()
+        else:
+            self.order, self.levels = tree
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    @classmethod
+    def fromFile(cls, path, layerName=None, fields=None):
+        """
+        :param path: footprints vector file (e.g. BatchUAVImageFootprints GeoPackage output)
+        :return: FootprintIndex of the footprints of the layer
+        """
+        return cls(*read_footprints(path, layerName, fields))
+
+    def _build(self):
+        """Sort-Tile-Recursive bulk loading of the tree levels"""
+        count = len(self.bboxes)
+        centres = (self.bboxes[:, :2] + self.bboxes[:, 2:])/2
+        leaves = -(-count // NODE_CAPACITY)
+        slices = max(1, int(np.ceil(np.sqrt(leaves))))
+        perSlice = slices*NODE_CAPACITY
+
+        byX = np.argsort(centres[:, 0], kind='stable')
+        slice_ = np.empty(count, dtype=np.int64)
+        slice_[byX] = np.arange(count) // perSlice
+        # footprint ids in tree order: by slice, then by y in the slice
+        self.order = np.lexsort((centres[:, 1], slice_))
+
+        # levels[0] are the nodes grouping footprints, the last level is the root
+        self.levels = []
+        boxes = self.bboxes[self.order]
+        while True:
+            starts = np.arange(0, len(boxes), NODE_CAPACITY)
+            if not len(starts):
+                break
+            nodes = np.empty((len(starts), 4))
+            nodes[:, 0] = np.minimum.reduceat(boxes[:, 0], starts)
+            nodes[:, 1] = np.minimum.reduceat(boxes[:, 1], starts)
+            nodes[:, 2] = np.maximum.reduceat(boxes[:, 2], starts)
+            nodes[:, 3] = np.maximum.reduceat(boxes[:, 3], starts)
+            self.levels.append(nodes)
+            if len(nodes) == 1:
+                break
+            boxes = nodes
+
+    @staticmethod
+    def _children(nodes, childrenCount):
+        """indexes of the children of nodes, children of node i are i*NODE_CAPACITY..."""
+        counts = np.minimum(NODE_CAPACITY, childrenCount - nodes*NODE_CAPACITY)
+        firsts = np.repeat(nodes*NODE_CAPACITY - (np.cumsum(counts) - counts), counts)
+        return np.arange(counts.sum()) + firsts
+
+    def queryBbox(self, xmin, ymin, xmax, ymax):
+        """
+        :return: sorted array of the ids of the footprints whose bounding box
+            intersects the box
+        """
+        def intersecting(boxes):
+            return (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)
+
+        if not self.levels:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.flatnonzero(intersecting(self.levels[-1]))
+        for level in range(len(self.levels) - 1, 0, -1):
+            children = self._children(nodes, len(self.levels[level - 1]))
+            nodes = children[intersecting(self.levels[level - 1][children])]
+        positions = self._children(nodes, len(self.bboxes))
+        ids = self.order[positions]
+        return np.sort(ids[intersecting(self.bboxes[ids])])
+
+    def queryPoint(self, x, y):
+        """
+        :return: sorted array of the ids of the footprints containing the point
+        """
+        ids = self.queryBbox(x, y, x, y)
+        return ids[points_in_rings(np.full(len(ids), x), np.full(len(ids), y),
+                                   self.coordinates, self.offsets, ids)]
+
+    def queryPolygon(self, ring):
+        """
+        :param ring: (M, 2) closed exterior ring of the query polygon
+        :return: sorted array of the ids of the footprints intersecting the polygon
+        """
+        ring = np.asarray(ring, dtype=np.float64)[:, :2]
+        ids = self.queryBbox(ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max())
+        if not len(ids):
+            return ids
+
+        # the polygon is inside a footprint or a footprint inside the polygon
+        inside = points_in_rings(np.full(len(ids), ring[0, 0]), np.full(len(ids), ring[0, 1]),
+                                 self.coordinates, self.offsets, ids)
+        firsts = self.coordinates[self.offsets[ids]]
+        queryOffsets = np.array([0, len(ring)])
+        inside |= points_in_rings(firsts[:, 0], firsts[:, 1], ring, queryOffsets, np.zeros(len(ids), dtype=np.int64))
+
+        # or their edges cross
+        x1, y1, x2, y2, positions = ring_edges(self.coordinates, self.offsets, ids)
+        crossing = _segments_cross(x1[:, np.newaxis], y1[:, np.newaxis], x2[:, np.newaxis], y2[:, np.newaxis],
+                                   ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]).any(axis=1)
+        inside |= np.bincount(positions, weights=crossing, minlength=len(ids)) > 0
+        return ids[inside]
+
+    def records(self, ids):
+        """
+        :param ids: footprint ids returned by the queries
+        :return: list of dicts field name => value, one for each id
+        """
+        columns = [(name, values[ids]) for name, values in self.attributes.items()]
+        return [dict((name, values[position].item()) for name, values in columns)
+                for position in range(len(ids))]
+
+    def paths(self, ids):
+        """
+        :return: image paths of the footprint ids
+        """
+        return self.attributes[self.pathField][ids].tolist()
+
+    def save(self, path):
+        """
+        Serialize the index and the footprints as numpy .npz file
+        """
+        arrays = dict(('attribute_' + name, values) for name, values in self.attributes.items())
+        arrays.update(('level_{}'.format(level), nodes) for level, nodes in enumerate(self.levels))
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     version=INDEX_VERSION,
+                     path_field=self.pathField,
+                     coordinates=self.coordinates,
+                     offsets=self.offsets,
+                     order=self.order,
+                     **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: .npz file written by save
+        :return: FootprintIndex
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError('Unsupported footprint index version: {}'.format(path))
+            attributes = dict((name[len('attribute_'):], data[name])
+                              for name in data.files if name.startswith('attribute_'))
+            levels = [data['level_{}'.format(level)]
+                      for level in range(sum(name.startswith('level_') for name in data.files))]
+            return cls(data['coordinates'], data['offsets'], attributes, str(data['path_field']),
+                       (data['order'], levels))
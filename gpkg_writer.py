@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    gpkg_writer.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+from osgeo import ogr
+
+
+def is_geopackage_path(path):
+    """
+    :return: True if path is a plain GeoPackage file path (no layer or open options)
+    """
+    return (isinstance(path, str) and
+            path.lower().endswith('.gpkg') and
+            '|' not in path and
+            not path.lower().startswith(('ogr:', 'memory:', 'postgres:')))
+
+
+class GeoPackageWriter:
+    """Bulk writer of features to the layers of a GeoPackage through OGR
+
+    Features are buffered in a transaction committed every batchSize
+    features instead of a commit for each row. Layers are created without
+    spatial index, that is built once in close() when all rows are written.
+    Attributes are set by index in the same order of the layer fields and
+    geometries are passed as WKB.
+
+    with GeoPackageWriter('footprints.gpkg') as writer:
+        layer = writer.createLayer('footprints', ogr.wkbPolygon, srs, fields)
+        writer.add(layer, attributes, wkb)
+    """
+    DEFAULT_BATCH_SIZE = 10000
+
+    def __init__(self, path, batchSize=DEFAULT_BATCH_SIZE, overwrite=True):
+        """
+        :param path: GeoPackage file
+        :param batchSize: features written for each transaction. If None
+            transactions are committed only by flush and close
+        :param overwrite: if True remove the GeoPackage if exists
+        """
+        self.path = path
+        self.batchSize = batchSize
+        self.count = 0
+        self._pending = 0
+        self._layers = []
+        driver = ogr.GetDriverByName('GPKG')
+        if overwrite and os.path.exists(path):
+            driver.DeleteDataSource(path)
+        if os.path.exists(path):
+            self._dataSource = ogr.Open(path, 1)
+        else:
+            self._dataSource = driver.CreateDataSource(path)
+        if self._dataSource is None:
+            raise IOError('Cannot open GeoPackage: {}'.format(path))
+        self._inTransaction = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def createLayer(self, name, geometryType, srs, fields):
+        """
+        :param name: layer name
+        :param geometryType: OGR geometry type e.g. ogr.wkbPolygon
+        :param srs: osr.SpatialReference of the geometries
+        :param fields: list of (name, OGR field type) tuples
+        :return: the created ogr.Layer to pass to add
+        """
+        self._commit()
+        layer = self._dataSource.CreateLayer(name, srs, geometryType, ['SPATIAL_INDEX=NO'])
+        if layer is None:
+            raise IOError('Cannot create layer {} in: {}'.format(name, self.path))
+        for fieldName, fieldType in fields:
+            layer.CreateField(ogr.FieldDefn(fieldName, fieldType))
+        self._layers.append(layer)
+        return layer
+
+    def openLayer(self, name, geometryType, srs, fields):
+        """
+        Open an existing layer to append features, adding the missing fields.
+        The layer is created if it does not exist.
+        :return: ogr.Layer to pass to add
+        """
+        layer = self._dataSource.GetLayerByName(name)
+        if layer is None:
+            return self.createLayer(name, geometryType, srs, fields)
+        self._commit()
+        layerDefinition = layer.GetLayerDefn()
+        existing = set(layerDefinition.GetFieldDefn(index).GetName()
+                       for index in range(layerDefinition.GetFieldCount()))
+        for fieldName, fieldType in fields:
+            if fieldName not in existing:
+                layer.CreateField(ogr.FieldDefn(fieldName, fieldType))
+        # the layer can come from a run interrupted before its spatial index was built
+        self._layers.append(layer)
+        return layer
+
+    def readIndex(self, layer, keyField, valueFields):
+        """
+        Read the values of some fields of all the features, without geometries
+        :param layer: ogr.Layer
+        :param keyField: field used as key e.g. 'path'
+        :param valueFields: fields to read for each key e.g. ('file_size', 'file_mtime')
+        :return: dict key => tuple of values
+        """
+        layerDefinition = layer.GetLayerDefn()
+        wanted = set((keyField,) + tuple(valueFields))
+        ignored = [layerDefinition.GetFieldDefn(index).GetName()
+                   for index in range(layerDefinition.GetFieldCount())]
+        ignored = [name for name in ignored if name not in wanted] + ['OGR_GEOMETRY', 'OGR_STYLE']
+        layer.SetIgnoredFields(ignored)
+        try:
+            layer.ResetReading()
+            return {feature.GetField(keyField): tuple(feature.GetField(name) for name in valueFields)
+                    for feature in layer}
+        finally:
+            layer.SetIgnoredFields([])
+
+    def deleteWhere(self, layer, field, values, batch=500):
+        """
+        Delete the features with field value in values, in the current transaction
+        :param layer: ogr.Layer
+        :param field: field name e.g. 'path'
+        :param values: string values
+        """
+        values = list(values)
+        if not values:
+            return
+        if not self._inTransaction:
+            self._dataSource.StartTransaction()
+            self._inTransaction = True
+        for start in range(0, len(values), batch):
+            condition = ', '.join("'{}'".format(value.replace("'", "''"))
+                                  for value in values[start:start + batch])
+            self._dataSource.ExecuteSQL('DELETE FROM "{}" WHERE "{}" IN ({})'.format(
+                layer.GetName(), field, condition))
+
+    def add(self, layer, attributes, wkb):
+        """
+        Add a feature, the transaction is committed every batchSize features
+        :param layer: layer returned by createLayer
+        :param attributes: sequence of values in the same order of the fields
+        :param wkb: WKB geometry
+        """
+        if not self._inTransaction:
+            self._dataSource.StartTransaction()
+            self._inTransaction = True
+        feature = ogr.Feature(layer.GetLayerDefn())
+        for index, value in enumerate(attributes):
+            if value is not None:
+                feature.SetField(index, value)
+        feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(wkb))
+        layer.CreateFeature(feature)
+        self.count += 1
+        self._pending += 1
+        if self.batchSize is not None and self._pending >= self.batchSize:
+            self._commit()
+
+    def flush(self):
+        """
+        Commit the features added so far
+        """
+        self._commit()
+
+    def _commit(self):
+        if self._inTransaction:
+            self._dataSource.CommitTransaction()
+            self._inTransaction = False
+        self._pending = 0
+
+    def _hasSpatialIndex(self, layer):
+        """
+        :return: True if the R-tree table of the layer exists. sqlite_master is
+            queried because gpkg_extensions is created only when an extension is used
+        """
+        rtreeName = 'rtree_{}_{}'.format(layer.GetName(), layer.GetGeometryColumn()).replace("'", "''")
+        result = self._dataSource.ExecuteSQL(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+            "AND lower(name) = lower('{}')".format(rtreeName))
+        if result is None:
+            return False
+        try:
+            feature = result.GetNextFeature()
+            return feature is not None and feature.GetField(0) > 0
+        finally:
+            self._dataSource.ReleaseResultSet(result)
+
+    def close(self):
+        """
+        Commit pending features and build the spatial index of the layers
+        created or opened, if they don't have it yet
+        """
+        if self._dataSource is None:
+            return
+        self._commit()
+        for layer in self._layers:
+            if self._hasSpatialIndex(layer):
+                continue
+            result = self._dataSource.ExecuteSQL("SELECT CreateSpatialIndex('{}', '{}')".format(
+                layer.GetName(), layer.GetGeometryColumn()))
+            if result is not None:
+                self._dataSource.ReleaseResultSet(result)
+        self._layers = []
+        self._dataSource = None
@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    image_metadata.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import struct
+from xml.parsers import expat
+
+from profiling import timed
+
+
+class MetadataError(Exception):
+    """Raised when image metadata can't be read or are incomplete"""
+    pass
+
+
+class NotJpegError(MetadataError):
+    """Raised by read_jpeg_metadata if the file is not a JPEG"""
+    pass
+
+###############################################
+# Header only JPEG metadata reader.
+# Only the marker segments before the image data (SOS marker) are read, that
+# usually means the first tens of KB of the file. The EXIF tags are returned
+# with the same names and string formatting of the GDAL JPEG driver metadata
+# (e.g. EXIF_GPSLatitude = '(43) (16) (20.3444)') so that they can be used in
+# place of gdal.Open(source).GetMetadata()
+
+_XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+_EXIF_HEADER = b'Exif\x00\x00'
+
+# markers without length and payload
+_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+_SOI = 0xD8
+_SOS = 0xDA
+_EOI = 0xD9
+_APP1 = 0xE1
+
+# pointers to sub IFDs
+_EXIF_IFD_POINTER = 0x8769
+_GPS_IFD_POINTER = 0x8825
+_INTEROPERABILITY_IFD_POINTER = 0xA005
+
+# TIFF data types: (struct format, size)
+_TIFF_TYPES = {
+    1: ('B', 1),    # BYTE
+    2: ('s', 1),    # ASCII
+    3: ('H', 2),    # SHORT
+    4: ('L', 4),    # LONG
+    5: ('LL', 8),   # RATIONAL
+    6: ('b', 1),    # SBYTE
+    7: ('B', 1),    # UNDEFINED
+    8: ('h', 2),    # SSHORT
+    9: ('l', 4),    # SLONG
+    10: ('ll', 8),  # SRATIONAL
+    11: ('f', 4),   # FLOAT
+    12: ('d', 8),   # DOUBLE
+}
+
+# tags of IFD0 and EXIF IFD with the name used by GDAL
+_EXIF_TAGS = {
+    0x010E: 'EXIF_ImageDescription',
+    0x010F: 'EXIF_Make',
+    0x0110: 'EXIF_Model',
+    0x0112: 'EXIF_Orientation',
+    0x011A: 'EXIF_XResolution',
+    0x011B: 'EXIF_YResolution',
+    0x0128: 'EXIF_ResolutionUnit',
+    0x0131: 'EXIF_Software',
+    0x0132: 'EXIF_DateTime',
+    0x829A: 'EXIF_ExposureTime',
+    0x829D: 'EXIF_FNumber',
+    0x8822: 'EXIF_ExposureProgram',
+    0x8827: 'EXIF_ISOSpeedRatings',
+    0x9003: 'EXIF_DateTimeOriginal',
+    0x9004: 'EXIF_DateTimeDigitized',
+    0x9201: 'EXIF_ShutterSpeedValue',
+    0x9202: 'EXIF_ApertureValue',
+    0x9204: 'EXIF_ExposureBiasValue',
+    0x9205: 'EXIF_MaxApertureValue',
+    0x9206: 'EXIF_SubjectDistance',
+    0x9207: 'EXIF_MeteringMode',
+    0x9208: 'EXIF_LightSource',
+    0x9209: 'EXIF_Flash',
+    0x920A: 'EXIF_FocalLength',
+    0xA002: 'EXIF_PixelXDimension',
+    0xA003: 'EXIF_PixelYDimension',
+    0xA402: 'EXIF_ExposureMode',
+    0xA403: 'EXIF_WhiteBalance',
+    0xA404: 'EXIF_DigitalZoomRatio',
+    0xA405: 'EXIF_FocalLengthIn35mmFilm',
+    0xA406: 'EXIF_SceneCaptureType',
+    0xA420: 'EXIF_ImageUniqueID',
+    0xA431: 'EXIF_BodySerialNumber',
+}
+
+_GPS_TAGS = {
+    0x0000: 'EXIF_GPSVersionID',
+    0x0001: 'EXIF_GPSLatitudeRef',
+    0x0002: 'EXIF_GPSLatitude',
+    0x0003: 'EXIF_GPSLongitudeRef',
+    0x0004: 'EXIF_GPSLongitude',
+    0x0005: 'EXIF_GPSAltitudeRef',
+    0x0006: 'EXIF_GPSAltitude',
+    0x0007: 'EXIF_GPSTimeStamp',
+    0x0012: 'EXIF_GPSMapDatum',
+    0x001D: 'EXIF_GPSDateStamp',
+}
+
+def _format_tiff_value(fieldType, count, data, byteOrder):
+    """
+    Format a TIFF field value as GDAL does: ASCII as string, rationals as '(value)'
+    and numbers separated by a space
+    :return: str or None if the type is not managed
+    """
+    if fieldType == 2:
+        return data[:count].split(b'\x00', 1)[0].decode('latin-1').strip()
+
+    fmt, size = _TIFF_TYPES[fieldType]
+    if fieldType in (5, 10):
+        values = struct.unpack(byteOrder + fmt*count, data[:size*count])
+        return ' '.join('({:.15g})'.format(num/den if den else 0.0)
+                        for num, den in zip(values[::2], values[1::2]))
+    values = struct.unpack(byteOrder + fmt*count, data[:size*count])
+    if fieldType in (11, 12):
+        return ' '.join('{:.15g}'.format(value) for value in values)
+    return ' '.join(str(value) for value in values)
+
+def _read_ifd(tiff, offset, byteOrder, tagNames, exifTags):
+    """
+    Read the tags of an IFD adding the ones in tagNames to exifTags
+    :return: dict of the sub IFD pointers found in the IFD {tag: offset}
+    """
+    pointers = {}
+    if offset + 2 > len(tiff):
+        return pointers
+    (entries,) = struct.unpack_from(byteOrder + 'H', tiff, offset)
+    for index in range(entries):
+        entryOffset = offset + 2 + index*12
+        if entryOffset + 12 > len(tiff):
+            break
+        tag, fieldType, count = struct.unpack_from(byteOrder + 'HHL', tiff, entryOffset)
+        if fieldType not in _TIFF_TYPES:
+            continue
+
+        if tag in (_EXIF_IFD_POINTER, _GPS_IFD_POINTER, _INTEROPERABILITY_IFD_POINTER):
+            (pointers[tag],) = struct.unpack_from(byteOrder + 'L', tiff, entryOffset + 8)
+            continue
+
+        name = tagNames.get(tag)
+        if name is None:
+            continue
+
+        size = _TIFF_TYPES[fieldType][1]*count
+        if size <= 4:
+            data = tiff[entryOffset + 8:entryOffset + 12]
+        else:
+            (valueOffset,) = struct.unpack_from(byteOrder + 'L', tiff, entryOffset + 8)
+            data = tiff[valueOffset:valueOffset + size]
+        if len(data) < size:
+            continue
+        exifTags[name] = _format_tiff_value(fieldType, count, data, byteOrder)
+    return pointers
+
+def parse_exif(payload):
+    """
+    Parse the TIFF structure of an EXIF APP1 segment
+    :param payload: APP1 payload without the 'Exif\\0\\0' header
+    :type payload: bytes
+    :return: dict of EXIF tags named as in GDAL metadata
+    """
+    exifTags = {}
+    if payload[:2] == b'II':
+        byteOrder = '<'
+    elif payload[:2] == b'MM':
+        byteOrder = '>'
+    else:
+        raise MetadataError('Invalid EXIF byte order mark')
+    (ifd0Offset,) = struct.unpack_from(byteOrder + 'L', payload, 4)
+
+    pointers = _read_ifd(payload, ifd0Offset, byteOrder, _EXIF_TAGS, exifTags)
+    if _EXIF_IFD_POINTER in pointers:
+        _read_ifd(payload, pointers[_EXIF_IFD_POINTER], byteOrder, _EXIF_TAGS, exifTags)
+    if _GPS_IFD_POINTER in pointers:
+        _read_ifd(payload, pointers[_GPS_IFD_POINTER], byteOrder, _GPS_TAGS, exifTags)
+    return exifTags
+
+def read_jpeg_metadata(path):
+    """
+    Read EXIF tags and XMP packet of a JPEG reading only the marker segments
+    preceding the compressed image data. No GDAL driver probing, no sidecar
+    files lookup and no full file read.
+    :param path: JPEG file path
+    :type path: str
+    :return: tuple (exifTags, xmpPacket). exifTags is a dict with the same keys
+        and values formatting of the GDAL JPEG driver default metadata domain.
+        xmpPacket is the XMP xml string or None if not present
+    :raise NotJpegError: if the file does not start with the JPEG SOI marker
+    """
+    exifPayloads, xmpPacket = _read_jpeg_segments(path)
+    return _parse_exif_payloads(exifPayloads), xmpPacket
+
+def _read_jpeg_segments(path):
+    """
+    :return: tuple (exifPayloads, xmpPacket) with the raw TIFF payloads of the
+        EXIF APP1 segments and the XMP packet (None if not present)
+    :raise NotJpegError: if the file does not start with the JPEG SOI marker
+    """
+    exifPayloads = []
+    xmpPacket = None
+    with open(path, 'rb', buffering=65536) as f:
+        if f.read(2) != b'\xff\xd8':
+            raise NotJpegError('{} is not a JPEG file'.format(path))
+
+        while True:
+            byte = f.read(1)
+            if not byte:
+                break
+            if byte != b'\xff':
+                raise MetadataError('Corrupted JPEG marker segments')
+            # skip fill bytes
+            marker = 0xFF
+            while marker == 0xFF:
+                byte = f.read(1)
+                if not byte:
+                    break
+                marker = byte[0]
+            if marker in _STANDALONE_MARKERS or marker == _SOI:
+                continue
+            if marker in (_SOS, _EOI):
+                # image data start here: metadata are all read
+                break
+
+            header = f.read(2)
+            if len(header) < 2:
+                break
+            (length,) = struct.unpack('>H', header)
+            if length < 2:
+                # the length includes its own 2 bytes
+                raise MetadataError('Invalid JPEG segment length {}'.format(length))
+            if marker != _APP1:
+                f.seek(length - 2, 1)
+                continue
+
+            segment = f.read(length - 2)
+            if len(segment) < length - 2:
+                raise MetadataError('Truncated JPEG segment')
+            if segment.startswith(_EXIF_HEADER):
+                exifPayloads.append(segment[len(_EXIF_HEADER):])
+            elif segment.startswith(_XMP_HEADER) and xmpPacket is None:
+                xmpPacket = segment[len(_XMP_HEADER):].decode('utf-8', errors='replace')
+
+    return exifPayloads, xmpPacket
+
+def _parse_exif_payloads(exifPayloads):
+    """
+    :return: dict of the EXIF tags of all the payloads
+    :raise MetadataError: if a payload is malformed (e.g. bad offsets or counts)
+    """
+    exifTags = {}
+    for payload in exifPayloads:
+        try:
+            exifTags.update(parse_exif(payload))
+        except (struct.error, ValueError, IndexError, OverflowError) as ex:
+            raise MetadataError('Malformed EXIF: {}'.format(ex))
+    return exifTags
+
+###############################################
+
+def _read_gdal_metadata(source, timings=None):
+    """
+    Read EXIF tags and XMP packet through GDAL. Used for non JPEG images
+    :param timings: optional dict where stage durations are added
+    :return: tuple (exifTags, xmpPacket) as read_jpeg_metadata
+    """
+    from osgeo import gdal
+    with timed(timings, 'file open'):
+        dataFrame = gdal.Open(source, gdal.GA_ReadOnly)
+    if dataFrame is None:
+        raise MetadataError('Can not open {}'.format(source))
+
+    with timed(timings, 'metadata domain enumeration'):
+        # get exif metadata
+        exifTags = dataFrame.GetMetadata()
+        xmpPacket = None
+        metadata = dataFrame.GetMetadata('xml:XMP')
+        if isinstance(metadata, list) and metadata:
+            xmpPacket = metadata[0]
+    return exifTags, xmpPacket
+
+###############################################
+# Streaming XMP parser.
+# Only the declared drone tags are extracted in a single expat pass, without
+# building any element tree. Tags are matched with their full namespace URI so
+# the parser does not depend on the prefix or on the position of the
+# rdf:Description element. Both the attribute form
+#    <rdf:Description drone-dji:RelativeAltitude="+50.20" ...>
+# and the element form
+#    <drone-dji:RelativeAltitude>+50.20</drone-dji:RelativeAltitude>
+# are managed.
+
+DJI_XMP_NAMESPACE = 'http://www.dji.com/drone-dji/1.0/'
+
+# tags needed to calculate the footprints
+DRONE_XMP_KEYS = (
+    'RelativeAltitude',
+    'GimbalRollDegree',
+    'GimbalPitchDegree',
+    'GimbalYawDegree',
+    'FlightRollDegree',
+    'FlightPitchDegree',
+    'FlightYawDegree',
+)
+# tags extracted if available
+DRONE_XMP_OPTIONAL_KEYS = (
+    'AbsoluteAltitude',
+)
+
+
+class _AllTagsFound(Exception):
+    """Used to stop expat as soon as all the tags are found"""
+    pass
+
+
+def parse_drone_xmp(xmpPacket, keys=DRONE_XMP_KEYS, optionalKeys=DRONE_XMP_OPTIONAL_KEYS,
+                    namespace=DJI_XMP_NAMESPACE):
+    """
+    Parse drone XMP tags
+    :param xmpPacket: XMP xml string
+    :param keys: required tag names (without namespace)
+    :param optionalKeys: tag names (without namespace) returned only if present
+    :param namespace: namespace URI of the tags
+    :return: dict of XMP tags without namespace
+        e.g. {'RelativeAltitude': '+50.20', ...}
+    :raise MetadataError: if the packet is not valid xml or a required tag is missing
+    """
+    # with the separator '}' expat report names as 'namespace}tag'
+    # 'namespace}tag' => 'tag'
+    wanted = {namespace + '}' + key: key for key in tuple(keys) + tuple(optionalKeys)}
+    droneMetadata = {}
+    # element form tag being read: [key, text chunks]
+    current = []
+
+    def startElement(name, attributes):
+        for attribute, value in attributes.items():
+            key = wanted.get(attribute)
+            if key is not None and key not in droneMetadata:
+                droneMetadata[key] = value
+        key = wanted.get(name)
+        if key is not None and key not in droneMetadata:
+            current[:] = [key, []]
+        elif len(droneMetadata) == len(wanted):
+            raise _AllTagsFound()
+
+    def characterData(data):
+        if current:
+            current[1].append(data)
+
+    def endElement(name):
+        if current and wanted.get(name) == current[0]:
+            droneMetadata[current[0]] = ''.join(current[1]).strip()
+            del current[:]
+
+    parser = expat.ParserCreate(namespace_separator='}')
+    parser.StartElementHandler = startElement
+    parser.CharacterDataHandler = characterData
+    parser.EndElementHandler = endElement
+    try:
+        parser.Parse(xmpPacket, True)
+    except _AllTagsFound:
+        pass
+    except expat.ExpatError as ex:
+        raise MetadataError('Invalid XMP packet: {}'.format(ex))
+
+    missing = [key for key in keys if key not in droneMetadata]
+    if missing:
+        raise MetadataError('Missing XMP tags: {}'.format(
+            ', '.join('{' + namespace + '}' + key for key in missing)))
+    return droneMetadata
+
+def _convert_to_degress(value):
+    """
+    Helper function to convert the GPS coordinates stored in the EXIF to degress in float format
+    :param value:
+    :type value: str (e.g. '(43) (16) (20.3444)')
+    :rtype: float
+    """
+    values = value.translate(str.maketrans({'(':None, ')':None})).split()
+    d = float(values[0])
+    m = float(values[1])
+    s = float(values[2])
+
+    return d + (m / 60.0) + (s / 3600.0)
+
+def extract_image_metadata(source, timings=None):
+    """
+    Read EXIF tags and XMP drone metadata of an image. JPEGs are read with the
+    header only reader, other formats through GDAL.
+    The function does not use QGIS objects so it can be run in worker threads
+    :param source: image path
+    :type source: str
+    :param timings: optional dict where the durations of the stages
+        'file open', 'metadata domain enumeration' and 'XMP parse' are added
+    :return: tuple with (exifTags, droneMetadata) dictionaries
+    :raise MetadataError: if the drone XMP tags are missing
+    """
+    try:
+        with timed(timings, 'file open'):
+            exifPayloads, xmpPacket = _read_jpeg_segments(source)
+        with timed(timings, 'metadata domain enumeration'):
+            exifTags = _parse_exif_payloads(exifPayloads)
+    except NotJpegError:
+        exifTags, xmpPacket = _read_gdal_metadata(source, timings)
+    except MetadataError as ex:
+        raise MetadataError('{}: {}'.format(source, ex))
+
+    if not xmpPacket:
+        raise MetadataError('{}: no XMP packet found'.format(source))
+    try:
+        with timed(timings, 'XMP parse'):
+            droneMetadata = parse_drone_xmp(xmpPacket)
+    except MetadataError as ex:
+        raise MetadataError('{}: {}'.format(source, ex))
+    return exifTags, droneMetadata
+
+def image_record(exifTags, droneMetadata):
+    """
+    Extract from EXIF and XMP drone tags the values used to calculate footprints
+    :param exifTags: EXIF tags as returned by extract_image_metadata
+    :param droneMetadata: XMP drone tags as returned by extract_image_metadata
+    :return: dict with plain python values (JSON serializable) and keys:
+        latitude, longitude, date_time, image_width, image_height, make, model,
+        relative_altitude, absolute_altitude (None if not available),
+        gimbal_roll, gimbal_pitch, gimbal_yaw, flight_roll, flight_pitch, flight_yaw
+    """
+    # get image lat/lon that will be the coordinates of nadir point
+    lat = _convert_to_degress(exifTags['EXIF_GPSLatitude'])
+    lon = _convert_to_degress(exifTags['EXIF_GPSLongitude'])
+    if exifTags['EXIF_GPSLatitudeRef'] == 'S':
+        lat = -lat
+    if exifTags['EXIF_GPSLongitudeRef'] == 'W':
+        lon = -lon
+
+    absoluteAltitude = droneMetadata.get('AbsoluteAltitude')
+    if absoluteAltitude is not None:
+        absoluteAltitude = float(absoluteAltitude)
+
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'date_time': exifTags['EXIF_DateTime'],
+        'image_width': int(float(exifTags['EXIF_PixelXDimension'])),
+        'image_height': int(float(exifTags['EXIF_PixelYDimension'])),
+        'make': exifTags['EXIF_Make'],
+        'model': exifTags['EXIF_Model'],
+        'relative_altitude': float(droneMetadata['RelativeAltitude']),
+        'absolute_altitude': absoluteAltitude,
+        'gimbal_roll': float(droneMetadata['GimbalRollDegree']),
+        'gimbal_pitch': float(droneMetadata['GimbalPitchDegree']),
+        'gimbal_yaw': float(droneMetadata['GimbalYawDegree']),
+        'flight_roll': float(droneMetadata['FlightRollDegree']),
+        'flight_pitch': float(droneMetadata['FlightPitchDegree']),
+        'flight_yaw': float(droneMetadata['FlightYawDegree']),
+    }
+
+def read_image_record(source, timings=None):
+    """
+    Read the footprint related metadata of an image
+    :param source: image path
+    :param timings: optional dict where stage durations are added, see extract_image_metadata
+    :return: dict as returned by image_record
+    :raise MetadataError: if a needed EXIF or XMP tag is missing or malformed
+    """
+    exifTags, droneMetadata = extract_image_metadata(source, timings)
+    try:
+        return image_record(exifTags, droneMetadata)
+    except KeyError as ex:
+        raise MetadataError('{}: missing EXIF tag {}'.format(source, ex.args[0]))
+    except (ValueError, IndexError) as ex:
+        raise MetadataError('{}: malformed EXIF or XMP value: {}'.format(source, ex))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    image_sources.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import fnmatch
+
+# default patterns of images to process in a folder
+DEFAULT_PATTERNS = '*.jpg;*.jpeg'
+
+
+def _split_patterns(patterns):
+    """
+    :param patterns: patterns separated by ';' e.g. '*.jpg;*.jpeg' or list of patterns
+    :return: list of lowercase patterns
+    """
+    if isinstance(patterns, str):
+        patterns = patterns.split(';')
+    return [pattern.strip().lower() for pattern in patterns if pattern.strip()]
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatchcase(name.lower(), pattern) for pattern in patterns)
+
+def iter_image_paths(folder, patterns=DEFAULT_PATTERNS, recursive=False):
+    """
+    Generator of the images of a folder matching the patterns (case insensitive).
+    Directories are listed lazily one at time, and files are yielded sorted by
+    name inside each directory so that the order is the same in every run
+    (a checkpointed run is resumed by input position).
+    Memory is bounded by the largest directory, not by the whole tree: only
+    the names of the matching files of the directory being listed are kept
+    to sort them (some MB for a flat folder of 100k images).
+    :param folder: folder to scan
+    :param patterns: glob patterns separated by ';' or list of patterns
+    :param recursive: if True scan also subfolders
+    :return: yield image paths
+    """
+    patterns = _split_patterns(patterns)
+    with os.scandir(folder) as entries:
+        names = []
+        subfolders = []
+        for entry in entries:
+            if entry.is_dir():
+                if recursive:
+                    subfolders.append(entry.name)
+            elif _matches(entry.name, patterns):
+                names.append(entry.name)
+
+    names.sort()
+    for name in names:
+        yield os.path.join(folder, name)
+    del names
+    for subfolder in sorted(subfolders):
+        for path in iter_image_paths(os.path.join(folder, subfolder), patterns, recursive):
+            yield path
+
+def _count_folder_images(folder, patterns, recursive):
+    """
+    Count the images of iter_image_paths scanning the directories without
+    keeping or sorting the listed names
+    """
+    count = 0
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if recursive:
+                        folders.append(entry.path)
+                elif _matches(entry.name, patterns):
+                    count += 1
+    return count
+
+def iter_manifest_paths(manifest):
+    """
+    Generator of the images listed in a text manifest, one path for each line.
+    Empty lines and lines starting with '#' are skipped. Relative paths are
+    relative to the manifest folder.
+    :param manifest: manifest file path
+    :return: yield image paths
+    """
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, 'r', encoding='utf-8') as f:
+        for line in f:
+            path = line.strip()
+            if not path or path.startswith('#'):
+                continue
+            yield os.path.join(base, path)
+
+def count_image_paths(folder=None, patterns=DEFAULT_PATTERNS, recursive=False, manifest=None):
+    """
+    Count the images that iter_image_paths and iter_manifest_paths are going
+    to yield. The count only lists directory entries and manifest lines,
+    images are not opened.
+    :return: int
+    """
+    count = 0
+    if folder:
+        count += _count_folder_images(folder, _split_patterns(patterns), recursive)
+    if manifest:
+        count += sum(1 for _ in iter_manifest_paths(manifest))
+    return count
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    metadata_cache.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+
+def default_cache_path():
+    """
+    Default location of the metadata cache in the user cache directory
+    :rtype: str
+    """
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'uav_footprints', 'metadata_cache.sqlite')
+
+
+class MetadataCache:
+    """Persistent SQLite cache of image metadata records
+
+    Records are keyed by image path and are valid only if the image size and
+    modification time are the same of when the record was stored, so that a
+    modified or replaced image is read again.
+    The cache can be used from the metadata reader threads.
+
+    example:
+
+        with MetadataCache(path) as cache:
+            record = cache.read(imagePath, read_image_record)
+    """
+
+    # increase when the record content changes to ignore old records
+    RECORD_VERSION = 1
+    DEFAULT_MAX_ENTRIES = 1000000
+    # number of stored records before committing the transaction
+    COMMIT_EVERY = 500
+
+    def __init__(self, path=None, maxEntries=DEFAULT_MAX_ENTRIES, evictOnClose=False):
+        """
+        :param path: SQLite file. If None use default_cache_path()
+        :param maxEntries: number of records kept by evict()
+        :param evictOnClose: if True close() calls evict() when new records were stored
+        """
+        self.path = path or default_cache_path()
+        self.maxEntries = maxEntries
+        self.evictOnClose = evictOnClose
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stored = 0
+        self._accessed = {}
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS metadata ('
+            ' path TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' version INTEGER NOT NULL,'
+            ' record TEXT NOT NULL,'
+            ' accessed REAL NOT NULL)')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)')
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def get(self, path, stat=None):
+        """
+        Get the cached record of an image
+        :param path: image path
+        :param stat: os.stat_result of the image, if already available
+        :return: record dict or None if not cached or outdated
+        """
+        stat = stat or os.stat(path)
+        key = self._key(path)
+        with self._lock:
+            if self._connection is None:
+                return None
+            row = self._connection.execute(
+                'SELECT size, mtime_ns, version, record FROM metadata WHERE path = ?',
+                (key,)).fetchone()
+            if (row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns or
+                    row[2] != self.RECORD_VERSION):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[key] = time.time()
+        return json.loads(row[3])
+
+    def put(self, path, record, stat=None):
+        """
+        Store the record of an image
+        :param path: image path
+        :param record: JSON serializable dict
+        :param stat: os.stat_result of the image, if already available
+        """
+        stat = stat or os.stat(path)
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.execute(
+                'INSERT OR REPLACE INTO metadata (path, size, mtime_ns, version, record, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (self._key(path), stat.st_size, stat.st_mtime_ns, self.RECORD_VERSION,
+                 json.dumps(record), time.time()))
+            self._pending += 1
+            self._stored += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self._commit()
+
+    def read(self, path, reader, stat=None):
+        """
+        Return the cached record of an image or read and cache it
+        :param path: image path
+        :param reader: function returning the record of a path if not cached
+            e.g. image_metadata.read_image_record
+        :param stat: os.stat_result of the image, if already available
+        :return: record dict
+        """
+        stat = stat or os.stat(path)
+        record = self.get(path, stat)
+        if record is None:
+            record = reader(path)
+            self.put(path, record, stat)
+        return record
+
+    def invalidate(self, paths=None):
+        """
+        Remove records from the cache
+        :param paths: list of image paths to remove. If None the cache is emptied
+        """
+        with self._lock:
+            if paths is None:
+                self._connection.execute('DELETE FROM metadata')
+                self._accessed.clear()
+            else:
+                keys = [self._key(path) for path in paths]
+                self._connection.executemany('DELETE FROM metadata WHERE path = ?',
+                                             [(key,) for key in keys])
+                for key in keys:
+                    self._accessed.pop(key, None)
+            self._commit()
+
+    def evict(self, maxEntries=None, maxAge=None):
+        """
+        Remove the least recently used records
+        :param maxEntries: number of records to keep. Default self.maxEntries
+        :param maxAge: remove also records not accessed since maxAge seconds
+        :return: number of removed records
+        """
+        maxEntries = self.maxEntries if maxEntries is None else maxEntries
+        with self._lock:
+            self._flushAccessed()
+            # exactly the exceeding records, the oldest walking the accessed index
+            overflow = self._connection.execute('SELECT COUNT(*) FROM metadata').fetchone()[0] - maxEntries
+            removed = 0
+            if overflow > 0:
+                removed += self._connection.execute(
+                    'DELETE FROM metadata WHERE rowid IN '
+                    '(SELECT rowid FROM metadata ORDER BY accessed LIMIT ?)',
+                    (overflow,)).rowcount
+            if maxAge is not None:
+                removed += self._connection.execute(
+                    'DELETE FROM metadata WHERE accessed < ?',
+                    (time.time() - maxAge,)).rowcount
+            self._commit()
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+
+    def _flushAccessed(self):
+        # access times of hits are updated in bulk instead of one write per get
+        if self._accessed:
+            self._connection.executemany(
+                'UPDATE metadata SET accessed = ? WHERE path = ?',
+                [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def _commit(self):
+        self._connection.commit()
+        self._pending = 0
+
+    def close(self):
+        """
+        Store pending records and close the cache. With evictOnClose the
+        exceeding records are evicted if the cache grew
+        """
+        if self._connection is None:
+            return
+        if self.evictOnClose and self._stored:
+            self.evict()
+        with self._lock:
+            self._flushAccessed()
+            self._commit()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    overlap_graph.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import csv
+import heapq
+
+import numpy as np
+
+from footprint_index import ring_bboxes, ring_areas
+from footprint_geometry import polygon_wkb
+
+# footprints whose candidate pairs are built at once
+CHUNK_SIZE = 10000
+
+
+def candidate_pairs(bboxes, chunkSize=CHUNK_SIZE):
+    """
+    Pairs of footprints with intersecting bounding boxes found with a sweep
+    along x: boxes are sorted by xmin, the boxes starting before the end of
+    a box are found with a binary search and then filtered by y.
+    :param bboxes: (N, 4) array of bounding boxes (xmin, ymin, xmax, ymax)
+    :param chunkSize: number of boxes whose pairs are built at once
+    :return: tuple (first, second) of arrays of footprint ids with first < second
+    """
+    order = np.argsort(bboxes[:, 0], kind='stable')
+    sortedBoxes = bboxes[order]
+
+    firsts = []
+    seconds = []
+    for start in range(0, len(order), chunkSize):
+        positions = np.arange(start, min(start + chunkSize, len(order)))
+        # boxes after each box in the sweep order starting before its end
+        upper = np.searchsorted(sortedBoxes[:, 0], sortedBoxes[positions, 2], side='right')
+        counts = upper - positions - 1
+        first = np.repeat(positions, counts)
+        second = np.repeat(positions + 1 - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+        overlapping = ((sortedBoxes[first, 1] <= sortedBoxes[second, 3]) &
+                       (sortedBoxes[second, 1] <= sortedBoxes[first, 3]))
+        first = order[first[overlapping]]
+        second = order[second[overlapping]]
+        firsts.append(np.minimum(first, second))
+        seconds.append(np.maximum(first, second))
+
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+def overlap_graph(coordinates, offsets, minOverlap=0.0):
+    """
+    Sparse graph of the footprints overlapping more than minOverlap.
+    The overlap ratio is the intersection area over the area of the smaller
+    footprint. Candidate pairs come from the bounding boxes sweep, pairs that
+    can't reach minOverlap even with the bounding boxes intersection are
+    discarded, the others are intersected exactly with OGR.
+    :param coordinates, offsets: footprint rings as returned by read_footprints
+    :param minOverlap: minimum overlap ratio (0..1) of the returned edges
+    :return: tuple (first, second, ratios, areas) of edge arrays
+    """
+    from osgeo import ogr
+    bboxes = ring_bboxes(coordinates, offsets)
+    areas = ring_areas(coordinates, offsets)
+    first, second = candidate_pairs(bboxes)
+
+    smaller = np.minimum(areas[first], areas[second])
+    boxOverlap = ((np.minimum(bboxes[first, 2], bboxes[second, 2]) - np.maximum(bboxes[first, 0], bboxes[second, 0])) *
+                  (np.minimum(bboxes[first, 3], bboxes[second, 3]) - np.maximum(bboxes[first, 1], bboxes[second, 1])))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        possible = (smaller > 0) & (boxOverlap >= minOverlap*smaller)
+    first = first[possible]
+    second = second[possible]
+    smaller = smaller[possible]
+
+    # pairs are intersected in the sweep order (xmin of the last footprint of
+    # the pair): a footprint ending before the sweep position can't be in the
+    # following pairs, so its OGR geometry is dropped and only the geometries
+    # crossing the sweep line are kept alive
+    rank = np.empty(len(bboxes), dtype=np.int64)
+    rank[np.argsort(bboxes[:, 0], kind='stable')] = np.arange(len(bboxes))
+    sweepOrder = np.argsort(np.maximum(rank[first], rank[second]), kind='stable')
+
+    geometries = {}
+    alive = []
+    def geometry(id):
+        polygon = geometries.get(id)
+        if polygon is None:
+            polygon = ogr.CreateGeometryFromWkb(polygon_wkb(coordinates[offsets[id]:offsets[id + 1]]))
+            geometries[id] = polygon
+            heapq.heappush(alive, (bboxes[id, 2], id))
+        return polygon
+
+    intersections = np.zeros(len(first))
+    for position in sweepOrder.tolist():
+        id1 = int(first[position])
+        id2 = int(second[position])
+        sweepX = max(bboxes[id1, 0], bboxes[id2, 0])
+        while alive and alive[0][0] < sweepX:
+            del geometries[heapq.heappop(alive)[1]]
+        intersection = geometry(id1).Intersection(geometry(id2))
+        if intersection is not None and not intersection.IsEmpty():
+            intersections[position] = intersection.GetArea()
+
+    ratios = intersections/smaller
+    edges = (intersections > 0) & (ratios >= minOverlap)
+    return first[edges], second[edges], ratios[edges], intersections[edges]
+
+def write_edge_list(path, paths, first, second, ratios, areas):
+    """
+    Write the graph as CSV edge list: image1, image2, overlap, overlap_area
+    :param paths: image path of each footprint id
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('image1', 'image2', 'overlap', 'overlap_area'))
+        for id1, id2, ratio, area in zip(first.tolist(), second.tolist(), ratios.tolist(), areas.tolist()):
+            writer.writerow((paths[id1], paths[id2], '{:.4f}'.format(ratio), '{:.2f}'.format(area)))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    profiling.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import json
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+@contextmanager
+def timed(timings, stage):
+    """
+    Add the duration of the with block to timings[stage]. Used to collect
+    timings in worker threads/processes where a StageTimer is not available.
+    :param timings: dict stage => seconds, or None to do nothing
+    :param stage: stage name
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+class StageTimer:
+    """Collect durations of the processing stages and summarize them
+
+    timer = StageTimer()
+    with timer.stage('CRS transform'):
+        ...
+    timer.update(timingsFromWorker)
+    for line in timer.report(imagesCount):
+        print(line)
+    """
+
+    def __init__(self):
+        self._samples = OrderedDict()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self._samples.setdefault(name, []).append(seconds)
+
+    def update(self, timings):
+        """
+        :param timings: dict stage => seconds e.g. filled by timed()
+        """
+        for name, seconds in timings.items():
+            self.add(name, seconds)
+
+    def elapsed(self):
+        """
+        :return: seconds since the timer creation
+        """
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        """
+        :return: OrderedDict stage => dict with count, total, mean and p95 seconds
+        """
+        summary = OrderedDict()
+        for name, samples in self._samples.items():
+            samples = np.asarray(samples)
+            summary[name] = {
+                'count': int(samples.size),
+                'total': float(samples.sum()),
+                'mean': float(samples.mean()),
+                'p95': float(np.percentile(samples, 95)),
+            }
+        return summary
+
+    def report(self, images):
+        """
+        :param images: number of processed images
+        :return: list of lines with the summary of each stage and the throughput
+        """
+        elapsed = self.elapsed()
+        lines = ['{:<28} {:>8} {:>10} {:>10} {:>10}'.format('stage', 'count', 'total s', 'mean ms', 'p95 ms')]
+        for name, stats in self.summary().items():
+            lines.append('{:<28} {:>8} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                name, stats['count'], stats['total'], stats['mean']*1000, stats['p95']*1000))
+        lines.append('{} images in {:.3f} s: {:.1f} images/s'.format(
+            images, elapsed, images/elapsed if elapsed > 0 else 0.0))
+        return lines
+
+    def write_json(self, path, images, **extra):
+        """
+        Write the summary as JSON profile
+        :param path: JSON file path
+        :param images: number of processed images
+        :param extra: other values to store e.g. workers=4
+        """
+        elapsed = self.elapsed()
+        profile = OrderedDict([
+            ('images', images),
+            ('elapsed', elapsed),
+            ('images_per_second', images/elapsed if elapsed > 0 else 0.0),
+            ('stages', self.summary()),
+        ])
+        profile.update(extra)
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2)
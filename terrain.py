@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    terrain.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+from collections import OrderedDict
+
+import numpy as np
+
+from footprint_geometry import frustum_rays
+
+# number of DEM blocks kept in memory
+DEFAULT_CACHE_BLOCKS = 256
+# bisection steps refining the ray-terrain intersection
+REFINE_ITERATIONS = 10
+
+
+class DemReader:
+    """Elevation raster read by blocks on demand
+
+    Only the blocks containing sampled points are read (windowed reads of
+    the raster natural blocks) and the last cacheBlocks of them are kept in
+    memory, so that a flight over a large DEM loads only the tiles it touches.
+    Coordinates must be in the CRS of the DEM.
+
+    example:
+
+        with DemReader('dem.tif') as dem:
+            heights = dem.sample(xs, ys)
+    """
+
+    def __init__(self, path, band=1, cacheBlocks=DEFAULT_CACHE_BLOCKS):
+        """
+        :param path: raster readable by GDAL
+        :param band: elevation band number
+        :param cacheBlocks: maximum number of blocks kept in memory
+        """
+        from osgeo import gdal
+        self.path = path
+        self._dataset = gdal.Open(path, gdal.GA_ReadOnly)
+        if self._dataset is None:
+            raise IOError('Cannot open DEM: {}'.format(path))
+        self._band = self._dataset.GetRasterBand(band)
+        self._geotransform = self._dataset.GetGeoTransform()
+        if self._geotransform[2] or self._geotransform[4]:
+            raise ValueError('Rotated DEM are not supported: {}'.format(path))
+        self.width = self._dataset.RasterXSize
+        self.height = self._dataset.RasterYSize
+        self.blockWidth, self.blockHeight = self._band.GetBlockSize()
+        self._blocksPerRow = -(-self.width // self.blockWidth)
+        self._nodata = self._band.GetNoDataValue()
+        self._cacheBlocks = cacheBlocks
+        # block id => 2D float64 array, in least recently used order
+        self._blocks = OrderedDict()
+        self.blocksRead = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._blocks.clear()
+        self._band = None
+        self._dataset = None
+
+    @property
+    def srsWkt(self):
+        """WKT of the DEM CRS"""
+        return self._dataset.GetProjection()
+
+    @property
+    def pixelSize(self):
+        """smallest pixel side in CRS units"""
+        return min(abs(self._geotransform[1]), abs(self._geotransform[5]))
+
+    @property
+    def maximum(self):
+        """highest elevation if stored in the raster metadata, otherwise None"""
+        return self._band.GetMaximum()
+
+    def _block(self, blockId):
+        """
+        :return: block as float64 array with nan where there is no data
+        """
+        block = self._blocks.get(blockId)
+        if block is not None:
+            self._blocks.move_to_end(blockId)
+            return block
+
+        blockRow, blockColumn = divmod(int(blockId), self._blocksPerRow)
+        xoff = blockColumn*self.blockWidth
+        yoff = blockRow*self.blockHeight
+        block = self._band.ReadAsArray(xoff, yoff,
+                                       min(self.blockWidth, self.width - xoff),
+                                       min(self.blockHeight, self.height - yoff)).astype(np.float64)
+        if self._nodata is not None:
+            block[block == self._nodata] = np.nan
+        self.blocksRead += 1
+
+        self._blocks[blockId] = block
+        if len(self._blocks) > self._cacheBlocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def values(self, rows, columns):
+        """
+        Elevations of pixels, reading each needed block once
+        :param rows, columns: integer arrays of pixel positions
+        :return: float64 array, nan outside the raster or where there is no data
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        result = np.full(rows.shape, np.nan)
+        inside = (rows >= 0) & (rows < self.height) & (columns >= 0) & (columns < self.width)
+        if not inside.any():
+            return result
+
+        rows = rows[inside]
+        columns = columns[inside]
+        blockIds = (rows // self.blockHeight)*self._blocksPerRow + columns // self.blockWidth
+        order = np.argsort(blockIds, kind='stable')
+        blockIds = blockIds[order]
+        starts = np.flatnonzero(np.r_[True, blockIds[1:] != blockIds[:-1]])
+        values = np.empty(len(order))
+        for start, stop in zip(starts, np.r_[starts[1:], len(order)]):
+            selected = order[start:stop]
+            block = self._block(blockIds[start])
+            values[selected] = block[rows[selected] % self.blockHeight,
+                                     columns[selected] % self.blockWidth]
+        result[inside] = values
+        return result
+
+    def sample(self, x, y):
+        """
+        Bilinear interpolated elevations
+        :param x, y: arrays of coordinates in the DEM CRS
+        :return: float64 array, nan outside the raster or near no data pixels
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        originX, pixelWidth, _, originY, _, pixelHeight = self._geotransform
+        # pixel coordinates relative to the pixel centres
+        columns = (x - originX)/pixelWidth - 0.5
+        rows = (y - originY)/pixelHeight - 0.5
+        with np.errstate(invalid='ignore'):
+            column0 = np.floor(columns)
+            row0 = np.floor(rows)
+        # along the raster border the nearest pixel is used
+        column0 = np.clip(np.nan_to_num(column0), 0, self.width - 2 if self.width > 1 else 0)
+        row0 = np.clip(np.nan_to_num(row0), 0, self.height - 2 if self.height > 1 else 0)
+        dx = np.clip(columns - column0, 0, 1)
+        dy = np.clip(rows - row0, 0, 1)
+        column1 = np.minimum(column0 + 1, self.width - 1)
+        row1 = np.minimum(row0 + 1, self.height - 1)
+
+        values = self.values(np.concatenate((row0, row0, row1, row1)),
+                             np.concatenate((column0, column1, column0, column1))).reshape((4,) + x.shape)
+        heights = ((values[0]*(1 - dx) + values[1]*dx)*(1 - dy) +
+                   (values[2]*(1 - dx) + values[3]*dx)*dy)
+
+        # points outside the raster have no elevation
+        outside = (columns < -0.5) | (columns > self.width - 0.5) | (rows < -0.5) | (rows > self.height - 0.5)
+        heights[outside | ~np.isfinite(columns) | ~np.isfinite(rows)] = np.nan
+        return heights
+
+
+def heights_above_ground(dem, x, y, absoluteAltitude):
+    """
+    Height of the drone over the terrain under each nadir, instead of the
+    RelativeAltitude that is the height over the takeoff point.
+    All the nadirs are sampled with a single call reading each DEM block once.
+    :param dem: DemReader
+    :param x, y: arrays of nadir coordinates in the DEM CRS
+    :param absoluteAltitude: array of drone elevations in the DEM datum, nan if not known
+    :return: float64 array, nan where the height can not be calculated (no
+        absolute altitude, no DEM data or drone under the terrain)
+    """
+    absoluteAltitude = np.asarray(absoluteAltitude, dtype=np.float64)
+    heights = absoluteAltitude - dem.sample(x, y)
+    with np.errstate(invalid='ignore'):
+        heights[~(heights > 0)] = np.nan
+    return heights
+
+def densify_rays(rays, segments):
+    """
+    Add rays along the edges of the frustum pyramid, so that footprints
+    follow the terrain between the corners
+    :param rays: (N, 4, 3) frustum ray-vectors
+    :param segments: number of segments each frustum edge is split into
+    :return: (N, 4*segments, 3) normalised ray-vectors, starting with the corner rays
+    """
+    if segments <= 1:
+        return rays
+    weights = np.arange(segments, dtype=np.float64)/segments
+    following = np.roll(rays, -1, axis=1)
+    # rays in between two corners lie on the side plane of the pyramid
+    dense = (rays[:, :, np.newaxis, :]*(1 - weights)[:, np.newaxis] +
+             following[:, :, np.newaxis, :]*weights[:, np.newaxis])
+    dense = dense.reshape(len(rays), -1, 3)
+    return dense/np.linalg.norm(dense, axis=-1, keepdims=True)
+
+def terrain_intersections(dem, origins, rays, maxDistance, step=None):
+    """
+    Intersections of rays with the DEM surface, marching all the rays
+    together with a fixed step and refining the first crossing by bisection
+    :param dem: DemReader
+    :param origins: (N, 3) camera positions in the DEM CRS with elevation in the DEM datum
+    :param rays: (N, K, 3) normalised ray-vectors
+    :param maxDistance: rays are marched up to this distance (metre)
+    :param step: marching step (metre), default the DEM pixel size
+    :return: tuple (points, hit). points is a (N, K, 3) array: where the ray does
+        not reach the terrain within maxDistance (hit False) the point is at
+        maxDistance along the ray, like limitDistanceOfView
+    """
+    step = step or dem.pixelSize
+    origins = np.asarray(origins, dtype=np.float64)
+    count, raysCount = rays.shape[:2]
+    rayOrigins = np.repeat(origins, raysCount, axis=0)
+    directions = rays.reshape(-1, 3)
+
+    distances = np.full(len(directions), float(maxDistance))
+    hit = np.zeros(len(directions), dtype=bool)
+
+    # no intersection is possible above the highest elevation
+    maximum = dem.maximum
+    start = np.zeros(len(directions))
+    if maximum is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            start = np.where(directions[:, 2] < 0, (rayOrigins[:, 2] - maximum)/-directions[:, 2], 0)
+        start = np.clip(np.nan_to_num(start), 0, maxDistance)
+
+    active = np.flatnonzero(np.isfinite(rayOrigins).all(axis=1))
+    previous = start[active]
+    while len(active):
+        current = np.minimum(previous + step, maxDistance)
+        points = rayOrigins[active] + directions[active]*current[:, np.newaxis]
+        below = points[:, 2] <= dem.sample(points[:, 0], points[:, 1])
+
+        if below.any():
+            # bisection between the last point above and the first below the terrain
+            crossing = active[below]
+            lower = previous[below]
+            upper = current[below]
+            for _ in range(REFINE_ITERATIONS):
+                middle = (lower + upper)/2
+                points = rayOrigins[crossing] + directions[crossing]*middle[:, np.newaxis]
+                middleBelow = points[:, 2] <= dem.sample(points[:, 0], points[:, 1])
+                upper = np.where(middleBelow, middle, upper)
+                lower = np.where(middleBelow, lower, middle)
+            distances[crossing] = upper
+            hit[crossing] = True
+
+        # rays stop when reaching the terrain, maxDistance or going up over the highest elevation
+        keep = ~below & (current < maxDistance)
+        if maximum is not None:
+            heights = rayOrigins[active, 2] + directions[active, 2]*current
+            keep &= (directions[active, 2] < 0) | (heights <= maximum)
+        active = active[keep]
+        previous = current[keep]
+
+    points = rayOrigins + directions*distances[:, np.newaxis]
+    return points.reshape(count, raysCount, 3), hit.reshape(count, raysCount)
+
+def terrain_footprints(dem, x, y, z, gimbalRoll, gimbalPitch, gimbalYaw,
+                       horizontalFOV, verticalFOV, maxDistance, segments=1, step=None):
+    """
+    Footprints of N images as intersection of the camera frustum with the
+    DEM surface instead of the flat ground of frustum_footprints.
+    :param dem: DemReader
+    :param x, y: arrays of camera coordinates in the DEM CRS
+    :param z: array of camera elevations in the DEM datum (e.g. AbsoluteAltitude)
+    :param gimbalRoll, gimbalPitch, gimbalYaw: arrays of DJI gimbal angles (degree)
+    :param horizontalFOV: wide camera angle (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :param maxDistance: maximum distance of view (metre)
+    :param segments: number of segments each footprint side is split into
+    :param step: ray marching step (metre), default the DEM pixel size
+    :return: tuple (rings, valid). rings is a (N, 4*segments + 1, 2) array of
+        closed rings, valid a (N,) boolean array False where the camera
+        elevation is not known or the camera is under the terrain
+    """
+    origins = np.stack(np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in (x, y, z)]), axis=-1)
+    rays = frustum_rays(gimbalRoll, gimbalPitch, gimbalYaw, horizontalFOV, verticalFOV)
+    rays = densify_rays(np.broadcast_to(rays, origins.shape[:1] + rays.shape[1:]), segments)
+
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(origins).all(axis=1) & ~(origins[:, 2] <= dem.sample(origins[:, 0], origins[:, 1]))
+    points, _ = terrain_intersections(dem, np.where(valid[:, np.newaxis], origins, np.nan), rays, maxDistance, step)
+
+    rings = np.empty((len(points), points.shape[1] + 1, 2))
+    rings[:, :-1] = points[..., :2]
+    rings[:, -1] = rings[:, 0]
+    return rings, valid
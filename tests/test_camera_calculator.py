@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_camera_calculator.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import math
+
+import numpy as np
+
+from camera_calculator import CameraCalculator, Vector
+
+
+def _reference_polygon(FOVh, FOVv, altitude, roll, pitch, heading, maxDistance=None):
+    """getBoundingPolygon of the java code computed one ray at time with the scalar helpers"""
+    rays = [CameraCalculator.ray1(FOVh, FOVv), CameraCalculator.ray2(FOVh, FOVv),
+            CameraCalculator.ray3(FOVh, FOVv), CameraCalculator.ray4(FOVh, FOVv)]
+    rotatedRays = CameraCalculator.rotateRays(*rays, roll, pitch, heading)
+    origin = Vector(0, 0, altitude)
+    intersections = [CameraCalculator.findRayGroundIntersection(ray, origin) for ray in rotatedRays]
+    if maxDistance is not None:
+        CameraCalculator.limitRange(intersections, rotatedRays, altitude, origin, maxDistance)
+    return np.array([[point.x, point.y, point.z] for point in intersections])
+
+def _random_poses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    altitude = rng.uniform(20, 150, count)
+    roll = rng.uniform(-0.3, 0.3, count)
+    pitch = rng.uniform(-1.4, 1.4, count)
+    heading = rng.uniform(-math.pi, math.pi, count)
+    return altitude, roll, pitch, heading
+
+def test_bounding_polygons_match_single_pose():
+    FOVh, FOVv = math.radians(73.7), math.radians(53.1)
+    altitude, roll, pitch, heading = _random_poses(200)
+    polygons = CameraCalculator.getBoundingPolygons(FOVh, FOVv, altitude, roll, pitch, heading)
+    assert polygons.shape == (200, 4, 3)
+    for i in range(200):
+        expected = _reference_polygon(FOVh, FOVv, altitude[i], roll[i], pitch[i], heading[i])
+        np.testing.assert_allclose(polygons[i], expected, rtol=1e-9, atol=1e-6)
+
+def test_bounding_polygons_limited_range_match_single_pose():
+    FOVh, FOVv = math.radians(73.7), math.radians(53.1)
+    altitude, roll, pitch, heading = _random_poses(200, seed=1)
+    polygons = CameraCalculator.getBoundingPolygons(FOVh, FOVv, altitude, roll, pitch, heading, 300.0)
+    for i in range(200):
+        expected = _reference_polygon(FOVh, FOVv, altitude[i], roll[i], pitch[i], heading[i], 300.0)
+        np.testing.assert_allclose(polygons[i], expected, rtol=1e-9, atol=1e-6)
+
+def test_bounding_polygons_per_pose_fov():
+    # distinct FOV couples share the rays of their CameraModel
+    FOVh = np.radians([73.7, 60.0, 73.7, 84.0])
+    FOVv = np.radians([53.1, 45.0, 53.1, 62.0])
+    altitude, roll, pitch, heading = _random_poses(4, seed=2)
+    polygons = CameraCalculator.getBoundingPolygons(FOVh, FOVv, altitude, roll, pitch, heading)
+    for i in range(4):
+        expected = _reference_polygon(FOVh[i], FOVv[i], altitude[i], roll[i], pitch[i], heading[i])
+        np.testing.assert_allclose(polygons[i], expected, rtol=1e-9, atol=1e-6)
+
+def test_points_inside_pyramids():
+    FOVh, FOVv = math.radians(73.7), math.radians(53.1)
+    altitude, roll, pitch, heading = _random_poses(100, seed=3)
+    rays = CameraCalculator.rotateRaysBatch(
+        np.broadcast_to(CameraCalculator.raysBatch(np.array([FOVh]), np.array([FOVv])), (100, 4, 3)),
+        CameraCalculator.rotationMatricesBatch(roll, pitch, heading))
+    rng = np.random.default_rng(4)
+    cameras = np.column_stack((rng.uniform(-100, 100, 100), rng.uniform(-100, 100, 100), altitude))
+
+    # positive combinations of the edge rays are inside the pyramid
+    weights = rng.uniform(0.1, 50, (100, 4))
+    inside = cameras + np.einsum('ki,kij->kj', weights, rays)
+    assert CameraCalculator.pointsInsidePyramidsBatch(rays, cameras, inside).all()
+    # the same points mirrored behind the apex are outside
+    behind = cameras - np.einsum('ki,kij->kj', weights, rays)
+    assert not CameraCalculator.pointsInsidePyramidsBatch(rays, cameras, behind).any()
+    # points beyond a corner, away from the opposite one, are outside
+    beyond = cameras + 10*rays[:, 0] + 2*(rays[:, 0] - rays[:, 2])
+    assert not CameraCalculator.pointsInsidePyramidsBatch(rays, cameras, beyond).any()
+
+    # the scalar port agrees on every pair
+    for k in range(100):
+        cameraRays = [Vector.fromArray(ray) for ray in rays[k]]
+        assert CameraCalculator.pointIsInsidePyramid(cameraRays, Vector.fromArray(cameras[k]), Vector.fromArray(inside[k]))
+        assert not CameraCalculator.pointIsInsidePyramid(cameraRays, Vector.fromArray(cameras[k]), Vector.fromArray(beyond[k]))
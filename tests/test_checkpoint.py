@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_checkpoint.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import csv
+import json
+
+import pytest
+
+import checkpoint
+from checkpoint import (CHECKPOINT_VERSION,
+                        CheckpointError,
+                        QuarantineReport,
+                        check_checkpoint,
+                        checkpoint_path,
+                        quarantine_path,
+                        read_checkpoint,
+                        remove_checkpoint,
+                        write_checkpoint)
+
+
+def _state(**kwargs):
+    state = {'next_index': 500, 'inputs': 1000, 'footprints': 'footprints.gpkg', 'nadirs': 'nadirs.gpkg'}
+    state.update(kwargs)
+    return state
+
+def _rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_paths():
+    assert checkpoint_path('out/footprints.gpkg') == 'out/footprints.gpkg.checkpoint.json'
+    assert quarantine_path('out/footprints.gpkg') == 'out/footprints_quarantine.csv'
+
+def test_checkpoint_round_trip(tmpdir):
+    path = str(tmpdir.join('footprints.gpkg.checkpoint.json'))
+    assert read_checkpoint(path) is None
+
+    write_checkpoint(path, _state())
+    state = read_checkpoint(path)
+    assert state['version'] == CHECKPOINT_VERSION
+    assert 'updated' in state
+    assert {key: state[key] for key in _state()} == _state()
+    # the temporary file is renamed over the checkpoint
+    assert os.listdir(str(tmpdir)) == ['footprints.gpkg.checkpoint.json']
+
+    write_checkpoint(path, _state(next_index=600))
+    assert read_checkpoint(path)['next_index'] == 600
+
+    remove_checkpoint(path)
+    assert not os.path.exists(path)
+    remove_checkpoint(path)
+
+def test_failed_write_keeps_previous_checkpoint(tmpdir, monkeypatch):
+    path = str(tmpdir.join('footprints.gpkg.checkpoint.json'))
+    write_checkpoint(path, _state())
+
+    def crash(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(checkpoint.os, 'fsync', crash)
+    with pytest.raises(OSError):
+        write_checkpoint(path, _state(next_index=600))
+    assert read_checkpoint(path)['next_index'] == 500
+
+def test_read_invalid_checkpoint(tmpdir):
+    path = str(tmpdir.join('checkpoint.json'))
+    with open(path, 'w') as f:
+        f.write('{"next_index": 5')
+    assert read_checkpoint(path) is None
+
+    with open(path, 'w') as f:
+        json.dump(dict(_state(), version=CHECKPOINT_VERSION + 1), f)
+    assert read_checkpoint(path) is None
+
+    with open(path, 'w') as f:
+        json.dump([1, 2], f)
+    assert read_checkpoint(path) is None
+
+def test_check_checkpoint():
+    state = _state()
+    check_checkpoint(state)
+    check_checkpoint(state, footprints='footprints.gpkg', nadirs='nadirs.gpkg', inputs=1000)
+
+    with pytest.raises(CheckpointError, match='1000 input images, now they are 1001'):
+        check_checkpoint(state, inputs=1001)
+    with pytest.raises(CheckpointError, match='other outputs'):
+        check_checkpoint(state, footprints='other.gpkg')
+    with pytest.raises(CheckpointError, match='other outputs'):
+        check_checkpoint(state, footprints='footprints.gpkg', nadirs='other.gpkg')
+
+def test_quarantine_created_with_first_row(tmpdir):
+    path = str(tmpdir.join('quarantine.csv'))
+    with QuarantineReport(path) as quarantine:
+        assert not os.path.exists(path)
+        quarantine.add(3, 'a.jpg', 'MetadataError: no GPS\n  tag')
+        # rows are flushed when added
+        assert _rows(path) == [list(QuarantineReport.HEADER), ['3', 'a.jpg', 'MetadataError: no GPS tag']]
+        quarantine.add(7, 'b.jpg', ValueError('bad'))
+    assert quarantine.count == 2
+    assert _rows(path)[1:] == [['3', 'a.jpg', 'MetadataError: no GPS tag'], ['7', 'b.jpg', 'bad']]
+
+def test_quarantine_without_errors_leaves_no_report(tmpdir):
+    path = str(tmpdir.join('quarantine.csv'))
+    with QuarantineReport(path) as quarantine:
+        pass
+    assert quarantine.count == 0
+    assert not os.path.exists(path)
+
+def test_quarantine_overwrite_and_append(tmpdir):
+    path = str(tmpdir.join('quarantine.csv'))
+    with QuarantineReport(path) as quarantine:
+        quarantine.add(1, 'a.jpg', 'error')
+
+    # a new run removes the old report also without errors
+    with QuarantineReport(path):
+        pass
+    assert not os.path.exists(path)
+
+    with QuarantineReport(path) as quarantine:
+        quarantine.add(1, 'a.jpg', 'error')
+    # resuming appends rows without repeating the header
+    with QuarantineReport(path, append=True) as quarantine:
+        quarantine.add(5, 'e.jpg', 'error')
+    assert quarantine.count == 1
+    assert _rows(path) == [list(QuarantineReport.HEADER), ['1', 'a.jpg', 'error'], ['5', 'e.jpg', 'error']]
+
+    # appending to a missing or empty report writes the header
+    open(path, 'w').close()
+    with QuarantineReport(path, append=True) as quarantine:
+        quarantine.add(6, 'f.jpg', 'error')
+    assert _rows(path) == [list(QuarantineReport.HEADER), ['6', 'f.jpg', 'error']]
+
+def test_quarantine_only_counts():
+    with QuarantineReport(None) as quarantine:
+        quarantine.add(1, 'a.jpg', 'error')
+        quarantine.add(2, 'b.jpg', 'error')
+    assert quarantine.count == 2
+    assert quarantine.path is None
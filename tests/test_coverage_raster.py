@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_coverage_raster.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import numpy as np
+import pytest
+
+from coverage_raster import NODATA, ScanlineRasterizer, coverage_raster, grid_definition
+
+
+def _star(cx, cy, radius, points=7):
+    """concave star shaped ring"""
+    angles = np.linspace(0, 2*np.pi, 2*points, endpoint=False)
+    radii = np.where(np.arange(2*points) % 2, 0.4*radius, radius)
+    ring = np.column_stack((cx + radii*np.cos(angles), cy + radii*np.sin(angles)))
+    return np.concatenate((ring, ring[:1]))
+
+def _rings(seed=0):
+    rng = np.random.default_rng(seed)
+    rings = [_star(x, y, r) for x, y, r in zip(rng.uniform(0, 100, 40), rng.uniform(0, 80, 40), rng.uniform(3, 25, 40))]
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ring) for ring in rings])
+    return np.concatenate(rings), offsets
+
+def _brute_force_counts(coordinates, offsets, polygons, xmin, ymax, resolution, width, height):
+    """even-odd test of every cell centre against every ring"""
+    columns, rows = np.meshgrid(np.arange(width), np.arange(height))
+    x = xmin + (columns + 0.5)*resolution
+    y = ymax - (rows + 0.5)*resolution
+    inside = {}
+    for ring, polygon in enumerate(polygons):
+        points = coordinates[offsets[ring]:offsets[ring + 1]]
+        crossings = np.zeros(x.shape, dtype=bool)
+        for (x1, y1), (x2, y2) in zip(points[:-1], points[1:]):
+            if y1 == y2:
+                continue
+            between = (np.minimum(y1, y2) <= y) & (y < np.maximum(y1, y2))
+            crossings ^= between & (x1 + (y - y1)*(x2 - x1)/(y2 - y1) < x)
+        inside[polygon] = inside.get(polygon, np.zeros(x.shape, dtype=bool)) ^ crossings
+    return sum(value.astype(np.int64) for value in inside.values())
+
+@pytest.mark.parametrize('resolution', [1.0, 0.7])
+def test_scanline_counts_match_brute_force(resolution):
+    coordinates, offsets = _rings()
+    xmin, ymax, width, height = grid_definition(coordinates, resolution)
+    rasterizer = ScanlineRasterizer(coordinates, offsets, xmin, ymax, resolution, width, height)
+    expected = _brute_force_counts(coordinates, offsets, range(len(offsets) - 1), xmin, ymax, resolution, width, height)
+    assert expected.max() > 3
+
+    counts = rasterizer.rasterize(0, height)
+    assert counts.dtype == np.uint32
+    np.testing.assert_array_equal(counts, expected)
+    # chunks give the same rows
+    np.testing.assert_array_equal(np.concatenate([chunk for _, chunk in rasterizer.chunks(7)]), expected)
+
+def test_scanline_polygons_with_holes_and_parts():
+    outer = np.array([[0, 0], [20, 0], [20, 20], [0, 20], [0, 0]], dtype=np.float64)
+    hole = np.array([[5, 5], [15, 5], [15, 15], [5, 15], [5, 5]], dtype=np.float64)
+    part = np.array([[25, 0], [30, 0], [30, 5], [25, 5], [25, 0]], dtype=np.float64)
+    coordinates = np.concatenate((outer, hole, part))
+    offsets = np.array([0, 5, 10, 15])
+    polygons = np.array([0, 0, 1])
+    xmin, ymax, width, height = grid_definition(coordinates, 1.0)
+    rasterizer = ScanlineRasterizer(coordinates, offsets, xmin, ymax, 1.0, width, height, polygons)
+    counts = rasterizer.rasterize(0, height)
+    assert counts.sum() == 400 - 100 + 25
+    np.testing.assert_array_equal(
+        counts, _brute_force_counts(coordinates, offsets, polygons, xmin, ymax, 1.0, width, height))
+
+def test_coverage_raster_with_aoi(tmp_path):
+    gdal = pytest.importorskip('osgeo.gdal')
+    coordinates, offsets = _rings(1)
+    # AOI with a hole and a second part
+    aoiCoordinates = np.array([[10, 10], [90, 10], [90, 70], [10, 70], [10, 10],
+                               [40, 30], [60, 30], [60, 50], [40, 50], [40, 30],
+                               [95, 0], [105, 0], [105, 10], [95, 10], [95, 0]], dtype=np.float64)
+    aoi = (aoiCoordinates, np.array([0, 5, 10, 15]), np.array([0, 0, 1]))
+    path = str(tmp_path / 'coverage.tif')
+
+    statistics = coverage_raster(path, coordinates, offsets, 1.0, aoi=aoi, chunkRows=16)
+    assert statistics['cells'] == 80*60 - 20*20 + 10*10
+
+    dataset = gdal.Open(path)
+    band = dataset.GetRasterBand(1)
+    assert band.GetNoDataValue() == NODATA
+    counts = band.ReadAsArray()
+    xmin, ymax, width, height = grid_definition(aoiCoordinates, 1.0)
+    assert dataset.GetGeoTransform() == (xmin, 1.0, 0.0, ymax, 0.0, -1.0)
+    inside = _brute_force_counts(*aoi, xmin, ymax, 1.0, width, height) > 0
+    expected = _brute_force_counts(coordinates, offsets, range(len(offsets) - 1), xmin, ymax, 1.0, width, height)
+    np.testing.assert_array_equal(counts[inside], expected[inside])
+    assert (counts[~inside] == NODATA).all()
+
+    assert statistics['histogram'] == np.bincount(expected[inside]).tolist()
+    assert statistics['uncovered_cells'] == (expected[inside] == 0).sum()
+    assert statistics['max_overlap'] == expected[inside].max()
+    assert statistics['gaps'] is None
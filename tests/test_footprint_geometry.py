@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_footprint_geometry.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import math
+import struct
+
+import numpy as np
+
+from camera_calculator import CameraCalculator, Vector
+from footprint_geometry import (dji_camera_angles,
+                                frustum_footprints,
+                                frustum_plane_footprints,
+                                plane_coordinates,
+                                point_wkb,
+                                polygon_wkb,
+                                wedge_ring)
+
+
+def test_wedge_ring_shape():
+    ring = wedge_ring(1000.0, 2000.0, 30.0, 60.0, 120.0, 20.0, segments=12)
+    assert ring.shape == (2*13 + 1, 2)
+    np.testing.assert_array_equal(ring[0], ring[-1])
+
+    offsets = ring[:-1] - (1000.0, 2000.0)
+    radii = np.hypot(offsets[:, 0], offsets[:, 1])
+    np.testing.assert_allclose(radii[:13], 120.0)
+    np.testing.assert_allclose(radii[13:], 20.0)
+    # azimuth clockwise from north, arcs within azimuth -+ width/2
+    azimuths = np.degrees(np.arctan2(offsets[:, 0], offsets[:, 1]))
+    np.testing.assert_allclose(azimuths[:13], np.linspace(0.0, 60.0, 13), atol=1e-9)
+    np.testing.assert_allclose(azimuths[13:], np.linspace(60.0, 0.0, 13), atol=1e-9)
+
+def test_wedge_ring_without_inner_arc_reaches_center():
+    ring = wedge_ring(0.0, 0.0, 90.0, 40.0, 50.0, 0.0, segments=8)
+    assert ring.shape == (8 + 1 + 1 + 1, 2)
+    np.testing.assert_array_equal(ring[-2], (0.0, 0.0))
+    # pointing east
+    assert (ring[:9, 0] > 0).all()
+    np.testing.assert_allclose(ring[4], (50.0, 0.0), atol=1e-9)
+
+def test_point_wkb():
+    assert struct.unpack('<BIdd', point_wkb(1.5, -2.5)) == (1, 1, 1.5, -2.5)
+
+def test_polygon_wkb():
+    ring = np.array([[0, 0], [10, 0], [10, 5], [0, 5], [0, 0]])
+    wkb = polygon_wkb(ring)
+    byteOrder, geometryType, rings, points = struct.unpack_from('<BIII', wkb)
+    assert (byteOrder, geometryType, rings, points) == (1, 3, 1, 5)
+    coordinates = np.frombuffer(wkb, dtype='<f8', offset=13).reshape(-1, 2)
+    np.testing.assert_array_equal(coordinates, ring)
+    assert len(wkb) == 13 + 5*16
+
+def _random_dji_poses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'x': rng.uniform(500000, 501000, count),
+        'y': rng.uniform(4700000, 4701000, count),
+        'relativeAltitude': rng.uniform(30, 120, count),
+        'gimbalRoll': rng.uniform(-2, 2, count),
+        'gimbalPitch': rng.uniform(-90, -5, count),
+        'gimbalYaw': rng.uniform(-180, 180, count),
+    }
+
+def test_frustum_footprints_match_bounding_polygon():
+    poses = _random_dji_poses(200)
+    rings, valid = frustum_footprints(horizontalFOV=73.7, verticalFOV=53.1, **poses)
+    assert rings.shape == (200, 5, 2)
+    np.testing.assert_array_equal(rings[:, 0], rings[:, 4])
+
+    FOVh, FOVv = math.radians(73.7), math.radians(53.1)
+    roll, pitch, heading = dji_camera_angles(poses['gimbalRoll'], poses['gimbalPitch'], poses['gimbalYaw'])
+    for i in range(200):
+        corners = CameraCalculator.getBoundingPolygon(FOVh, FOVv, poses['relativeAltitude'][i], roll[i], pitch[i], heading[i])
+        rays = CameraCalculator.rotateRays(CameraCalculator.ray1(FOVh, FOVv), CameraCalculator.ray2(FOVh, FOVv),
+                                           CameraCalculator.ray3(FOVh, FOVv), CameraCalculator.ray4(FOVh, FOVv),
+                                           roll[i], pitch[i], heading[i])
+        # images viewing the horizon have a ray not going down
+        assert valid[i] == all(ray.z < 0 for ray in rays)
+        if valid[i]:
+            expected = np.array([[corner.x, corner.y] for corner in corners]) + (poses['x'][i], poses['y'][i])
+            np.testing.assert_allclose(rings[i, :4], expected, rtol=1e-12)
+    assert valid.any() and not valid.all()
+
+def test_frustum_footprints_nadir():
+    rings, valid = frustum_footprints([0.0], [0.0], [100.0], [0.0], [-90.0], [0.0], 90.0, 90.0)
+    assert valid.all()
+    # 90 degrees FOV looking down from 100 m: square of 200 m side centered in nadir
+    np.testing.assert_allclose(np.abs(rings[0, :4]), 100.0)
+    np.testing.assert_allclose(rings[0, :4].mean(axis=0), (0.0, 0.0), atol=1e-9)
+
+def test_frustum_footprints_limited_range_match_limit_range():
+    poses = _random_dji_poses(200, seed=1)
+    rings, valid = frustum_footprints(horizontalFOV=73.7, verticalFOV=53.1, maxDistance=250.0, **poses)
+    assert valid.all()
+    distances = np.hypot(rings[:, :4, 0] - poses['x'][:, np.newaxis], rings[:, :4, 1] - poses['y'][:, np.newaxis])
+    assert (distances <= 250.0 + 1e-9).all()
+
+    FOVh, FOVv = math.radians(73.7), math.radians(53.1)
+    roll, pitch, heading = dji_camera_angles(poses['gimbalRoll'], poses['gimbalPitch'], poses['gimbalYaw'])
+    for i in range(200):
+        # limitRange of the java code applied one ray at time
+        rays = CameraCalculator.rotateRays(CameraCalculator.ray1(FOVh, FOVv), CameraCalculator.ray2(FOVh, FOVv),
+                                           CameraCalculator.ray3(FOVh, FOVv), CameraCalculator.ray4(FOVh, FOVv),
+                                           roll[i], pitch[i], heading[i])
+        origin = Vector(0, 0, poses['relativeAltitude'][i])
+        intersections = [CameraCalculator.findRayGroundIntersection(ray, origin) for ray in rays]
+        CameraCalculator.limitRange(intersections, rays, origin.z, origin, 250.0)
+        expected = np.array([[point.x, point.y] for point in intersections]) + (poses['x'][i], poses['y'][i])
+        np.testing.assert_allclose(rings[i, :4], expected, rtol=1e-12)
+
+def test_plane_footprints_on_ground_match_frustum_footprints():
+    poses = _random_dji_poses(200, seed=2)
+    angles = (poses['gimbalRoll'], poses['gimbalPitch'], poses['gimbalYaw'], 73.7, 53.1)
+    for maxDistance in (None, 250.0):
+        expected, expectedValid = frustum_footprints(poses['x'], poses['y'], poses['relativeAltitude'],
+                                                     *angles, maxDistance=maxDistance)
+        rings, valid = frustum_plane_footprints(poses['x'], poses['y'], poses['relativeAltitude'], *angles,
+                                                (0.0, 0.0, 1.0), (0.0, 0.0, 0.0), maxDistance=maxDistance)
+        np.testing.assert_array_equal(valid, expectedValid)
+        np.testing.assert_allclose(rings[valid, :, :2], expected[valid], rtol=1e-12)
+        np.testing.assert_allclose(rings[valid, :, 2], 0.0, atol=1e-9)
+
+def test_limit_range_plane_on_ground_match_limit_range():
+    poses = _random_dji_poses(200, seed=3)
+    roll, pitch, heading = dji_camera_angles(poses['gimbalRoll'], poses['gimbalPitch'], poses['gimbalYaw'])
+    rays = CameraCalculator.rotateRaysBatch(
+        np.broadcast_to(CameraCalculator.raysBatch(np.array([1.2]), np.array([0.9])), (200, 4, 3)),
+        CameraCalculator.rotationMatricesBatch(roll, pitch, heading))
+    origins = np.zeros((200, 3))
+    origins[:, 2] = poses['relativeAltitude']
+    intersections = CameraCalculator.getRayGroundIntersectionsBatch(rays, origins)
+
+    expected = intersections.copy()
+    expectedLimited = CameraCalculator.limitRangeBatch(expected, rays, origins, 250.0)
+    limited = CameraCalculator.limitRangePlaneBatch(intersections, rays, origins, (0.0, 0.0, 1.0), (0.0, 0.0, 0.0), 250.0)
+    assert expectedLimited.any()
+    np.testing.assert_array_equal(limited, expectedLimited)
+    np.testing.assert_allclose(intersections[..., :2], expected[..., :2], rtol=1e-12)
+
+def test_plane_footprints_on_facade():
+    # camera 50 m south of a facade facing south, looking north at the horizon
+    normal = (0.0, -1.0, 0.0)
+    rings, valid = frustum_plane_footprints([0.0], [-50.0], [20.0], [0.0], [0.0], [0.0], 60.0, 40.0,
+                                            normal, (0.0, 0.0, 0.0))
+    assert valid.all()
+    np.testing.assert_allclose(rings[0, :, 1], 0.0, atol=1e-9)
+    coordinates = plane_coordinates(rings[0, :4], normal, (0.0, 0.0, 0.0))
+    # patch centered in front of the camera, 2*50*tan(FOV/2) wide and tall
+    np.testing.assert_allclose(np.ptp(coordinates[:, 0]), 100*math.tan(math.radians(30)))
+    np.testing.assert_allclose(np.ptp(coordinates[:, 1]), 100*math.tan(math.radians(20)))
+    np.testing.assert_allclose(coordinates.mean(axis=0), (0.0, 20.0), atol=1e-9)
+
+    # the same camera looking south sees the back of the facade
+    _, valid = frustum_plane_footprints([0.0], [-50.0], [20.0], [0.0], [0.0], [180.0], 60.0, 40.0,
+                                        normal, (0.0, 0.0, 0.0))
+    assert not valid.any()
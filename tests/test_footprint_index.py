@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_footprint_index.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import numpy as np
+import pytest
+
+from footprint_index import FootprintIndex, ring_areas, ring_bboxes
+
+
+def _random_footprints(count, seed=0):
+    """rotated rectangles (convex, counterclockwise) as rings of read_footprints"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 2000, (count, 2))
+    halfSizes = rng.uniform(5, 40, (count, 2))
+    angles = rng.uniform(0, np.pi, count)
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]], dtype=np.float64)
+    local = corners[np.newaxis]*halfSizes[:, np.newaxis]
+    cos = np.cos(angles)[:, np.newaxis]
+    sin = np.sin(angles)[:, np.newaxis]
+    rings = np.stack((local[..., 0]*cos - local[..., 1]*sin, local[..., 0]*sin + local[..., 1]*cos), axis=-1)
+    rings += centers[:, np.newaxis]
+    offsets = np.arange(count + 1)*5
+    attributes = {'path': np.array(['IMG_{:05d}.JPG'.format(i) for i in range(count)]),
+                  'gimbal_yaw': np.degrees(angles)}
+    return rings.reshape(-1, 2), offsets, attributes, rings
+
+def _separated(ring1, ring2):
+    """separating axis test of two convex rings"""
+    for ring in (ring1, ring2):
+        edges = np.diff(ring, axis=0)
+        normals = np.column_stack((-edges[:, 1], edges[:, 0]))
+        projections1 = ring1[:-1].dot(normals.T)
+        projections2 = ring2[:-1].dot(normals.T)
+        if ((projections1.max(axis=0) < projections2.min(axis=0)) |
+                (projections2.max(axis=0) < projections1.min(axis=0))).any():
+            return True
+    return False
+
+@pytest.fixture(scope='module')
+def footprints():
+    return _random_footprints(3000)
+
+def test_ring_bboxes_and_areas(footprints):
+    coordinates, offsets, _, rings = footprints
+    bboxes = ring_bboxes(coordinates, offsets)
+    np.testing.assert_allclose(bboxes[:, :2], rings.min(axis=1))
+    np.testing.assert_allclose(bboxes[:, 2:], rings.max(axis=1))
+    sides = np.linalg.norm(rings[:, 1] - rings[:, 0], axis=-1)*np.linalg.norm(rings[:, 2] - rings[:, 1], axis=-1)
+    np.testing.assert_allclose(ring_areas(coordinates, offsets), sides)
+
+def test_query_bbox_match_brute_force(footprints):
+    coordinates, offsets, attributes, rings = footprints
+    index = FootprintIndex(coordinates, offsets, attributes)
+    assert len(index) == 3000
+    bboxes = ring_bboxes(coordinates, offsets)
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        xmin, ymin = rng.uniform(-100, 2000, 2)
+        xmax, ymax = xmin + rng.uniform(0, 300), ymin + rng.uniform(0, 300)
+        expected = np.flatnonzero((bboxes[:, 0] <= xmax) & (bboxes[:, 2] >= xmin) &
+                                  (bboxes[:, 1] <= ymax) & (bboxes[:, 3] >= ymin))
+        np.testing.assert_array_equal(index.queryBbox(xmin, ymin, xmax, ymax), expected)
+
+def test_query_point_match_brute_force(footprints):
+    coordinates, offsets, attributes, rings = footprints
+    index = FootprintIndex(coordinates, offsets, attributes)
+    rng = np.random.default_rng(2)
+    edges = np.diff(rings, axis=1)
+    for x, y in rng.uniform(0, 2000, (300, 2)):
+        relative = np.array((x, y)) - rings[:, :-1]
+        # inside a counterclockwise convex ring: on the left of every edge
+        cross = edges[..., 0]*relative[..., 1] - edges[..., 1]*relative[..., 0]
+        expected = np.flatnonzero((cross > 0).all(axis=1))
+        np.testing.assert_array_equal(index.queryPoint(x, y), expected)
+
+def test_query_polygon_match_brute_force(footprints):
+    coordinates, offsets, attributes, rings = footprints
+    index = FootprintIndex(coordinates, offsets, attributes)
+    _, _, _, queries = _random_footprints(50, seed=3)
+    found = 0
+    for query in queries:
+        expected = [i for i in range(len(rings)) if not _separated(rings[i], query)]
+        np.testing.assert_array_equal(index.queryPolygon(query), expected)
+        found += len(expected)
+    assert found
+
+def test_save_load(footprints, tmp_path):
+    coordinates, offsets, attributes, _ = footprints
+    index = FootprintIndex(coordinates, offsets, attributes)
+    path = str(tmp_path / 'footprints_index.npz')
+    index.save(path)
+    loaded = FootprintIndex.load(path)
+    np.testing.assert_array_equal(loaded.queryBbox(500, 500, 800, 900), index.queryBbox(500, 500, 800, 900))
+    ids = index.queryPoint(1000, 1000)
+    assert loaded.paths(ids) == index.paths(ids)
+    assert loaded.records(ids) == index.records(ids)
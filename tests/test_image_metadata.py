@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_image_metadata.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import random
+import struct
+
+import pytest
+
+from image_metadata import MetadataError, parse_drone_xmp, read_image_record, read_jpeg_metadata
+from synthetic_images import exif_segment, synthetic_jpeg, synthetic_pose, xmp_segment
+
+
+@pytest.mark.parametrize('index', [0, 1, 57, 150, 333])
+def test_read_image_record_of_synthetic_image(tmp_path, index):
+    pose = synthetic_pose(index, seed=3)
+    path = tmp_path / 'DJI_{:04d}.JPG'.format(index)
+    path.write_bytes(synthetic_jpeg(pose))
+
+    timings = {}
+    record = read_image_record(str(path), timings)
+    assert set(timings) == {'file open', 'metadata domain enumeration', 'XMP parse'}
+    # GPS seconds are stored as rationals with 1/10000 precision
+    assert record['latitude'] == pytest.approx(pose['latitude'], abs=1e-7)
+    assert record['longitude'] == pytest.approx(pose['longitude'], abs=1e-7)
+    assert record['date_time'] == pose['date_time']
+    assert (record['image_width'], record['image_height']) == (5472, 3648)
+    assert (record['make'], record['model']) == ('DJI', 'FC6310')
+    # XMP values are written with 2 decimals
+    for key in ('relative_altitude', 'absolute_altitude', 'gimbal_roll', 'gimbal_pitch', 'gimbal_yaw',
+                'flight_roll', 'flight_pitch', 'flight_yaw'):
+        assert record[key] == pytest.approx(pose[key], abs=0.005), key
+
+def test_read_jpeg_metadata_gdal_formatting(tmp_path):
+    pose = synthetic_pose(0)
+    path = tmp_path / 'image.jpg'
+    path.write_bytes(synthetic_jpeg(pose))
+
+    exifTags, xmpPacket = read_jpeg_metadata(str(path))
+    assert exifTags['EXIF_GPSLatitudeRef'] == 'N'
+    assert exifTags['EXIF_GPSLongitudeRef'] == 'W'
+    assert exifTags['EXIF_GPSLatitude'].startswith('(43) (0) (')
+    assert exifTags['EXIF_Make'] == 'DJI'
+    droneMetadata = parse_drone_xmp(xmpPacket)
+    assert float(droneMetadata['GimbalPitchDegree']) == pytest.approx(pose['gimbal_pitch'], abs=0.005)
+
+def test_malformed_metadata_raise_metadata_error(tmp_path):
+    data = synthetic_jpeg(synthetic_pose(0))
+    path = tmp_path / 'image.jpg'
+    rng = random.Random(0)
+    failures = 0
+    for _ in range(300):
+        broken = bytearray(data)
+        if rng.random() < 0.5:
+            del broken[rng.randrange(4, len(broken)):]
+        else:
+            for _ in range(rng.randint(1, 8)):
+                broken[rng.randrange(2, 1200)] = rng.randrange(256)
+        path.write_bytes(bytes(broken))
+        # either the metadata are still readable or the image is reported as bad
+        try:
+            read_image_record(str(path))
+        except MetadataError:
+            failures += 1
+    assert failures
+
+def _jpeg(exif, xmp):
+    """JPEG with the given APP1 segments before the image data of a synthetic image"""
+    pose = synthetic_pose(0)
+    image = synthetic_jpeg(pose)
+    imageData = image[2 + len(exif_segment(pose)) + len(xmp_segment(pose)):]
+    return image[:2] + exif + xmp + imageData
+
+def _app1(payload):
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+# offset of the TIFF header in the EXIF segment: marker, length and 'Exif\0\0'
+TIFF_START = 10
+
+def _read_broken(tmp_path, data):
+    path = tmp_path / 'broken.jpg'
+    path.write_bytes(data)
+    return read_image_record(str(path))
+
+def test_truncated_inside_app1(tmp_path):
+    pose = synthetic_pose(0)
+    data = _jpeg(exif_segment(pose), xmp_segment(pose))
+    with pytest.raises(MetadataError, match='Truncated'):
+        _read_broken(tmp_path, data[:2 + len(exif_segment(pose))//2])
+
+def test_bad_tiff_byte_order(tmp_path):
+    pose = synthetic_pose(0)
+    exif = bytearray(exif_segment(pose))
+    exif[TIFF_START:TIFF_START + 2] = b'XX'
+    with pytest.raises(MetadataError, match='byte order'):
+        _read_broken(tmp_path, _jpeg(bytes(exif), xmp_segment(pose)))
+
+def test_ifd_offset_past_the_end(tmp_path):
+    pose = synthetic_pose(0)
+    exif = bytearray(exif_segment(pose))
+    exif[TIFF_START + 4:TIFF_START + 8] = struct.pack('<I', 100000)
+    with pytest.raises(MetadataError):
+        _read_broken(tmp_path, _jpeg(bytes(exif), xmp_segment(pose)))
+
+def test_broken_xmp(tmp_path):
+    pose = synthetic_pose(0)
+    xmp = _app1(b'http://ns.adobe.com/xap/1.0/\x00<x:xmpmeta><rdf:RDF><rdf:Description '
+                b'drone-dji:RelativeAltitude="+80.00"</x:xmpmeta>')
+    with pytest.raises(MetadataError, match='XMP'):
+        _read_broken(tmp_path, _jpeg(exif_segment(pose), xmp))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_image_sources.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+
+from image_sources import count_image_paths, iter_image_paths, iter_manifest_paths
+
+
+def _touch(folder, *names):
+    for name in names:
+        path = os.path.join(folder, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+
+def _tree(tmpdir):
+    folder = str(tmpdir)
+    _touch(folder, 'b.JPG', 'a.jpg', 'c.jpeg', 'notes.txt', 'd.tif',
+           os.path.join('flight2', 'e.jpg'), os.path.join('flight2', 'deep', 'f.JPEG'),
+           os.path.join('flight1', 'g.jpg'))
+    return folder
+
+def _relative(folder, paths):
+    return [os.path.relpath(path, folder).replace(os.sep, '/') for path in paths]
+
+
+def test_folder_default_patterns_case_insensitive(tmpdir):
+    folder = _tree(tmpdir)
+    paths = list(iter_image_paths(folder))
+    assert _relative(folder, paths) == ['a.jpg', 'b.JPG', 'c.jpeg']
+    assert count_image_paths(folder) == 3
+
+def test_folder_glob_patterns(tmpdir):
+    folder = _tree(tmpdir)
+    assert _relative(folder, iter_image_paths(folder, '*.tif')) == ['d.tif']
+    assert _relative(folder, iter_image_paths(folder, 'a*; *.TIF')) == ['a.jpg', 'd.tif']
+    assert _relative(folder, iter_image_paths(folder, ['*.txt'])) == ['notes.txt']
+    assert count_image_paths(folder, 'a*; *.TIF') == 2
+
+def test_folder_recursive(tmpdir):
+    folder = _tree(tmpdir)
+    paths = list(iter_image_paths(folder, recursive=True))
+    # files of a folder first, then subfolders sorted by name
+    assert _relative(folder, paths) == ['a.jpg', 'b.JPG', 'c.jpeg', 'flight1/g.jpg',
+                                        'flight2/e.jpg', 'flight2/deep/f.JPEG']
+    assert count_image_paths(folder, recursive=True) == len(paths)
+
+def test_folder_is_lazy(tmpdir):
+    folder = _tree(tmpdir)
+    paths = iter_image_paths(folder, recursive=True)
+    assert _relative(folder, [next(paths)]) == ['a.jpg']
+
+def test_manifest_paths(tmpdir):
+    folder = _tree(tmpdir)
+    absolute = os.path.join(folder, 'flight1', 'g.jpg')
+    manifest = os.path.join(folder, 'flight2', 'list.txt')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.write('# images of the flight\n'
+                'e.jpg\n'
+                '\n'
+                '  deep/f.JPEG  \n'
+                '../a.jpg\n'
+                '{}\n'.format(absolute))
+
+    paths = list(iter_manifest_paths(manifest))
+    assert [os.path.normpath(path) for path in paths] == [
+        os.path.join(folder, 'flight2', 'e.jpg'),
+        os.path.join(folder, 'flight2', 'deep', 'f.JPEG'),
+        os.path.join(folder, 'a.jpg'),
+        absolute]
+    assert all(os.path.exists(path) for path in paths)
+    assert count_image_paths(manifest=manifest) == 4
+
+def test_count_folder_and_manifest(tmpdir):
+    folder = _tree(tmpdir)
+    manifest = os.path.join(folder, 'list.txt')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.write('a.jpg\nflight1/g.jpg\n')
+    assert count_image_paths(folder, recursive=True, manifest=manifest) == 8
+    assert count_image_paths() == 0
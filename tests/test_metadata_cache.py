@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_metadata_cache.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+
+import pytest
+
+import metadata_cache
+from metadata_cache import MetadataCache
+
+
+class CountingReader:
+    """image reader counting the reads, the record is the file content"""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __call__(self, path):
+        self.reads += 1
+        with open(path) as f:
+            return {'content': f.read()}
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for index in range(10):
+        path = tmp_path / 'image_{}.jpg'.format(index)
+        path.write_text('image {}'.format(index))
+        paths.append(str(path))
+    return paths
+
+@pytest.fixture
+def cachePath(tmp_path):
+    return str(tmp_path / 'cache' / 'metadata_cache.sqlite')
+
+def test_hit_and_persistence(images, cachePath):
+    reader = CountingReader()
+    with MetadataCache(cachePath) as cache:
+        assert cache.read(images[0], reader) == {'content': 'image 0'}
+        assert cache.read(images[0], reader) == {'content': 'image 0'}
+        assert (cache.hits, cache.misses, reader.reads) == (1, 1, 1)
+    with MetadataCache(cachePath) as cache:
+        assert cache.get(images[0]) == {'content': 'image 0'}
+        assert len(cache) == 1
+
+def test_miss_after_size_or_mtime_change(images, cachePath):
+    reader = CountingReader()
+    with MetadataCache(cachePath) as cache:
+        cache.read(images[0], reader)
+        cache.read(images[1], reader)
+
+        with open(images[0], 'w') as f:
+            f.write('image 0 edited')
+        assert cache.get(images[0]) is None
+        assert cache.read(images[0], reader) == {'content': 'image 0 edited'}
+
+        # same size, different modification time
+        stat = os.stat(images[1])
+        os.utime(images[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        assert cache.get(images[1]) is None
+        assert (cache.misses, reader.reads) == (5, 3)
+
+def test_version_bump_ignores_old_records(images, cachePath, monkeypatch):
+    with MetadataCache(cachePath) as cache:
+        cache.put(images[0], {'content': 'old'})
+    monkeypatch.setattr(MetadataCache, 'RECORD_VERSION', MetadataCache.RECORD_VERSION + 1)
+    with MetadataCache(cachePath) as cache:
+        assert cache.get(images[0]) is None
+        assert cache.misses == 1
+
+def test_invalidate(images, cachePath):
+    with MetadataCache(cachePath) as cache:
+        for path in images[:4]:
+            cache.put(path, {'path': path})
+        cache.invalidate(images[:2])
+        assert len(cache) == 2
+        assert cache.get(images[0]) is None
+        assert cache.get(images[2]) == {'path': images[2]}
+        cache.invalidate()
+        assert len(cache) == 0
+
+def test_evict_removes_exactly_the_overflow(images, cachePath, monkeypatch):
+    # records stored in bulk share the same access time
+    monkeypatch.setattr(metadata_cache.time, 'time', lambda: 1000.0)
+    with MetadataCache(cachePath, maxEntries=7) as cache:
+        for path in images:
+            cache.put(path, {'path': path})
+        assert cache.evict() == 3
+        assert len(cache) == 7
+        assert cache.evict() == 0
+
+def test_evict_least_recently_used(images, cachePath, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metadata_cache.time, 'time', lambda: now[0])
+    with MetadataCache(cachePath) as cache:
+        for path in images:
+            now[0] += 1
+            cache.put(path, {'path': path})
+        # a hit makes the oldest record the most recently used
+        now[0] += 1
+        assert cache.get(images[0]) is not None
+        assert cache.evict(maxEntries=5) == 5
+        # not accessed in the last 2.5 seconds: images 6 and 7
+        assert cache.evict(maxAge=2.5) == 2
+        assert [cache.get(path) is not None for path in images] == [True] + [False]*7 + [True]*2
+
+def test_evict_on_close(images, cachePath):
+    with MetadataCache(cachePath, maxEntries=3) as cache:
+        for path in images:
+            cache.put(path, {'path': path})
+    with MetadataCache(cachePath, maxEntries=3, evictOnClose=True) as cache:
+        # nothing stored: the cache is not evicted
+        assert len(cache) == 10
+    with MetadataCache(cachePath, maxEntries=3, evictOnClose=True) as cache:
+        cache.put(images[0], {'path': images[0]})
+    with MetadataCache(cachePath) as cache:
+        assert len(cache) == 3
+        assert cache.get(images[0]) is not None
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_overlap_graph.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import csv
+
+import numpy as np
+import pytest
+
+from overlap_graph import candidate_pairs, overlap_graph, write_edge_list
+
+
+def _rectangles(count, seed=0):
+    rng = np.random.default_rng(seed)
+    xmin = rng.uniform(0, 1000, count)
+    ymin = rng.uniform(0, 1000, count)
+    xmax = xmin + rng.uniform(5, 60, count)
+    ymax = ymin + rng.uniform(5, 60, count)
+    return np.column_stack((xmin, ymin, xmax, ymax))
+
+def _brute_force_overlaps(boxes):
+    """intersection area of every pair of axis aligned rectangles"""
+    width = np.minimum(boxes[:, np.newaxis, 2], boxes[:, 2]) - np.maximum(boxes[:, np.newaxis, 0], boxes[:, 0])
+    height = np.minimum(boxes[:, np.newaxis, 3], boxes[:, 3]) - np.maximum(boxes[:, np.newaxis, 1], boxes[:, 1])
+    return np.triu(np.clip(width, 0, None)*np.clip(height, 0, None), 1), width, height
+
+@pytest.mark.parametrize('chunkSize', [1, 13, 10000])
+def test_candidate_pairs_match_brute_force(chunkSize):
+    boxes = _rectangles(500)
+    first, second = candidate_pairs(boxes, chunkSize)
+    assert (first < second).all()
+    _, width, height = _brute_force_overlaps(boxes)
+    expected = set(zip(*[index.tolist() for index in np.nonzero(np.triu((width >= 0) & (height >= 0), 1))]))
+    pairs = list(zip(first.tolist(), second.tolist()))
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == expected
+
+@pytest.mark.parametrize('minOverlap', [0.0, 0.3])
+def test_overlap_graph_match_brute_force(minOverlap):
+    pytest.importorskip('osgeo.ogr')
+    boxes = _rectangles(400, seed=1)
+    corners = np.array([[0, 1], [2, 1], [2, 3], [0, 3], [0, 1]])
+    rings = np.stack((boxes[:, corners[:, 0]], boxes[:, corners[:, 1]]), axis=-1)
+    offsets = np.arange(len(boxes) + 1)*5
+
+    first, second, ratios, areas = overlap_graph(rings.reshape(-1, 2), offsets, minOverlap)
+
+    overlaps, _, _ = _brute_force_overlaps(boxes)
+    boxAreas = (boxes[:, 2] - boxes[:, 0])*(boxes[:, 3] - boxes[:, 1])
+    smaller = np.minimum(boxAreas[:, np.newaxis], boxAreas)
+    expected = np.nonzero((overlaps > 0) & (overlaps >= minOverlap*smaller))
+    assert len(expected[0])
+    edges = dict(((id1, id2), (ratio, area)) for id1, id2, ratio, area in
+                 zip(first.tolist(), second.tolist(), ratios.tolist(), areas.tolist()))
+    assert set(edges) == set(zip(*[index.tolist() for index in expected]))
+    for id1, id2 in zip(*expected):
+        assert edges[(id1, id2)][1] == pytest.approx(overlaps[id1, id2])
+        assert edges[(id1, id2)][0] == pytest.approx(overlaps[id1, id2]/smaller[id1, id2])
+
+def test_write_edge_list(tmp_path):
+    path = str(tmp_path / 'edges.csv')
+    write_edge_list(path, ['a.jpg', 'b.jpg', 'c.jpg'], np.array([0, 1]), np.array([2, 2]),
+                    np.array([0.5, 0.25]), np.array([100.0, 12.345]))
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [['image1', 'image2', 'overlap', 'overlap_area'],
+                    ['a.jpg', 'c.jpg', '0.5000', '100.00'],
+                    ['b.jpg', 'c.jpg', '0.2500', '12.35']]
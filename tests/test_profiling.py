@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_profiling.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import json
+
+import pytest
+
+import profiling
+from profiling import StageTimer, timed
+
+
+class Clock:
+    """Fake perf_counter advanced by hand"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(profiling.time, 'perf_counter', clock)
+    return clock
+
+def _timer():
+    timer = StageTimer()
+    # 1, 2, ... 20 ms: mean 10.5 ms, numpy linear p95 at position 18.05 => 19.05 ms
+    for milliseconds in range(1, 21):
+        timer.add('read', milliseconds/1000.0)
+    timer.add('write', 0.5)
+    return timer
+
+
+def test_stage(clock):
+    timer = StageTimer()
+    with timer.stage('read'):
+        clock.now += 0.25
+    with pytest.raises(ValueError):
+        with timer.stage('read'):
+            clock.now += 0.5
+            raise ValueError()
+    stats = timer.summary()['read']
+    assert stats['count'] == 2
+    assert stats['total'] == pytest.approx(0.75)
+    assert timer.elapsed() == pytest.approx(0.75)
+
+def test_summary():
+    summary = _timer().summary()
+    assert list(summary) == ['read', 'write']
+    assert summary['read']['count'] == 20
+    assert summary['read']['total'] == pytest.approx(0.21)
+    assert summary['read']['mean'] == pytest.approx(0.0105)
+    assert summary['read']['p95'] == pytest.approx(0.01905)
+    assert summary['write'] == pytest.approx({'count': 1, 'total': 0.5, 'mean': 0.5, 'p95': 0.5})
+
+def test_update_with_worker_timings(clock):
+    timings = {}
+    with timed(timings, 'decode'):
+        clock.now += 0.002
+    with timed(timings, 'decode'):
+        clock.now += 0.003
+    with timed(None, 'decode'):
+        clock.now += 1.0
+    assert timings == pytest.approx({'decode': 0.005})
+
+    timer = _timer()
+    timer.update(timings)
+    timer.update({'decode': 0.007, 'read': 0.021})
+    summary = timer.summary()
+    assert list(summary) == ['read', 'write', 'decode']
+    assert summary['decode']['count'] == 2
+    assert summary['decode']['mean'] == pytest.approx(0.006)
+    assert summary['read']['count'] == 21
+    assert summary['read']['total'] == pytest.approx(0.231)
+
+def test_report(clock):
+    timer = _timer()
+    clock.now += 4.0
+    lines = timer.report(10)
+    assert lines[0].split() == ['stage', 'count', 'total', 's', 'mean', 'ms', 'p95', 'ms']
+    assert lines[1].split() == ['read', '20', '0.210', '10.500', '19.050']
+    assert lines[2].split() == ['write', '1', '0.500', '500.000', '500.000']
+    assert lines[3] == '10 images in 4.000 s: 2.5 images/s'
+
+def test_report_without_elapsed_time(clock):
+    lines = StageTimer().report(0)
+    assert len(lines) == 2
+    assert lines[1] == '0 images in 0.000 s: 0.0 images/s'
+
+def test_write_json(tmpdir, clock):
+    timer = _timer()
+    clock.now += 2.0
+    path = str(tmpdir.join('profile.json'))
+    timer.write_json(path, 10, workers=4)
+    with open(path) as f:
+        profile = json.load(f)
+    assert list(profile) == ['images', 'elapsed', 'images_per_second', 'stages', 'workers']
+    assert profile['images'] == 10
+    assert profile['elapsed'] == pytest.approx(2.0)
+    assert profile['images_per_second'] == pytest.approx(5.0)
+    assert profile['workers'] == 4
+    assert profile['stages']['read'] == pytest.approx(timer.summary()['read'])
+    assert profile['stages']['write']['count'] == 1
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_terrain.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import numpy as np
+import pytest
+
+from footprint_geometry import frustum_footprints, frustum_rays
+from terrain import DemReader, densify_rays, terrain_footprints, terrain_intersections
+
+
+class PlaneDem:
+    """Analytic DEM z = height + slope*x with the DemReader interface used by the marching"""
+
+    def __init__(self, height, slope=0.0, pixelSize=1.0):
+        self.height = height
+        self.slope = slope
+        self.pixelSize = pixelSize
+        self.maximum = None
+
+    def sample(self, x, y):
+        return self.height + self.slope*np.asarray(x, dtype=np.float64) + 0*np.asarray(y, dtype=np.float64)
+
+
+def _random_dji_poses(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(0, 1000, count), rng.uniform(0, 1000, count), rng.uniform(30, 120, count),
+            rng.uniform(-2, 2, count), rng.uniform(-90, -40, count), rng.uniform(-180, 180, count))
+
+def test_terrain_footprints_on_flat_dem_match_frustum_footprints():
+    x, y, altitude, roll, pitch, yaw = _random_dji_poses(100)
+    dem = PlaneDem(350.0)
+    expected, expectedValid = frustum_footprints(x, y, altitude, roll, pitch, yaw, 73.7, 53.1, maxDistance=2000.0)
+    rings, valid = terrain_footprints(dem, x, y, altitude + 350.0, roll, pitch, yaw, 73.7, 53.1, 2000.0, step=1.0)
+    assert valid.all() and expectedValid.all()
+    np.testing.assert_allclose(rings, expected, atol=1e-2)
+
+def test_terrain_intersections_on_slope():
+    x, y, altitude, roll, pitch, yaw = _random_dji_poses(50, seed=1)
+    dem = PlaneDem(100.0, slope=0.2)
+    origins = np.column_stack((x, y, dem.sample(x, y) + altitude))
+    rays = densify_rays(frustum_rays(roll, pitch, yaw, 73.7, 53.1), 3)
+    points, hit = terrain_intersections(dem, origins, rays, 5000.0, step=0.5)
+    assert hit.all()
+    # points lie on the plane and along the rays
+    np.testing.assert_allclose(points[..., 2], dem.sample(points[..., 0], points[..., 1]), atol=1e-2)
+    directions = points - origins[:, np.newaxis]
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+    np.testing.assert_allclose(directions, rays, atol=1e-6)
+
+def test_terrain_intersections_out_of_range():
+    dem = PlaneDem(0.0)
+    origins = np.array([[0.0, 0.0, 100.0]])
+    # looking at the horizon and looking up never reach the terrain
+    rays = np.array([[[1.0, 0.0, 0.0], [0.0, 0.6, 0.8], [0.0, 0.0, -1.0]]])
+    points, hit = terrain_intersections(dem, origins, rays, 50.0, step=1.0)
+    np.testing.assert_array_equal(hit, [[False, False, False]])
+    np.testing.assert_allclose(points[0], origins + rays[0]*50.0)
+
+def test_dem_reader_bilinear_sample(tmp_path):
+    gdal = pytest.importorskip('osgeo.gdal')
+    path = str(tmp_path / 'dem.tif')
+    rows, columns = np.mgrid[0:40, 0:30]
+    # plane sampled at the pixel centres: bilinear interpolation is exact
+    heights = 100.0 + 2.0*(columns + 0.5) - 1.0*(rows + 0.5)
+    dataset = gdal.GetDriverByName('GTiff').Create(path, 30, 40, 1, gdal.GDT_Float64,
+                                                   ['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16'])
+    dataset.SetGeoTransform((1000.0, 1.0, 0.0, 5000.0, 0.0, -1.0))
+    dataset.GetRasterBand(1).WriteArray(heights)
+    dataset = None
+
+    with DemReader(path, cacheBlocks=2) as dem:
+        rng = np.random.default_rng(0)
+        x = rng.uniform(1000.5, 1029.5, 500)
+        y = rng.uniform(4960.5, 4999.5, 500)
+        np.testing.assert_allclose(dem.sample(x, y), 100.0 + 2.0*(x - 1000.0) - 1.0*(5000.0 - y))
+        assert np.isnan(dem.sample([999.0, 1031.0], [4990.0, 4990.0])).all()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_uav_footprint_cli.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+
+import pytest
+
+pytest.importorskip('osgeo.osr')
+
+import uav_footprint_cli
+from camera_profiles import CAMERA_PROFILES
+from synthetic_images import synthetic_jpeg, synthetic_pose
+
+
+class ScaleTransform:
+    """coordinate transformation stub failing on the points north of a latitude"""
+
+    def __init__(self, maxLatitude=90.0):
+        self.maxLatitude = maxLatitude
+
+    def TransformPoints(self, points):
+        if any(latitude > self.maxLatitude for _, latitude in points):
+            raise RuntimeError('Point outside of the projection domain')
+        return [(longitude*100000.0, latitude*100000.0, 0.0) for longitude, latitude in points]
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for index in (0, 1, 2, 150):
+        path = str(tmp_path / 'DJI_{:04d}.JPG'.format(index))
+        with open(path, 'wb') as f:
+            f.write(synthetic_jpeg(synthetic_pose(index)))
+        paths.append(path)
+    return paths
+
+@pytest.fixture
+def worker(monkeypatch):
+    state = {
+        'transform': ScaleTransform(),
+        'camera': dict(CAMERA_PROFILES['Phantom 4 Pro - FC6310']),
+        'engine': 'frustum',
+        'max_view_distance': 500.0,
+        'dem': None,
+    }
+    monkeypatch.setattr(uav_footprint_cli, '_worker', state)
+    return state
+
+def test_process_chunk(images, worker):
+    items = list(enumerate(images + [images[0] + '.missing'], 11))
+    results, errors = uav_footprint_cli._process_chunk(items)
+    assert [attributes[6] for attributes, _, _ in results] == images
+    assert [(index, source) for index, source, _ in errors] == [(15, images[0] + '.missing')]
+
+def test_process_chunk_block_failure_quarantines_only_bad_images(images, worker):
+    # the image of the second flight line is north of the domain of the transformation
+    worker['transform'] = ScaleTransform(synthetic_pose(100)['latitude'] - 1e-6)
+    results, errors = uav_footprint_cli._process_chunk(list(enumerate(images, 1)))
+    assert [attributes[6] for attributes, _, _ in results] == images[:3]
+    assert len(errors) == 1
+    index, source, message = errors[0]
+    assert (index, source) == (4, images[3])
+    assert 'RuntimeError' in message
+
+def test_unchanged_filter_keeps_input_positions(images):
+    stat = os.stat(images[1])
+    existing = {images[1]: (stat.st_size, stat.st_mtime_ns), images[2]: (0, 0)}
+    counters = {'skipped': 0}
+    items = list(uav_footprint_cli._unchanged_filter(images + ['missing.jpg'], existing, counters))
+    assert items == [(1, images[0]), (3, images[2]), (4, images[3]), (5, 'missing.jpg')]
+    assert counters['skipped'] == 1
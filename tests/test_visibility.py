@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    test_visibility.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import numpy as np
+import pytest
+
+from footprint_geometry import dji_camera_angles
+from visibility import bbox_candidates, frustum_visibility, images_of_point
+
+
+def _rotation(roll, pitch, yaw):
+    """camera to world rotation: roll about x, then pitch about y, then yaw about z"""
+    cos, sin = np.cos, np.sin
+    rotationX = np.array([[1, 0, 0], [0, cos(roll), -sin(roll)], [0, sin(roll), cos(roll)]])
+    rotationY = np.array([[cos(pitch), 0, sin(pitch)], [0, 1, 0], [-sin(pitch), 0, cos(pitch)]])
+    rotationZ = np.array([[cos(yaw), -sin(yaw), 0], [sin(yaw), cos(yaw), 0], [0, 0, 1]])
+    return rotationZ.dot(rotationY).dot(rotationX)
+
+def _brute_force_visibility(x, y, altitude, roll, pitch, yaw, pointsX, pointsY, maxDistance):
+    """
+    every (image, point) pair tested in camera coordinates: the camera looks
+    along -z with the vertical FOV along x and the horizontal FOV along y
+    """
+    cameraRoll, cameraPitch, cameraHeading = dji_camera_angles(roll, pitch, yaw)
+    tanVertical = np.tan(np.radians(53.1/2))
+    tanHorizontal = np.tan(np.radians(73.7/2))
+    points = np.column_stack((pointsX, pointsY, np.zeros(len(pointsX))))
+    visible = set()
+    for image in range(len(x)):
+        rotation = _rotation(cameraRoll[image], cameraPitch[image], cameraHeading[image])
+        relative = points - (x[image], y[image], altitude[image])
+        # world to camera is the transposed rotation
+        camera = relative.dot(rotation)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inside = ((camera[:, 2] < 0) &
+                      (np.abs(camera[:, 0]/camera[:, 2]) <= tanVertical) &
+                      (np.abs(camera[:, 1]/camera[:, 2]) <= tanHorizontal))
+        if maxDistance is not None:
+            inside &= np.linalg.norm(relative, axis=1) <= maxDistance
+        elif not _corners_down(rotation, tanVertical, tanHorizontal):
+            # without range limit images viewing the horizon are skipped
+            continue
+        visible.update((image, point) for point in np.flatnonzero(inside).tolist())
+    return visible
+
+def _corners_down(rotation, tanVertical, tanHorizontal):
+    corners = np.array([[sx*tanVertical, sy*tanHorizontal, -1] for sx in (-1, 1) for sy in (-1, 1)])
+    return (corners.dot(rotation.T)[:, 2] < 0).all()
+
+@pytest.mark.parametrize('maxDistance', [None, 150.0, 1000.0])
+def test_frustum_visibility_match_brute_force(maxDistance):
+    rng = np.random.default_rng(0)
+    count = 60
+    x = rng.uniform(0, 500, count)
+    y = rng.uniform(0, 500, count)
+    altitude = rng.uniform(40, 100, count)
+    roll = rng.uniform(-2, 2, count)
+    pitch = rng.uniform(-90, -10, count)
+    yaw = rng.uniform(-180, 180, count)
+    pointsX = rng.uniform(-200, 700, 3000)
+    pointsY = rng.uniform(-200, 700, 3000)
+
+    imageIndex, pointIndex = frustum_visibility(x, y, altitude, roll, pitch, yaw, 73.7, 53.1,
+                                                pointsX, pointsY, maxDistance=maxDistance)
+    expected = _brute_force_visibility(x, y, altitude, roll, pitch, yaw, pointsX, pointsY, maxDistance)
+    assert expected
+    assert set(zip(imageIndex.tolist(), pointIndex.tolist())) == expected
+    # pairs are sorted by point
+    assert (np.diff(pointIndex) >= 0).all()
+
+    point = int(pointIndex[len(pointIndex)//2])
+    assert set(images_of_point(imageIndex, pointIndex, point).tolist()) == \
+        {image for image, other in expected if other == point}
+
+def test_bbox_candidates_match_brute_force():
+    rng = np.random.default_rng(1)
+    xmin = rng.uniform(0, 100, 50)
+    ymin = rng.uniform(0, 100, 50)
+    xmax = xmin + rng.uniform(0, 20, 50)
+    ymax = ymin + rng.uniform(0, 20, 50)
+    pointsX = rng.uniform(0, 120, 500)
+    pointsY = rng.uniform(0, 120, 500)
+
+    imageIndex, pointIndex = bbox_candidates(xmin, ymin, xmax, ymax, pointsX, pointsY, chunkSize=7)
+    inside = ((xmin[:, np.newaxis] <= pointsX) & (pointsX <= xmax[:, np.newaxis]) &
+              (ymin[:, np.newaxis] <= pointsY) & (pointsY <= ymax[:, np.newaxis]))
+    assert set(zip(imageIndex.tolist(), pointIndex.tolist())) == set(zip(*[index.tolist() for index in np.nonzero(inside)]))
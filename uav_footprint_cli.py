@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    uav_footprint_cli.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import os
+import sys
+import argparse
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+from image_metadata import MetadataError, read_image_record
+from image_sources import (DEFAULT_PATTERNS,
+                           iter_image_paths,
+                           iter_manifest_paths,
+                           count_image_paths)
+from camera_profiles import CAMERA_PROFILES
+from gpkg_writer import GeoPackageWriter
+from checkpoint import QuarantineReport, quarantine_path
+from footprint_geometry import (wedge_distances,
+                                frustum_footprints,
+                                wedge_ring,
+                                point_wkb,
+                                polygon_wkb)
+from terrain import DemReader, terrain_footprints, heights_above_ground
+from footprint_index import FootprintIndex, index_path, read_footprints
+from coverage_raster import CHUNK_ROWS, coverage_raster, read_polygon_rings
+from overlap_graph import overlap_graph, write_edge_list
+
+# same fields of the QGIS batch algorithm
+FIELDS = [
+    ('date_time', ogr.OFTString),
+    ('gimball_pitch', ogr.OFTReal),
+    ('gimball_roll', ogr.OFTReal),
+    ('gimball_jaw', ogr.OFTReal),
+    ('relative_altitude', ogr.OFTReal),
+    ('layer', ogr.OFTString),
+    ('path', ogr.OFTString),
+    ('camera_model', ogr.OFTString),
+    ('camera_vertical_FOV', ogr.OFTReal),
+    ('camera_horizontal_FOV', ogr.OFTReal),
+    ('nadir_to_bottom_offset', ogr.OFTReal),
+    ('nadir_to_upper_offset', ogr.OFTReal),
+    ('file_size', ogr.OFTInteger64),
+    ('file_mtime', ogr.OFTInteger64),
+    ('height_above_ground', ogr.OFTReal),
+]
+
+FOOTPRINTS_LAYER = 'footprints'
+NADIRS_LAYER = 'nadirs'
+
+# images sent to a worker process at time
+CHUNK_SIZE = 64
+
+# state of each worker process set by _init_worker
+_worker = {}
+
+
+def _spatial_reference(definition):
+    """
+    :param definition: CRS definition e.g. 'EPSG:25829', WKT or proj string
+    :return: osr.SpatialReference with x=lon/easting and y=lat/northing order
+    """
+    srs = osr.SpatialReference()
+    if srs.SetFromUserInput(definition) != 0:
+        raise ValueError('Invalid CRS: {}'.format(definition))
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+def _init_worker(sourceCrs, destinationCrs, camera, engine, maxViewDistance, dem=None):
+    """
+    Initializer of the worker processes: the coordinate transformation and
+    the DEM reader (with its blocks cache) are created once for each process
+    """
+    gdal.UseExceptions()
+    _worker['transform'] = osr.CoordinateTransformation(_spatial_reference(sourceCrs),
+                                                        _spatial_reference(destinationCrs))
+    _worker['camera'] = camera
+    _worker['engine'] = engine
+    _worker['max_view_distance'] = maxViewDistance
+    _worker['dem'] = None
+    if dem is not None:
+        path, segments, step, height = dem
+        _worker['dem'] = DemReader(path)
+        _worker['dem_segments'] = segments
+        _worker['dem_step'] = step
+        _worker['dem_height'] = height
+
+def _process_chunk(items):
+    """
+    Read metadata and calculate nadir and footprint of a chunk of images.
+    Runs in a worker process.
+    :param items: list of (index, image path), index is the position of the
+        image in the input (1 based)
+    :return: tuple (results, errors). results is a list of (attributes,
+        nadir WKB, footprint WKB) in the same order of items, errors a list
+        of (index, source, message) of the images not processed
+    """
+    records = []
+    errors = []
+    for index, source in items:
+        try:
+            stat = os.stat(source)
+            record = read_image_record(source)
+        except (OSError, MetadataError) as ex:
+            errors.append((index, source, str(ex)))
+            continue
+        except Exception as ex:
+            # a bad image must not abort the whole run
+            errors.append((index, source, '{}: {}: {}'.format(source, type(ex).__name__, ex)))
+            continue
+        record['file_size'] = stat.st_size
+        record['file_mtime'] = stat.st_mtime_ns
+        records.append((index, source, record))
+    if not records:
+        return [], errors
+
+    try:
+        results, footprintErrors = _chunk_footprints(records)
+    except Exception:
+        # the block pass failed (e.g. DEM read error or degenerate pose):
+        # images are processed one at time to quarantine only the bad ones
+        results = []
+        footprintErrors = []
+        for index, source, record in records:
+            try:
+                imageResults, imageErrors = _chunk_footprints([(index, source, record)])
+            except Exception as ex:
+                imageResults = []
+                imageErrors = [(index, source, '{}: {}: {}'.format(source, type(ex).__name__, ex))]
+            results.extend(imageResults)
+            footprintErrors.extend(imageErrors)
+    return results, errors + footprintErrors
+
+def _chunk_footprints(items):
+    """
+    Calculate nadirs and footprints of a chunk of images with array operations
+    :param items: list of (index, source, record) of the images with metadata
+    :return: tuple (results, errors) as _process_chunk
+    """
+    camera = _worker['camera']
+    records = [record for _, _, record in items]
+    # transform all the nadirs of the chunk with a single call
+    nadirs = _worker['transform'].TransformPoints(
+        [(record['longitude'], record['latitude']) for record in records])
+
+    relativeAltitudes = np.array([record['relative_altitude'] for record in records])
+    absoluteAltitudes = np.array([np.nan if record['absolute_altitude'] is None else record['absolute_altitude']
+                                  for record in records])
+    heights = np.full(len(records), np.nan)
+    if _worker['dem'] is not None and _worker['dem_height']:
+        # height over the terrain under the nadirs instead of over the takeoff point
+        heights = heights_above_ground(_worker['dem'], [nadir[0] for nadir in nadirs],
+                                       [nadir[1] for nadir in nadirs], absoluteAltitudes)
+        relativeAltitudes = np.where(np.isfinite(heights), heights, relativeAltitudes)
+    gimbalPitches = [record['gimbal_pitch'] for record in records]
+    if _worker['engine'] == 'frustum':
+        rings, validRings = frustum_footprints(
+            [nadir[0] for nadir in nadirs], [nadir[1] for nadir in nadirs], relativeAltitudes,
+            [record['gimbal_roll'] for record in records], gimbalPitches,
+            [record['gimbal_yaw'] for record in records],
+            camera['horizontal_FOV'], camera['vertical_FOV'], _worker['max_view_distance'])
+    elif _worker['engine'] == 'terrain':
+        rings, validRings = terrain_footprints(
+            _worker['dem'], [nadir[0] for nadir in nadirs], [nadir[1] for nadir in nadirs], absoluteAltitudes,
+            [record['gimbal_roll'] for record in records], gimbalPitches,
+            [record['gimbal_yaw'] for record in records],
+            camera['horizontal_FOV'], camera['vertical_FOV'], _worker['max_view_distance'],
+            _worker['dem_segments'], _worker['dem_step'])
+    else:
+        bottomDistances, upperDistances = wedge_distances(relativeAltitudes, gimbalPitches, camera['vertical_FOV'])
+
+    results = []
+    errors = []
+    for item, ((index, source, record), nadir) in enumerate(zip(items, nadirs)):
+        nadirX, nadirY = nadir[0], nadir[1]
+        if _worker['engine'] == 'terrain':
+            if not validRings[item]:
+                errors.append((index, source,
+                               '{}: AbsoluteAltitude not available or camera under the DEM surface'.format(source)))
+                continue
+            ring = rings[item]
+        elif _worker['engine'] == 'frustum':
+            if not validRings[item]:
+                errors.append((index, source,
+                               '{}: the camera frustum reaches the horizon: footprint is not bounded'.format(source)))
+                continue
+            ring = rings[item]
+        else:
+            # same arguments order of createWedgeBuffer in the batch algorithm
+            ring = wedge_ring(nadirX, nadirY,
+                              record['gimbal_yaw'],
+                              camera['horizontal_FOV'],
+                              abs(bottomDistances[item]) + camera['nadir_to_bottom_offset'],
+                              abs(upperDistances[item]) + camera['nadir_to_upper_offset'])
+        attributes = (
+            record['date_time'],
+            record['gimbal_pitch'],
+            record['gimbal_roll'],
+            record['gimbal_yaw'],
+            record['relative_altitude'],
+            os.path.splitext(os.path.basename(source))[0],
+            source,
+            record['model'],
+            camera['vertical_FOV'],
+            camera['horizontal_FOV'],
+            camera['nadir_to_bottom_offset'],
+            camera['nadir_to_upper_offset'],
+            record['file_size'],
+            record['file_mtime'],
+            None if np.isnan(heights[item]) else float(heights[item]),
+        )
+        results.append((attributes, point_wkb(nadirX, nadirY), polygon_wkb(ring)))
+    return results, errors
+
+def _ordered_map(executor, function, chunks, window):
+    """
+    Like executor.map but submitting at most window chunks in advance, so that
+    the input is consumed lazily and results don't pile up in memory
+    """
+    chunks = iter(chunks)
+    pending = deque(executor.submit(function, chunk) for chunk in islice(chunks, window))
+    try:
+        while pending:
+            result = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(function, chunk))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+def _chunks(iterable, size):
+    """
+    :return: yield lists of size elements (the last can be shorter)
+    """
+    iterable = iter(iterable)
+    while True:
+        chunk = list(islice(iterable, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _iter_sources(args):
+    """
+    Generator of the image paths of folder and manifest arguments
+    """
+    if args.folder:
+        for path in iter_image_paths(args.folder, args.pattern, args.recursive):
+            yield path
+    if args.manifest:
+        for path in iter_manifest_paths(args.manifest):
+            yield path
+
+def _unchanged_filter(sources, existingImages, counters):
+    """
+    Skip the images already written with the same file size and modification time
+    :param sources: iterable of image paths
+    :param existingImages: dict path => (file_size, file_mtime)
+    :param counters: dict where 'skipped' images are counted
+    :return: yield (index, source) of the images to process, index is the
+        position of the image in the input (1 based)
+    """
+    for index, source in enumerate(sources, 1):
+        if existingImages:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                # missing images are quarantined by the workers
+                yield index, source
+                continue
+            if existingImages.get(source) == (stat.st_size, stat.st_mtime_ns):
+                counters['skipped'] += 1
+                continue
+        yield index, source
+
+def _camera(args):
+    """
+    :return: camera profile dictionary with command line overrides applied
+    """
+    camera = dict(CAMERA_PROFILES[args.camera])
+    if args.horizontal_fov is not None:
+        camera['horizontal_FOV'] = args.horizontal_fov
+    if args.vertical_fov is not None:
+        camera['vertical_FOV'] = args.vertical_fov
+    if args.bottom_offset is not None:
+        camera['nadir_to_bottom_offset'] = args.bottom_offset
+    if args.upper_offset is not None:
+        camera['nadir_to_upper_offset'] = args.upper_offset
+    return camera
+
+def footprints(args):
+    """
+    footprints command: write nadirs and footprints of the images to a GeoPackage
+    """
+    gdal.UseExceptions()
+    camera = _camera(args)
+    destinationSrs = _spatial_reference(args.destination_crs)
+    _spatial_reference(args.source_crs)
+
+    imagesCount = count_image_paths(args.folder, args.pattern, args.recursive, args.manifest)
+    if imagesCount == 0:
+        print('No input images', file=sys.stderr)
+        return 1
+    print('Going to process: {} images with {} processes'.format(imagesCount, args.workers), file=sys.stderr)
+
+    dem = None
+    if args.engine in ('frustum', 'terrain') and destinationSrs.IsGeographic():
+        print('{} engine needs a projected destination CRS'.format(args.engine), file=sys.stderr)
+        return 1
+    if args.engine == 'terrain' and not (args.dem and args.max_view_distance):
+        print('terrain engine needs --dem and a --max-view-distance', file=sys.stderr)
+        return 1
+    if args.dem_height and not args.dem:
+        print('--dem-height needs --dem', file=sys.stderr)
+        return 1
+    if args.dem:
+        # the terrain engine already uses absolute altitudes
+        dem = (args.dem, args.dem_segments, args.marching_step,
+               args.dem_height and args.engine != 'terrain')
+
+    if os.path.exists(args.output) and not (args.overwrite or args.append):
+        print('Output already exists: {}'.format(args.output), file=sys.stderr)
+        return 1
+
+    processed = 0
+    counters = {'skipped': 0, 'replaced': 0}
+    quarantine = QuarantineReport(args.quarantine or quarantine_path(args.output), append=args.append)
+    with GeoPackageWriter(args.output, batchSize=args.batch_size, overwrite=not args.append) as writer:
+        existingImages = {}
+        if args.append:
+            footprintLayer = writer.openLayer(FOOTPRINTS_LAYER, ogr.wkbPolygon, destinationSrs, FIELDS)
+            nadirLayer = writer.openLayer(NADIRS_LAYER, ogr.wkbPoint, destinationSrs, FIELDS)
+            existingImages = writer.readIndex(footprintLayer, 'path', ('file_size', 'file_mtime'))
+            print('Images already in the output: {}'.format(len(existingImages)), file=sys.stderr)
+        else:
+            footprintLayer = writer.createLayer(FOOTPRINTS_LAYER, ogr.wkbPolygon, destinationSrs, FIELDS)
+            nadirLayer = writer.createLayer(NADIRS_LAYER, ogr.wkbPoint, destinationSrs, FIELDS)
+
+        with ProcessPoolExecutor(max_workers=args.workers,
+                                 initializer=_init_worker,
+                                 initargs=(args.source_crs, args.destination_crs, camera,
+                                           args.engine, args.max_view_distance or None, dem)) as executor:
+            items = _unchanged_filter(_iter_sources(args), existingImages, counters)
+            chunks = _chunks(items, args.chunk_size)
+            # images sent to the workers
+            submitted = 0
+            with quarantine:
+                for results, errors in _ordered_map(executor, _process_chunk, chunks, 2*args.workers):
+                    for index, source, message in sorted(errors):
+                        print('Image quarantined: {}'.format(message), file=sys.stderr)
+                        quarantine.add(index, source, message)
+                    submitted += len(results) + len(errors)
+                    # old features of changed images are replaced
+                    changedSources = [attributes[6] for attributes, _, _ in results
+                                      if attributes[6] in existingImages]
+                    writer.deleteWhere(nadirLayer, 'path', changedSources)
+                    writer.deleteWhere(footprintLayer, 'path', changedSources)
+                    counters['replaced'] += len(changedSources)
+                    for attributes, nadirWkb, footprintWkb in results:
+                        writer.add(nadirLayer, attributes, nadirWkb)
+                        writer.add(footprintLayer, attributes, footprintWkb)
+                    processed += len(results)
+                    print('Processed {}/{} images'.format(submitted + counters['skipped'], imagesCount), file=sys.stderr)
+
+    if quarantine.count:
+        print('Images quarantined: {} see {}'.format(quarantine.count, quarantine.path), file=sys.stderr)
+
+    if args.append:
+        print('Unchanged images skipped: {} changed images replaced: {}'.format(
+            counters['skipped'], counters['replaced']), file=sys.stderr)
+
+    return 0
+
+def index(args):
+    """
+    index command: build the spatial index of the footprints of a GeoPackage
+    """
+    gdal.UseExceptions()
+    footprintIndex = FootprintIndex.fromFile(args.output, FOOTPRINTS_LAYER)
+    path = args.index or index_path(args.output)
+    footprintIndex.save(path)
+    print('Indexed {} footprints in {}'.format(len(footprintIndex), path), file=sys.stderr)
+    return 0
+
+def query(args):
+    """
+    query command: print path and attributes of the images covering a point, a box or a polygon
+    """
+    footprintIndex = FootprintIndex.load(args.index)
+    if args.point:
+        ids = footprintIndex.queryPoint(*args.point)
+    elif args.bbox:
+        ids = footprintIndex.queryBbox(*args.bbox)
+    else:
+        geometry = ogr.CreateGeometryFromWkt(args.polygon)
+        if geometry is None:
+            print('Invalid polygon: {}'.format(args.polygon), file=sys.stderr)
+            return 1
+        ids = footprintIndex.queryPolygon(geometry.GetGeometryRef(0).GetPoints())
+    for record in footprintIndex.records(ids):
+        if args.attributes:
+            print('\t'.join(str(value) for value in record.values()))
+        else:
+            print(record[footprintIndex.pathField])
+    return 0
+
+def _layer_srs_wkt(path, layerName):
+    """
+    :return: WKT of the CRS of the layer, empty string if not defined
+    """
+    dataSource = ogr.Open(path)
+    if dataSource is None:
+        raise IOError('Cannot open: {}'.format(path))
+    srs = dataSource.GetLayerByName(layerName).GetSpatialRef()
+    return srs.ExportToWkt() if srs is not None else ''
+
+def coverage(args):
+    """
+    coverage command: raster of the number of footprints covering each cell and gaps in the AOI
+    """
+    gdal.UseExceptions()
+    coordinates, offsets, _ = read_footprints(args.output, FOOTPRINTS_LAYER, fields=[])
+    if len(offsets) < 2:
+        print('No footprints in {}'.format(args.output), file=sys.stderr)
+        return 1
+    aoi = None
+    if args.aoi:
+        aoi = read_polygon_rings(args.aoi)
+        if len(aoi[1]) < 2:
+            print('No polygons in {}'.format(args.aoi), file=sys.stderr)
+            return 1
+    elif args.gaps:
+        print('--gaps requires --aoi', file=sys.stderr)
+        return 1
+
+    statistics = coverage_raster(args.raster, coordinates, offsets, args.resolution,
+                                 _layer_srs_wkt(args.output, FOOTPRINTS_LAYER), aoi,
+                                 args.gaps, args.chunk_rows)
+    print('Cells: {cells} covered: {covered_cells} uncovered: {uncovered_cells}'.format(**statistics))
+    print('Uncovered area: {uncovered_area:.1f} ({percent:.2f}%)'.format(
+        percent=100*statistics['uncovered_ratio'], **statistics))
+    print('Maximum overlap: {}'.format(statistics['max_overlap']))
+    for count, cells in enumerate(statistics['histogram']):
+        print('Cells covered by {} images: {}'.format(count, cells))
+    if statistics['gaps'] is not None:
+        print('Gaps: {} polygons written to {}'.format(statistics['gaps'], args.gaps))
+    return 0
+
+def overlaps(args):
+    """
+    overlaps command: edge list of the image pairs whose footprints overlap
+    """
+    gdal.UseExceptions()
+    coordinates, offsets, attributes = read_footprints(args.output, FOOTPRINTS_LAYER, fields=['path'])
+    first, second, ratios, areas = overlap_graph(coordinates, offsets, args.min_overlap)
+    write_edge_list(args.edges, attributes['path'], first, second, ratios, areas)
+    print('Footprints: {} overlapping pairs: {}'.format(len(offsets) - 1, len(first)), file=sys.stderr)
+    return 0
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        description='Calculate UAV images footprints without a QGIS session')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    footprintsParser = subparsers.add_parser('footprints',
+        help='write nadir points and footprint polygons of the images to a GeoPackage')
+    footprintsParser.add_argument('output', help='output GeoPackage (.gpkg)')
+    footprintsParser.add_argument('--folder', help='folder of the images')
+    footprintsParser.add_argument('--pattern', default=DEFAULT_PATTERNS,
+        help='images file patterns separated by ; (default: %(default)s)')
+    footprintsParser.add_argument('--recursive', action='store_true',
+        help='scan also the subfolders of --folder')
+    footprintsParser.add_argument('--manifest',
+        help='text file with an image path for each line')
+    footprintsParser.add_argument('--camera', choices=list(CAMERA_PROFILES),
+        default=list(CAMERA_PROFILES)[0], help='camera profile (default: %(default)s)')
+    footprintsParser.add_argument('--engine', choices=('wedge', 'frustum', 'terrain'), default='wedge',
+        help='footprint model: trigonometric wedge buffer, camera frustum intersection with '
+             'flat ground or with --dem, the frustum engines need a projected '
+             'destination CRS (default: %(default)s)')
+    footprintsParser.add_argument('--dem',
+        help='DEM in the destination CRS, heights in the datum of AbsoluteAltitude (terrain engine)')
+    footprintsParser.add_argument('--dem-height', action='store_true',
+        help='wedge and frustum engines use AbsoluteAltitude minus --dem height under the nadir '
+             'instead of RelativeAltitude (height over the takeoff point)')
+    footprintsParser.add_argument('--dem-segments', type=int, default=4,
+        help='segments of each footprint side following the DEM (default: %(default)s)')
+    footprintsParser.add_argument('--marching-step', type=float,
+        help='ray marching step on the DEM in metres (default: DEM pixel size)')
+    footprintsParser.add_argument('--max-view-distance', type=float, default=1000.0,
+        help='frustum rays are limited to this distance in metres, 0 to not limit (default: %(default)s)')
+    footprintsParser.add_argument('--horizontal-fov', type=float,
+        help='override the wide camera angle of the profile (degree)')
+    footprintsParser.add_argument('--vertical-fov', type=float,
+        help='override the tall camera angle of the profile (degree)')
+    footprintsParser.add_argument('--bottom-offset', type=float,
+        help='offset to add to bottom distance (metre)')
+    footprintsParser.add_argument('--upper-offset', type=float,
+        help='offset to add to upper distance (metre)')
+    footprintsParser.add_argument('--source-crs', default='EPSG:4326',
+        help='CRS of the image coordinates (default: %(default)s)')
+    footprintsParser.add_argument('--destination-crs', required=True,
+        help='projected CRS of the output e.g. EPSG:25829')
+    footprintsParser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+        help='number of processes (default: %(default)s)')
+    footprintsParser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+        help='images processed by a process at time (default: %(default)s)')
+    footprintsParser.add_argument('--batch-size', type=int, default=GeoPackageWriter.DEFAULT_BATCH_SIZE,
+        help='features written for each transaction (default: %(default)s)')
+    footprintsParser.add_argument('--overwrite', action='store_true',
+        help='overwrite the output if it exists')
+    footprintsParser.add_argument('--quarantine',
+        help='CSV report of the images not processed (default: next to the output)')
+    footprintsParser.add_argument('--append', action='store_true',
+        help='append new and changed images to an existing output, skipping unchanged images')
+    footprintsParser.set_defaults(function=footprints)
+
+    indexParser = subparsers.add_parser('index',
+        help='build the spatial index of the footprints written by the footprints command')
+    indexParser.add_argument('output', help='footprints GeoPackage (.gpkg)')
+    indexParser.add_argument('--index',
+        help='index file (default: next to the GeoPackage with _index.npz suffix)')
+    indexParser.set_defaults(function=index)
+
+    queryParser = subparsers.add_parser('query',
+        help='list the images whose footprint covers a point, a box or a polygon')
+    queryParser.add_argument('index', help='index file written by the index command')
+    queryGroup = queryParser.add_mutually_exclusive_group(required=True)
+    queryGroup.add_argument('--point', type=float, nargs=2, metavar=('X', 'Y'))
+    queryGroup.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'))
+    queryGroup.add_argument('--polygon', help='WKT polygon in the footprints CRS')
+    queryParser.add_argument('--attributes', action='store_true',
+        help='print all the attributes separated by tab instead of the image path')
+    queryParser.set_defaults(function=query)
+
+    coverageParser = subparsers.add_parser('coverage',
+        help='write the raster of the number of footprints covering each cell and report the gaps')
+    coverageParser.add_argument('output', help='footprints GeoPackage (.gpkg)')
+    coverageParser.add_argument('raster', help='output GeoTIFF of the overlap count')
+    coverageParser.add_argument('--resolution', type=float, required=True,
+        help='cell size in the footprints CRS units')
+    coverageParser.add_argument('--aoi',
+        help='polygon layer of the area of interest in the footprints CRS: '
+             'cells outside are no data, uncovered cells inside are reported as gaps')
+    coverageParser.add_argument('--gaps',
+        help='output GeoPackage of the polygons of the uncovered cells inside the AOI')
+    coverageParser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+        help='raster rows computed at time, to bound memory (default: %(default)s)')
+    coverageParser.set_defaults(function=coverage)
+
+    overlapsParser = subparsers.add_parser('overlaps',
+        help='write the edge list of the image pairs whose footprints overlap')
+    overlapsParser.add_argument('output', help='footprints GeoPackage (.gpkg)')
+    overlapsParser.add_argument('edges', help='output CSV edge list')
+    overlapsParser.add_argument('--min-overlap', type=float, default=0.3,
+        help='minimum intersection area over the area of the smaller footprint (default: %(default)s)')
+    overlapsParser.set_defaults(function=overlaps)
+
+    return parser
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.command == 'footprints' and not (args.folder or args.manifest):
+        parser.error('footprints: set --folder and/or --manifest')
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,8 +22,6 @@ __copyright__ = '(C) 2019, Luigi Pirelli'
 
 import time
 import math
-from xml.etree import cElementTree as ElementTree
-from osgeo import gdal
 
 from qgis.PyQt.QtCore import (QCoreApplication,
                               QVariant)
@@ -32,104 +30,24 @@ from qgis.core import (QgsProcessing,
                        QgsProcessingException,
                        QgsProcessingParameterDefinition,
                        QgsProcessingParameterNumber,
-                       QgsProcessingParameterVectorDestination,
                        QgsProcessingParameterRasterLayer,
                        QgsProcessingParameterFeatureSink,
                        QgsProcessingParameterCrs,
                        QgsProcessingParameterBoolean,
-                       QgsProcessingUtils,
-                       QgsProcessingFeatureSourceDefinition,
                        QgsCoordinateReferenceSystem,
                        QgsCoordinateTransform,
                        QgsProject,
                        QgsPointXY,
                        QgsPoint,
                        QgsGeometry,
-                       QgsVectorLayer,
                        QgsFeature,
                        QgsWkbTypes,
                        QgsFeatureSink,
                        QgsField,
                        QgsFields,
                        QgsWkbTypes)
-import processing
-
-###############################################
-# XML to dict parsing code get from:
-# https://stackoverflow.com/questions/2148119/how-to-convert-an-xml-string-to-a-dictionary
-class XmlListConfig(list):
-    def __init__(self, aList):
-        for element in aList:
-            if element:
-                # treat like dict
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    self.append(XmlDictConfig(element))
-                # treat like list
-                elif element[0].tag == element[1].tag:
-                    self.append(XmlListConfig(element))
-            elif element.text:
-                text = element.text.strip()
-                if text:
-                    self.append(text)
-
-
-class XmlDictConfig(dict):
-    '''
-    Example usage:
-    >>> tree = ElementTree.parse('your_file.xml')
-    >>> root = tree.getroot()
-    >>> xmldict = XmlDictConfig(root)
-    Or, if you want to use an XML string:
-    >>> root = ElementTree.XML(xml_string)
-    >>> xmldict = XmlDictConfig(root)
-    And then use xmldict for what it is... a dict.
-    '''
-    def __init__(self, parent_element):
-        if parent_element.items():
-            self.update(dict(parent_element.items()))
-        for element in parent_element:
-            if element:
-                # treat like dict - we assume that if the first two tags
-                # in a series are different, then they are all different.
-                if len(element) == 1 or element[0].tag != element[1].tag:
-                    aDict = XmlDictConfig(element)
-                # treat like list - we assume that if the first two tags
-                # in a series are the same, then the rest are the same.
-                else:
-                    # here, we put the list in dictionary; the key is the
-                    # tag name the list elements all share in common, and
-                    # the value is the list itself 
-                    aDict = {element[0].tag: XmlListConfig(element)}
-                # if the tag has attributes, add those to the dict
-                if element.items():
-                    aDict.update(dict(element.items()))
-                self.update({element.tag: aDict})
-            # this assumes that if you've got an attribute in a tag,
-            # you won't be having any text. This may or may not be a 
-            # good idea -- time will tell. It works for the way we are
-            # currently doing XML configuration files...
-            elif element.items():
-                self.update({element.tag: dict(element.items())})
-            # finally, if there are no child tags and no attributes, extract
-            # the text
-            else:
-                self.update({element.tag: element.text})
-
-###############################################
-
-def _convert_to_degress(value):
-    """
-    Helper function to convert the GPS coordinates stored in the EXIF to degress in float format
-    :param value:
-    :type value: str (e.g. '(43) (16) (20.3444)')
-    :rtype: float
-    """
-    values = value.translate(str.maketrans({'(':None, ')':None})).split()
-    d = float(values[0])
-    m = float(values[1])
-    s = float(values[2])
-
-    return d + (m / 60.0) + (s / 3600.0)
+
+from image_metadata import MetadataError, read_image_record
 
 class UAVImageFootprint(QgsProcessingAlgorithm):
 
@@ -192,7 +110,7 @@ class UAVImageFootprint(QgsProcessingAlgorithm):
         )
 
         self.addParameter(
-            QgsProcessingParameterVectorDestination (
+            QgsProcessingParameterFeatureSink (
                 self.OUTPUT_FOOTPRINT,
                 self.tr('Image footprint'),
                 QgsProcessing.TypeVectorPolygon
@@ -298,15 +216,15 @@ class UAVImageFootprint(QgsProcessingAlgorithm):
         # fields.append(QgsField('camera_vertical_FOV', QVariant.Double))
         # fields.append(QgsField('camera_horizontal_FOV', QVariant.Double))
 
-        # (footprintSink, footprint_dest_id) = self.parameterAsSink(
-        #     parameters,
-        #     self.OUTPUT_FOOTPRINT,
-        #     context,
-        #     fields,
-        #     QgsWkbTypes.Polygon,
-        #     destinationCRS)
-        # if footprintSink is None:
-        #     raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_FOOTPRINT))
+        (footprintSink, footprint_dest_id) = self.parameterAsSink(
+            parameters,
+            self.OUTPUT_FOOTPRINT,
+            context,
+            fields,
+            QgsWkbTypes.Polygon,
+            destinationCRS)
+        if footprintSink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT_FOOTPRINT))
 
         (nadirSink, nadir_dest_id) = self.parameterAsSink(
             parameters,
@@ -328,98 +246,43 @@ class UAVImageFootprint(QgsProcessingAlgorithm):
 
         # extract exif and XMP data
         try:
-            gdal.UseExceptions()
-            dataFrame = gdal.Open(uavImage.source(), gdal.GA_ReadOnly)
-            domains = dataFrame.GetMetadataDomainList()
-
-            # get exif metadata
-            exifTags = dataFrame.GetMetadata()
-            for key, value in exifTags.items():
-                #print(key, ':', value)
-                pass
-
-            # select metadata from XMP domain only
-            droneMetadata = {}
-            for domain in domains:
-                metadata = dataFrame.GetMetadata(domain)
-
-                # skip not relevant tags
-                if isinstance(metadata, dict):
-                    for key, value in metadata.items():
-                        #print(domain, "--", key, ":", value)
-                        pass
-
-                # probably XMPs
-                if isinstance(metadata, list):
-                    if domain == 'xml:XMP':
-                        # parse xml
-                        root = ElementTree.XML(metadata[0])
-                        xmldict = XmlDictConfig(root)
-
-                        # skip first element containing only description and domain info
-                        subdict = list(xmldict.values())[0]
-
-                        # get XMP tags
-                        subdict = list(subdict.values())[0]
-                        # parse XMP stuffs removing head namespace in the key 
-                        # e.g.
-                        #    {http://www.dji.com/drone-dji/1.0/}AbsoluteAltitude
-                        # become
-                        #    AbsoluteAltitude
-                        for key, value in subdict.items():
-                            #print(domain, '--', key, value)
-                            key = key.split('}')[1]
-                            droneMetadata[key] = value
-
-        except Exception as ex:
+            record = read_image_record(uavImage.source())
+        except (OSError, MetadataError) as ex:
             raise QgsProcessingException(str(ex))
-        
-        # extract all important tagged information about the image
 
         # get image lat/lon that will be the coordinates of nadir point
         # converted to destination CRS
-        lat = _convert_to_degress(exifTags['EXIF_GPSLatitude'])
-        emisphere = exifTags['EXIF_GPSLatitudeRef']
-        lon = _convert_to_degress(exifTags['EXIF_GPSLongitude'])
-        lonReference = exifTags['EXIF_GPSLongitudeRef']
-
-        if emisphere == 'S':
-            lat = -lat
-        if lonReference == 'W':
-            lon = -lon
-
-        exifDateTime = exifTags['EXIF_DateTime']
-        feedback.pushInfo("EXIF_DateTime: "+exifDateTime)
-
-        exifImageWidth = exifTags['EXIF_PixelXDimension']
-        exifImageLength = exifTags['EXIF_PixelYDimension']
-        imageRatio = float(exifImageWidth)/float(exifImageLength)
-        feedback.pushInfo("EXIF_PixelXDimension: "+exifImageWidth)
-        feedback.pushInfo("EXIF_PixelYDimension: "+exifImageLength)
+        lat = record['latitude']
+        lon = record['longitude']
+
+        feedback.pushInfo("EXIF_DateTime: "+record['date_time'])
+
+        imageRatio = float(record['image_width'])/float(record['image_height'])
+        feedback.pushInfo("EXIF_PixelXDimension: "+str(record['image_width']))
+        feedback.pushInfo("EXIF_PixelYDimension: "+str(record['image_height']))
         feedback.pushInfo("Image ratio: "+str(imageRatio))
 
         # drone especific metadata
-        droneMaker = exifTags['EXIF_Make']
-        droneModel = exifTags['EXIF_Model']
+        droneMaker = record['make']
         feedback.pushInfo("EXIF_Make: "+droneMaker)
-        feedback.pushInfo("EXIF_Model: "+droneModel)
+        feedback.pushInfo("EXIF_Model: "+record['model'])
 
         # drone maker substitute XMP drone dictKey
         dictKey = droneMaker
 
-        relativeAltitude = float(droneMetadata['RelativeAltitude'])
+        relativeAltitude = record['relative_altitude']
         feedback.pushInfo(self.tr("XMP {}:RelativeAltitude: ".format(dictKey))+str(relativeAltitude))
 
-        gimballRoll = float(droneMetadata['GimbalRollDegree'])
-        gimballPitch = float(droneMetadata['GimbalPitchDegree'])
-        gimballYaw = float(droneMetadata['GimbalYawDegree'])
+        gimballRoll = record['gimbal_roll']
+        gimballPitch = record['gimbal_pitch']
+        gimballYaw = record['gimbal_yaw']
         feedback.pushInfo("XMP {}:GimbalRollDegree: ".format(dictKey)+str(gimballRoll))
         feedback.pushInfo("XMP {}:GimbalPitchDegree: ".format(dictKey)+str(gimballPitch))
         feedback.pushInfo("XMP {}:GimbalYawDegree: ".format(dictKey)+str(gimballYaw))
 
-        flightRoll = float(droneMetadata['FlightRollDegree'])
-        flightPitch = float(droneMetadata['FlightPitchDegree'])
-        flightYaw = float(droneMetadata['FlightYawDegree'])
+        flightRoll = record['flight_roll']
+        flightPitch = record['flight_pitch']
+        flightYaw = record['flight_yaw']
         feedback.pushInfo("XMP {}:FlightRollDegree: ".format(dictKey)+str(flightRoll))
         feedback.pushInfo("XMP {}:FlightPitchDegree: ".format(dictKey)+str(flightPitch))
         feedback.pushInfo("XMP {}:FlightYawDegree: ".format(dictKey)+str(flightYaw))
@@ -449,38 +312,26 @@ class UAVImageFootprint(QgsProcessingAlgorithm):
         feedback.pushInfo(self.tr("Nadir coordinates (lon, lat): ")+'{}, {}'.format(droneLocation.x(), droneLocation.y()))
 
         nadirGeometry = QgsGeometry.fromPointXY(QgsPointXY(droneLocation.x(), droneLocation.y()))
-        feature = QgsFeature()
-        feature.setGeometry(nadirGeometry)
-        nadirSink.addFeature(feature, QgsFeatureSink.FastInsert)
-
-        # create a memory layer with nadir point to be input to "native:wedgebuffers" algorithm
-        # it's not possible to use directly the FeatureSink becaseu can't be accepted by processing.run.
-        # the reason is that a generic sink can be also NOT a layer but a more generic sink where features
-        # can't be recovered.
-        tempNadirLayer = QgsVectorLayer('Point?crs={}'.format(destinationCRS.authid()), 'tempNadirLayer', 'memory' )
-        provider = tempNadirLayer.dataProvider()
-        feature = QgsFeature()
-        feature.setGeometry(nadirGeometry)
-        provider.addFeatures([feature])
-
-        # create polygon using wedge buffer processign algorithm
-        parameters = {
-            'INPUT': tempNadirLayer,
-            'AZIMUTH': gimballYaw,
-            'WIDTH': horizontalFOV,
-            'OUTER_RADIUS': abs(bottomDistance) + nadirToBottomOffset,
-            'INNER_RADIUS': abs(upperDistance) + nadirToupperOffset,
-            'OUTPUT': parameters[self.OUTPUT_FOOTPRINT]
-        }
-        wedge_buffer_result = processing.run("native:wedgebuffers", 
-                                            parameters,
-                                            is_child_algorithm=True,
-                                            context = context,
-                                            feedback = feedback)
+        nadirFeature = QgsFeature(fields)
+        nadirFeature.setGeometry(nadirGeometry)
+        nadirSink.addFeature(nadirFeature, QgsFeatureSink.FastInsert)
+
+        # create footprint polygon directly (as wedge buffer algorithm does)
+        # and add it to footprint sink
+        footprint = QgsGeometry.createWedgeBuffer(QgsPoint(droneLocation.x(), droneLocation.y()),
+                                                  gimballYaw,
+                                                  horizontalFOV,
+                                                  abs(bottomDistance) + nadirToBottomOffset,
+                                                  abs(upperDistance) + nadirToupperOffset)
+        # footprint keeps the nadir attributes as native:wedgebuffers did
+        feature = QgsFeature(fields)
+        feature.setGeometry(footprint)
+        feature.setAttributes(nadirFeature.attributes())
+        footprintSink.addFeature(feature, QgsFeatureSink.FastInsert)
 
         # Return the results
         results = {
-            self.OUTPUT_FOOTPRINT: wedge_buffer_result['OUTPUT'],
+            self.OUTPUT_FOOTPRINT: footprint_dest_id,
             self.OUTPUT_NADIR: nadir_dest_id,
         }
         return results
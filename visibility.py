@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+***************************************************************************
+    visibility.py
+    ---------------------
+    Date                 : August 2019
+    Copyright            : (C) 2019 by Luigi Pirelli
+    Email                : luipir at gmail dot com
+***************************************************************************
+*                                                                         *
+*   This program is free software; you can redistribute it and/or modify  *
+*   it under the terms of the GNU General Public License as published by  *
+*   the Free Software Foundation; either version 2 of the License, or     *
+*   (at your option) any later version.                                   *
+*                                                                         *
+***************************************************************************
+"""
+
+__author__ = 'Luigi Pirelli'
+__date__ = 'August 2019'
+__copyright__ = '(C) 2019, Luigi Pirelli'
+
+import numpy as np
+
+from camera_calculator import CameraCalculator
+from footprint_geometry import frustum_rays
+
+# number of images whose candidate pairs are built at once
+CHUNK_SIZE = 10000
+
+
+def bbox_candidates(xmin, ymin, xmax, ymax, pointsX, pointsY, chunkSize=CHUNK_SIZE):
+    """
+    (image, point) pairs where the point lies inside the image bounding box.
+    Points are sorted by x once, then the x range of every bbox is found with
+    a binary search, so that all the N x M pairs are never evaluated.
+    :param xmin, ymin, xmax, ymax: arrays of N bounding boxes
+    :param pointsX, pointsY: arrays of M point coordinates
+    :param chunkSize: number of bounding boxes processed at once to limit memory
+    :return: tuple (imageIndex, pointIndex) of candidate pairs
+    """
+    xmin, ymin, xmax, ymax = [np.asarray(value, dtype=np.float64) for value in (xmin, ymin, xmax, ymax)]
+    pointsX = np.asarray(pointsX, dtype=np.float64)
+    pointsY = np.asarray(pointsY, dtype=np.float64)
+
+    order = np.argsort(pointsX, kind='stable')
+    sortedX = pointsX[order]
+
+    imageIndexes = []
+    pointIndexes = []
+    for start in range(0, len(xmin), chunkSize):
+        stop = start + chunkSize
+        lower = np.searchsorted(sortedX, xmin[start:stop], side='left')
+        upper = np.searchsorted(sortedX, xmax[start:stop], side='right')
+        counts = np.maximum(upper - lower, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+
+        # expand each [lower, upper) range of sorted points in a flat array
+        imageIndex = np.repeat(np.arange(start, start + len(counts)), counts)
+        firsts = np.repeat(lower - (np.cumsum(counts) - counts), counts)
+        pointIndex = order[np.arange(total) + firsts]
+
+        inside = (pointsY[pointIndex] >= ymin[imageIndex]) & (pointsY[pointIndex] <= ymax[imageIndex])
+        imageIndexes.append(imageIndex[inside])
+        pointIndexes.append(pointIndex[inside])
+
+    if not imageIndexes:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(imageIndexes), np.concatenate(pointIndexes)
+
+def frustum_visibility(x, y, relativeAltitude, gimbalRoll, gimbalPitch, gimbalYaw,
+                       horizontalFOV, verticalFOV, pointsX, pointsY, pointsZ=0.0,
+                       maxDistance=1000.0):
+    """
+    Sparse visibility matrix of M ground points in N images: pairs where the
+    point lies inside the camera pyramid (pointIsInsidePyramid of
+    CameraCalculator.java) and within maxDistance from the camera.
+    Candidates are prefiltered with the bounding box of the nadir and of the
+    ground footprint, that contains the section of the pyramid at every height
+    between the ground and the camera. When a ray is limited (limitRange) the
+    bounding box contains the whole pyramid truncated at maxDistance.
+    :param x, y: arrays of nadir coordinates in a metric CRS (east, north)
+    :param relativeAltitude: array of altitudes over the ground (metre)
+    :param gimbalRoll, gimbalPitch, gimbalYaw: arrays of DJI gimbal angles (degree)
+    :param horizontalFOV: wide camera angle (degree)
+    :param verticalFOV: tall camera angle (degree)
+    :param pointsX, pointsY: arrays of point coordinates in the same CRS
+    :param pointsZ: point heights over the ground (metre, not negative), scalar or array
+    :param maxDistance: points farther than this distance of view (metre) are
+        not visible. If None images viewing the horizon are skipped
+    :return: tuple (imageIndex, pointIndex) of the visible pairs sorted by
+        point, so that the images of a point are a contiguous slice
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    relativeAltitude = np.broadcast_to(np.asarray(relativeAltitude, dtype=np.float64), x.shape)
+    pointsX = np.asarray(pointsX, dtype=np.float64)
+    pointsY = np.asarray(pointsY, dtype=np.float64)
+    pointsZ = np.broadcast_to(np.asarray(pointsZ, dtype=np.float64), pointsX.shape)
+
+    rays = frustum_rays(gimbalRoll, gimbalPitch, gimbalYaw, horizontalFOV, verticalFOV)
+    rays = np.broadcast_to(rays, (len(x),) + rays.shape[1:])
+    cameraPositions = np.stack((x, y, relativeAltitude), axis=-1)
+
+    origins = np.zeros_like(cameraPositions)
+    origins[:, 2] = relativeAltitude
+    corners = CameraCalculator.getRayGroundIntersectionsBatch(rays, origins)
+    if maxDistance is None:
+        valid = (rays[..., 2] < 0).all(axis=1) & np.isfinite(corners).all(axis=(1, 2))
+        extent = corners[..., :2]
+    else:
+        valid = np.ones(len(x), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            limited = (CameraCalculator.quadrantChangedBatch(rays, corners) |
+                       ~(np.linalg.norm(corners - origins[:, np.newaxis], axis=-1) <= maxDistance)).any(axis=1)
+        # the pyramid truncated at maxDistance is inside the pyramid cut by the
+        # plane of the ray tips at distance maxDistance / cos(half diagonal angle)
+        reach = maxDistance / np.linalg.norm(rays.mean(axis=1), axis=-1)
+        extent = np.where(limited[:, np.newaxis, np.newaxis],
+                          rays[..., :2] * reach[:, np.newaxis, np.newaxis], corners[..., :2])
+
+    xmin = np.minimum(extent[..., 0].min(axis=1), 0) + x
+    xmax = np.maximum(extent[..., 0].max(axis=1), 0) + x
+    ymin = np.minimum(extent[..., 1].min(axis=1), 0) + y
+    ymax = np.maximum(extent[..., 1].max(axis=1), 0) + y
+    # skipped images have an empty bounding box
+    xmin[~valid] = np.inf
+
+    imageIndex, pointIndex = bbox_candidates(xmin, ymin, xmax, ymax, pointsX, pointsY)
+
+    points = np.stack((pointsX, pointsY, pointsZ), axis=-1)
+    inside = CameraCalculator.pointsInsidePyramidsBatch(
+        rays[imageIndex], cameraPositions[imageIndex], points[pointIndex])
+    if maxDistance is not None:
+        distances = np.linalg.norm(points[pointIndex] - cameraPositions[imageIndex], axis=-1)
+        inside &= distances <= maxDistance
+
+    imageIndex = imageIndex[inside]
+    pointIndex = pointIndex[inside]
+    order = np.lexsort((imageIndex, pointIndex))
+    return imageIndex[order], pointIndex[order]
+
+def images_of_point(imageIndex, pointIndex, point):
+    """
+    :param imageIndex, pointIndex: visible pairs as returned by frustum_visibility
+    :param point: index of the point of interest
+    :return: array of the indexes of the images viewing the point
+    """
+    first, last = np.searchsorted(pointIndex, [point, point + 1])
+    return imageIndex[first:last]